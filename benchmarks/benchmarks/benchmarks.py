@@ -195,3 +195,69 @@ class CompareMetropolisNUTSSuite(object):
 
 
 CompareMetropolisNUTSSuite.track_glm_hierarchical_ess.unit = 'Effective samples per second'
+
+
+class LeapfrogSuite(object):
+    """Tests how many leapfrog steps NUTS does per second in a model with
+    many dimensions, where the cost of the steps outside of the logp
+    function is noticeable.
+    """
+    timeout = 360.0
+    number = 1
+    repeat = 1
+    draws = 200
+
+    def setup(self):
+        with pm.Model() as self.model:
+            pm.Normal('x', mu=0, sd=1, shape=1000)
+        self.start = self.model.test_point
+
+    def track_nuts_leapfrog_steps(self):
+        with self.model:
+            step = pm.NUTS()
+            t0 = time.time()
+            trace = pm.sample(self.draws, tune=0, step=step, chains=1,
+                              start=self.start, random_seed=1,
+                              progressbar=False,
+                              compute_convergence_checks=False)
+            tot = time.time() - t0
+        return trace.get_sampler_stats('tree_size').sum() / tot
+
+
+LeapfrogSuite.track_nuts_leapfrog_steps.unit = 'Leapfrog steps per second'
+
+
+class DrawValuesSuite(object):
+    """Tests how fast values can be drawn from the distributions of a model,
+    as done once per point by `sample_ppc`
+    """
+    timeout = 360.0
+    number = 1
+    repeat = 1
+    samples = 2000
+
+    def setup(self):
+        self.model = glm_hierarchical_model()
+        self.points = [self.model.test_point] * 10
+        with self.model:
+            # compile the theano functions beforehand
+            pm.sample_ppc(self.points, samples=1, progressbar=False)
+
+    def track_glm_hierarchical_ppc_draws(self):
+        with self.model:
+            t0 = time.time()
+            pm.sample_ppc(self.points, samples=self.samples, progressbar=False)
+            tot = time.time() - t0
+        return self.samples / tot
+
+    def track_glm_hierarchical_batched_ppc_draws(self):
+        with self.model:
+            t0 = time.time()
+            pm.sample_ppc(self.points, samples=self.samples, progressbar=False,
+                          batched=True)
+            tot = time.time() - t0
+        return self.samples / tot
+
+
+DrawValuesSuite.track_glm_hierarchical_ppc_draws.unit = 'Draws per second'
+DrawValuesSuite.track_glm_hierarchical_batched_ppc_draws.unit = 'Draws per second'
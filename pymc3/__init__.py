@@ -18,6 +18,11 @@ from .vartypes import *
 from .exceptions import *
 from . import sampling
 
+import sys
+if sys.version_info.major >= 3:
+    # The process based samplers are not available in Python 2
+    from .parallel_sampling import SamplerPool
+
 from .diagnostics import *
 from .backends.tracetab import *
 from .backends import save_trace, load_trace
@@ -4,11 +4,14 @@ Available backends
 ------------------
 
 1. NumPy array (pymc3.backends.NDArray)
-2. Text files (pymc3.backends.Text)
-3. SQLite (pymc3.backends.SQLite)
+2. Memory-mapped NumPy array files (pymc3.backends.MemmapNDArray)
+3. Text files (pymc3.backends.Text)
+4. SQLite (pymc3.backends.SQLite)
+5. Columnar binary files (pymc3.backends.Columnar)
 
-The NDArray backend holds the entire trace in memory, whereas the Text
-and SQLite backends store the values while sampling.
+The NDArray backend holds the entire trace in memory, whereas the
+MemmapNDArray, Text, SQLite and Columnar backends store the values while
+sampling.
 
 Selecting a backend
 -------------------
@@ -113,14 +116,20 @@ defined that returns a MultiTrace object.
 
 For specific examples, see pymc3.backends.{ndarray,text,sqlite}.py.
 """
-from ..backends.ndarray import NDArray, save_trace, load_trace
+from ..backends.ndarray import (NDArray, MemmapNDArray, save_trace,
+                                load_trace)
 from ..backends.text import Text
 from ..backends.sqlite import SQLite
 from ..backends.hdf5 import HDF5
+from ..backends.columnar import Columnar
 
-_shortcuts = {'text': {'backend': Text,
+_shortcuts = {'memmap': {'backend': MemmapNDArray,
+                         'name': 'mcmc_memmap'},
+              'text': {'backend': Text,
                        'name': 'mcmc'},
               'sqlite': {'backend': SQLite,
                          'name': 'mcmc.sqlite'},
               'hdf5': {'backend': HDF5,
-                       'name': 'mcmc.hdf5'}}
+                       'name': 'mcmc.hdf5'},
+              'columnar': {'backend': Columnar,
+                           'name': 'mcmc_columnar'}}
@@ -12,6 +12,7 @@ import theano.tensor as tt
 
 from ..model import modelcontext
 from .report import SamplerReport, merge_reports
+from .online import OnlineStats
 
 logger = logging.getLogger('pymc3')
 
@@ -66,10 +67,48 @@ class BaseTrace(object):
         self._is_base_setup = False
         self.sampler_vars = None
         self._warnings = []
+        self.online = None
+        self._online_kwargs = None
 
     def _add_warnings(self, warnings):
         self._warnings.extend(warnings)
 
+    def track_online(self, **kwargs):
+        """Keep online summary statistics of the recorded draws.
+
+        The statistics of the chain are available as the attribute
+        `online`, a `pymc3.backends.online.OnlineStats`, after the first
+        draw was recorded. The keyword arguments are passed to it.
+        """
+        self._online_kwargs = kwargs
+
+    def _record_online(self, values):
+        """Update the online statistics with the values of a draw, in the
+        order of `varnames`. Backends call this in `record`."""
+        if self._online_kwargs is None:
+            return
+        if self.online is None:
+            kwargs = dict(self._online_kwargs)
+            kwargs.setdefault('seed', self.chain)
+            self.online = OnlineStats(self.varnames, self.var_shapes,
+                                      **kwargs)
+        self.online.update(values)
+
+    def _online_for_slice(self, idx):
+        """Online statistics of a slice of the trace.
+
+        They are those of the trace if the slice drops exactly the draws
+        that were skipped by the statistics, like the tuning draws, and
+        None otherwise."""
+        online = self.online
+        if online is None:
+            return None
+        start, stop, step = idx.indices(len(self))
+        if (step == 1 and start == online.n_skipped and stop == len(self)
+                and online.n_skipped + online.count == len(self)):
+            return online
+        return None
+
     # Sampling methods
 
     def _set_sampler_vars(self, sampler_vars):
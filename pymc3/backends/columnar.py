@@ -0,0 +1,501 @@
+"""Columnar binary trace backend
+
+Store sampling values in a binary columnar format, similar to Parquet.
+
+File format
+-----------
+
+The values of each chain are saved in a separate data file (under a
+directory specified by the `name` argument), `chain-<chain>.bin`. Draws
+are written in row groups of `chunk_size` draws. A row group contains one
+chunk for each variable and sampler statistic, which holds the raw values
+of these draws in C order.
+
+The metadata file of a chain, `chain-<chain>.json`, lists the dtype and
+shape of each column and, for each chunk, its offset in the data file,
+its number of draws and the minimum and maximum of its values. It is
+rewritten after every row group, by writing a temporary file and renaming
+it, so that the files always describe a complete set of draws.
+
+Selecting a variable, some chains or a range of draws only reads the
+chunks that contain the selected draws, and the range of the values of a
+variable is computed from the metadata without reading any values.
+"""
+from glob import glob
+import json
+import os
+
+import numpy as np
+
+from ..backends import base, ndarray
+
+
+class _ChainFile(object):
+    """Data and metadata files of one chain.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the trace
+    chain : int
+        Chain number
+    """
+
+    def __init__(self, directory, chain):
+        self.chain = chain
+        self.data_path = os.path.join(directory, 'chain-{}.bin'.format(chain))
+        self.meta_path = os.path.join(directory, 'chain-{}.json'.format(chain))
+        self.meta = None
+        self._fh = None
+
+    def exists(self):
+        return os.path.exists(self.meta_path)
+
+    def load_meta(self):
+        with open(self.meta_path) as fh:
+            self.meta = json.load(fh)
+
+    def create(self, var_dtypes, var_shapes, sampler_vars=None):
+        """Start new files for the columns of variables and statistics."""
+        self.meta = {
+            'chain': self.chain,
+            'draws': 0,
+            'samples': {varname: _column_meta(var_dtypes[varname],
+                                              var_shapes[varname])
+                        for varname in var_dtypes},
+            'stats': None,
+        }
+        if sampler_vars is not None:
+            self.meta['stats'] = [
+                {key: _column_meta(dtype, ()) for key, dtype in vars.items()}
+                for vars in sampler_vars]
+        open(self.data_path, 'wb').close()
+
+    def columns(self):
+        """Metadata and keys of all columns, samples first."""
+        for varname, column in self.meta['samples'].items():
+            yield column, (varname,)
+        for i, stats in enumerate(self.meta['stats'] or []):
+            for key, column in stats.items():
+                yield column, (i, key)
+
+    def open(self):
+        if self._fh is None:
+            self._fh = open(self.data_path, 'ab')
+
+    def append(self, samples, stats=None):
+        """Append a row group to the data file.
+
+        Parameters
+        ----------
+        samples : dict
+            Arrays of the draws of each variable
+        stats : list of dicts
+            Arrays of the draws of the statistics of each sampler
+        """
+        self.open()
+        n_draws = None
+        for column, key in self.columns():
+            if len(key) == 1:
+                values = samples[key[0]]
+            else:
+                values = stats[key[0]][key[1]]
+            values = np.ascontiguousarray(values, dtype=column['dtype'])
+            n_draws = len(values)
+            chunk = {'offset': self._fh.tell(), 'draws': n_draws,
+                     'min': None, 'max': None}
+            if values.size:
+                chunk['min'] = np.min(values).item()
+                chunk['max'] = np.max(values).item()
+            self._fh.write(values.tobytes())
+            column['chunks'].append(chunk)
+        self._fh.flush()
+        if n_draws is not None:
+            self.meta['draws'] += n_draws
+        self.write_meta()
+
+    def write_meta(self):
+        """Replace the metadata file in a single step."""
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(self.meta, fh)
+        if os.name == 'nt' and os.path.exists(self.meta_path):
+            # os.rename does not replace existing files on Windows
+            os.remove(self.meta_path)
+        os.rename(tmp_path, self.meta_path)
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        self.write_meta()
+
+    def read(self, column, idx):
+        """Read draws of a column.
+
+        Parameters
+        ----------
+        column : dict
+            Metadata of the column
+        idx : slice
+            Draws to read. Only chunks with selected draws are read.
+        """
+        dtype = np.dtype(column['dtype'])
+        shape = tuple(column['shape'])
+        row_size = int(np.prod(shape, dtype=int))
+        draws = np.arange(*idx.indices(self.meta['draws']))
+        values = np.empty((len(draws),) + shape, dtype=dtype)
+        if not len(draws):
+            return values
+        order = np.argsort(draws, kind='mergesort')
+        sorted_draws = draws[order]
+
+        start = 0
+        with open(self.data_path, 'rb') as fh:
+            for chunk in column['chunks']:
+                stop = start + chunk['draws']
+                lo, hi = np.searchsorted(sorted_draws, [start, stop])
+                if hi > lo:
+                    # Only read the range of the chunk with selected draws
+                    first, last = sorted_draws[lo], sorted_draws[hi - 1]
+                    fh.seek(chunk['offset'] +
+                            (first - start) * row_size * dtype.itemsize)
+                    count = (last - first + 1) * row_size
+                    data = np.frombuffer(fh.read(count * dtype.itemsize),
+                                         dtype=dtype)
+                    data = data.reshape((last - first + 1,) + shape)
+                    values[order[lo:hi]] = data[sorted_draws[lo:hi] - first]
+                start = stop
+        return values
+
+
+def _column_meta(dtype, shape):
+    return {'dtype': np.dtype(dtype).str, 'shape': list(shape), 'chunks': []}
+
+
+class Columnar(base.BaseTrace):
+    """Columnar binary trace object
+
+    Parameters
+    ----------
+    name : str
+        Name of directory to store the files
+    model : Model
+        If None, the model is taken from the `with` context.
+    vars : list of variables
+        Sampling values will be stored for these variables. If None,
+        `model.unobserved_RVs` is used.
+    test_point : dict
+        use different test point that might be with changed variables shapes
+    chunk_size : int
+        Number of draws in a row group. The draws are kept in memory until
+        a row group is complete.
+    """
+
+    supports_sampler_stats = True
+
+    def __init__(self, name, model=None, vars=None, test_point=None,
+                 chunk_size=1000):
+        if not os.path.exists(name):
+            os.mkdir(name)
+        super(Columnar, self).__init__(name, model, vars, test_point)
+        self.chunk_size = chunk_size
+        self._file = None
+        self._buffer = None
+        self._stats_buffer = None
+        self._buffer_idx = 0
+
+    def __getstate__(self):
+        self._flush()
+        state = self.__dict__.copy()
+        if self._file is not None:
+            # Open files can not be pickled, the data file is reopened
+            # when more draws are appended
+            state['_file'] = _ChainFile(self.name, self.chain)
+            state['_file'].meta = self._file.meta
+        return state
+
+    # Sampling methods
+
+    def setup(self, draws, chain, sampler_vars=None):
+        """Perform chain-specific setup.
+
+        Parameters
+        ----------
+        draws : int
+            Expected number of draws
+        chain : int
+            Chain number
+        sampler_vars : list of dicts
+            Names and dtypes of the variables that are
+            exported by the samplers.
+        """
+        super(Columnar, self).setup(draws, chain, sampler_vars)
+        self._flush()
+        if self._file is not None and self._file.chain != chain:
+            self._file.close()
+            self._file = None
+        self.chain = chain
+
+        if self._file is None:
+            self._file = _ChainFile(self.name, chain)
+            if self._file.exists():
+                self._file.load_meta()
+        chain_file = self._file
+        if chain_file.meta is None:
+            chain_file.create(self.var_dtypes, self.var_shapes, sampler_vars)
+        else:
+            shapes = {varname: tuple(column['shape'])
+                      for varname, column in chain_file.meta['samples'].items()}
+            if shapes != self.var_shapes:
+                raise base.BackendError(
+                    "Previous file '{}' has different variables than "
+                    "current model.".format(chain_file.data_path))
+            stats = chain_file.meta['stats']
+            stat_names = None if stats is None else [set(s) for s in stats]
+            if sampler_vars is not None:
+                sampler_vars_names = [set(s) for s in sampler_vars]
+            else:
+                sampler_vars_names = None
+            if stat_names != sampler_vars_names:
+                raise ValueError("Sampler vars can't change")
+        chain_file.open()
+
+        buffer_size = min(draws, self.chunk_size)
+        self._buffer = {varname: np.zeros((buffer_size,) + shape,
+                                          dtype=self.var_dtypes[varname])
+                        for varname, shape in self.var_shapes.items()}
+        if sampler_vars is None:
+            self._stats_buffer = None
+        else:
+            self._stats_buffer = [
+                {key: np.zeros(buffer_size, dtype=dtype)
+                 for key, dtype in vars.items()}
+                for vars in sampler_vars]
+        self._buffer_idx = 0
+
+    def record(self, point, sampler_stats=None):
+        """Record results of a sampling iteration.
+
+        Parameters
+        ----------
+        point : dict
+            Values mapped to variable names
+        sampler_stats : list of dicts
+            The diagnostic values for each sampler
+        """
+        records_stats = self._stats_buffer is not None
+        if records_stats and sampler_stats is None:
+            raise ValueError("Expected sampler_stats")
+        if not records_stats and sampler_stats is not None:
+            raise ValueError("Unknown sampler_stats")
+
+        values = self.fn(point)
+        if self._buffer_idx == len(self._buffer[self.varnames[0]]):
+            # More draws than expected in `setup`
+            self._flush()
+            self._grow_buffer()
+        idx = self._buffer_idx
+        for varname, value in zip(self.varnames, values):
+            self._buffer[varname][idx] = value
+        self._record_online(values)
+        if sampler_stats is not None:
+            for data, vars in zip(self._stats_buffer, sampler_stats):
+                for key, val in vars.items():
+                    data[key][idx] = val
+
+        self._buffer_idx += 1
+        if self._buffer_idx == self.chunk_size:
+            self._flush()
+
+    def _grow_buffer(self):
+        size = self.chunk_size
+        self._buffer = {varname: np.zeros((size,) + values.shape[1:],
+                                          dtype=values.dtype)
+                        for varname, values in self._buffer.items()}
+        if self._stats_buffer is not None:
+            self._stats_buffer = [
+                {key: np.zeros(size, dtype=values.dtype)
+                 for key, values in vars.items()}
+                for vars in self._stats_buffer]
+
+    def _flush(self):
+        """Append the buffered draws to the data file as a row group."""
+        n = self._buffer_idx
+        if not n:
+            return
+        samples = {varname: values[:n]
+                   for varname, values in self._buffer.items()}
+        stats = None
+        if self._stats_buffer is not None:
+            stats = [{key: values[:n] for key, values in vars.items()}
+                     for vars in self._stats_buffer]
+        self._file.append(samples, stats)
+        self._buffer_idx = 0
+
+    def close(self):
+        self._flush()
+        if self._file is not None:
+            self._file.close()
+
+    # Selection methods
+
+    def _chain_file(self):
+        self._flush()
+        if self._file is None:
+            if self.chain is None:
+                return None
+            self._file = _ChainFile(self.name, self.chain)
+            self._file.load_meta()
+        return self._file
+
+    def __len__(self):
+        if self._file is None:
+            if self.chain is None:
+                return 0
+            self._chain_file()
+        # Buffered draws are counted without writing them
+        return self._file.meta['draws'] + self._buffer_idx
+
+    def get_values(self, varname, burn=0, thin=1):
+        """Get values from trace.
+
+        Parameters
+        ----------
+        varname : str
+        burn : int
+        thin : int
+
+        Returns
+        -------
+        A NumPy array
+        """
+        chain_file = self._chain_file()
+        column = chain_file.meta['samples'][varname]
+        return chain_file.read(column, slice(burn, None, thin))
+
+    def _get_sampler_stats(self, varname, sampler_idx, burn, thin):
+        chain_file = self._chain_file()
+        column = chain_file.meta['stats'][sampler_idx][varname]
+        return chain_file.read(column, slice(burn, None, thin))
+
+    def _slice(self, idx):
+        chain_file = self._chain_file()
+        start, stop, step = idx.indices(len(self))
+        sliced = ndarray.NDArray(model=self.model, vars=self.vars)
+        sliced.chain = self.chain
+        sliced.online = self._online_for_slice(idx)
+        sliced.samples = {
+            varname: chain_file.read(column, idx)
+            for varname, column in chain_file.meta['samples'].items()}
+        sliced.draw_idx = len(range(start, stop, step))
+        sliced.draws = sliced.draw_idx
+        if chain_file.meta['stats'] is not None:
+            sliced.sampler_vars = self.sampler_vars
+            sliced._stats = [
+                {key: chain_file.read(column, idx)
+                 for key, column in stats.items()}
+                for stats in chain_file.meta['stats']]
+        return sliced
+
+    def point(self, idx):
+        """Return dictionary of point values at `idx` for current chain
+        with variables names as keys.
+        """
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        chain_file = self._chain_file()
+        return {varname: chain_file.read(column, slice(idx, idx + 1))[0]
+                for varname, column in chain_file.meta['samples'].items()}
+
+    def value_range(self, varname):
+        """Minimum and maximum of the values of `varname` in this chain,
+        computed from the metadata of the chunks."""
+        chain_file = self._chain_file()
+        chunks = chain_file.meta['samples'][varname]['chunks']
+        mins = [chunk['min'] for chunk in chunks if chunk['min'] is not None]
+        maxs = [chunk['max'] for chunk in chunks if chunk['max'] is not None]
+        if not mins:
+            return None, None
+        return min(mins), max(maxs)
+
+
+def load(name, model=None, chains=None):
+    """Load Columnar database.
+
+    Parameters
+    ----------
+    name : str
+        Name of directory with files (two per chain)
+    model : Model
+        If None, the model is taken from the `with` context.
+    chains : list
+        Chains to load. If None, all chains are loaded. The files of
+        other chains are not read.
+
+    Returns
+    -------
+    A MultiTrace instance
+    """
+    files = glob(os.path.join(name, 'chain-*.json'))
+
+    if len(files) == 0:
+        raise ValueError('No files present in directory {}'.format(name))
+
+    straces = []
+    for f in files:
+        chain = int(os.path.splitext(f)[0].rsplit('-', 1)[1])
+        if chains is not None and chain not in chains:
+            continue
+        strace = Columnar(name, model=model)
+        strace.chain = chain
+        chain_file = strace._chain_file()
+        if chain_file.meta['stats'] is not None:
+            strace.sampler_vars = [
+                {key: np.dtype(column['dtype'])
+                 for key, column in stats.items()}
+                for stats in chain_file.meta['stats']]
+        straces.append(strace)
+    return base.MultiTrace(straces)
+
+
+def dump(name, trace, chains=None, chunk_size=1000):
+    """Store values from a MultiTrace in the columnar format.
+
+    Parameters
+    ----------
+    name : str
+        Name of directory to store the files in
+    trace : MultiTrace
+        Result of MCMC run
+    chains : list
+        Chains to dump. If None, all chains are dumped.
+    chunk_size : int
+        Number of draws in a row group.
+    """
+    if not os.path.exists(name):
+        os.mkdir(name)
+    if chains is None:
+        chains = trace.chains
+
+    for chain in chains:
+        strace = trace._straces[chain]
+        sampler_vars = None
+        if strace.supports_sampler_stats and strace.sampler_vars:
+            sampler_vars = strace.sampler_vars
+        chain_file = _ChainFile(name, chain)
+        chain_file.create(strace.var_dtypes, strace.var_shapes, sampler_vars)
+        n_draws = len(strace)
+        for start in range(0, n_draws, chunk_size):
+            idx = slice(start, min(start + chunk_size, n_draws))
+            sliced = strace[idx]
+            samples = {varname: sliced.get_values(varname)
+                       for varname in strace.varnames}
+            stats = None
+            if sampler_vars is not None:
+                stats = [{key: sliced.get_sampler_stats(key, sampler_idx=i)
+                          for key in vars}
+                         for i, vars in enumerate(sampler_vars)]
+            chain_file.append(samples, stats)
+        chain_file.close()
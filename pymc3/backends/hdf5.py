@@ -1,7 +1,11 @@
 from ..backends import base, ndarray
 import h5py
+import numpy as np
 from contextlib import contextmanager
 
+# Maximum size in bytes of the HDF5 chunks of the samples of a variable
+_MAX_CHUNK_BYTES = 2 ** 22
+
 @contextmanager
 def activator(instance):
     if isinstance(instance.hdf5_file, h5py.File):
@@ -29,17 +33,44 @@ class HDF5(base.BaseTrace):
         `model.unobserved_RVs` is used.
     test_point : dict
         use different test point that might be with changed variables shapes
+    buffer_size : int
+        Number of draws that are kept in memory before they are written
+        to the file at once. The datasets of new chains are chunked along
+        the draws by this size.
+    compression : str or int
+        Compression filter of the datasets of new chains, see
+        `h5py.Group.create_dataset`. By default, no compression is used.
         """
 
     supports_sampler_stats = True
 
-    def __init__(self, name=None, model=None, vars=None, test_point=None):
+    def __init__(self, name=None, model=None, vars=None, test_point=None,
+                 buffer_size=100, compression=None):
         self.hdf5_file = None
         self.draw_idx = 0
         self.draws = None
         super(HDF5, self).__init__(name, model, vars, test_point)
+        self.buffer_size = buffer_size
+        self.compression = compression
+        self._buffer = None
+        self._stats_buffer = None
+        self._buffer_idx = 0
+
+    def __getstate__(self):
+        self._flush()
+        state = self.__dict__.copy()
+        # Open files can not be pickled
+        state['hdf5_file'] = None
+        return state
+
+    def _chunks(self, shape, dtype):
+        row_bytes = np.dtype(dtype).itemsize * int(np.prod(shape, dtype=int))
+        rows = max(1, _MAX_CHUNK_BYTES // max(1, row_bytes))
+        rows = min(self.buffer_size, rows)
+        return (rows,) + tuple(max(1, length) for length in shape)
 
     def _get_sampler_stats(self, varname, sampler_idx, burn, thin):
+        self._flush()
         with self.activate_file:
             return self.stats[str(sampler_idx)][varname][burn::thin]
 
@@ -123,7 +154,9 @@ class HDF5(base.BaseTrace):
                 if not data.keys():  # no pre-recorded stats
                     for varname, dtype in sampler.items():
                         if varname not in data:
-                            data.create_dataset(varname, (self.draws,), dtype=dtype, maxshape=(None,))
+                            data.create_dataset(varname, (self.draws,), dtype=dtype, maxshape=(None,),
+                                                chunks=(self.buffer_size,),
+                                                compression=self.compression)
                 elif data.keys() != sampler.keys():
                     raise ValueError(
                         "Sampler vars can't change, names incompatible: {} != {}".format(data.keys(), sampler.keys()))
@@ -143,59 +176,107 @@ class HDF5(base.BaseTrace):
             exported by the samplers.
         """
         self.chain = chain
+        self._flush()
+        # The file is kept open until `close`
+        if not (isinstance(self.hdf5_file, h5py.File) and self.hdf5_file.id):
+            self.hdf5_file = h5py.File(self.name, 'a')
         with self.activate_file:
             for varname, shape in self.var_shapes.items():
                 if varname not in self.samples:
+                    dtype = self.var_dtypes[varname]
                     self.samples.create_dataset(name=varname, shape=(draws, ) + shape,
-                                                dtype=self.var_dtypes[varname],
-                                                maxshape=(None, ) + shape)
+                                                dtype=dtype,
+                                                maxshape=(None, ) + shape,
+                                                chunks=self._chunks(shape, dtype),
+                                                compression=self.compression)
             self.draw_idx = len(self)
             self.draws = self.draw_idx + draws
             self._set_sampler_vars(sampler_vars)
             self._is_base_setup = True
             self._resize(self.draws)
 
+        self._buffer = {varname: np.zeros((self.buffer_size,) + shape,
+                                          dtype=self.var_dtypes[varname])
+                        for varname, shape in self.var_shapes.items()}
+        if sampler_vars is None:
+            self._stats_buffer = None
+        else:
+            self._stats_buffer = [
+                {key: np.zeros(self.buffer_size, dtype=dtype)
+                 for key, dtype in vars.items()}
+                for vars in sampler_vars]
+        self._buffer_idx = 0
 
     def close(self):
+        self._flush()
         with self.activate_file:
-            if self.draw_idx == self.draws:
-                return
-            # Remove trailing zeros if interrupted before completed all
-            # draws.
-            self._resize(self.draw_idx)
+            if self.draw_idx != self.draws:
+                # Remove trailing zeros if interrupted before completed all
+                # draws.
+                self._resize(self.draw_idx)
+        if isinstance(self.hdf5_file, h5py.File) and self.hdf5_file.id:
+            self.hdf5_file.close()
 
     def record(self, point, sampler_stats=None):
+        values = self.fn(point)
+        records_stats = self._stats_buffer is not None
+        if records_stats and sampler_stats is None:
+            raise ValueError("Expected sampler_stats")
+        if not records_stats and sampler_stats is not None:
+            raise ValueError("Unknown sampler_stats")
+
+        idx = self._buffer_idx
+        for varname, value in zip(self.varnames, values):
+            self._buffer[varname][idx] = value
+        self._record_online(values)
+        if sampler_stats is not None:
+            for data, vars in zip(self._stats_buffer, sampler_stats):
+                for key, val in vars.items():
+                    data[key][idx] = val
+
+        self._buffer_idx += 1
+        self.draw_idx += 1
+        if self._buffer_idx == self.buffer_size:
+            self._flush()
+
+    def _flush(self):
+        """Write the buffered draws to the file, with one write for each
+        variable and sampler statistic."""
+        n = self._buffer_idx
+        if not n:
+            return
+        start = self.draw_idx - n
         with self.activate_file:
-            for varname, value in zip(self.varnames, self.fn(point)):
-                self.samples[varname][self.draw_idx] = value
-
-            if self.records_stats and sampler_stats is None:
-                raise ValueError("Expected sampler_stats")
-            if not self.records_stats and sampler_stats is not None:
-                raise ValueError("Unknown sampler_stats")
-            if sampler_stats is not None:
-                for i, vars in enumerate(sampler_stats):
-                    data = self.stats[str(i)]
-                    for key, val in vars.items():
-                        data[key][self.draw_idx] = val
-
-            self.draw_idx += 1
+            samples = self.samples
+            for varname in self.varnames:
+                samples[varname][start:start + n] = self._buffer[varname][:n]
+            if self._stats_buffer is not None:
+                stats = self.stats
+                for i, vars in enumerate(self._stats_buffer):
+                    data = stats[str(i)]
+                    for key, values in vars.items():
+                        data[key][start:start + n] = values[:n]
+        self._buffer_idx = 0
 
     def get_values(self, varname, burn=0, thin=1):
+        self._flush()
         with self.activate_file:
             return self.samples[varname][burn::thin]
 
     def _slice(self, idx):
+        self._flush()
         with self.activate_file:
             start, stop, step = idx.indices(len(self))
             sliced = ndarray.NDArray(model=self.model, vars=self.vars)
             sliced.chain = self.chain
+            sliced.online = self._online_for_slice(idx)
             sliced.samples = {v: self.samples[v][start:stop:step]
                               for v in self.varnames}
             sliced.draw_idx = (stop - start) // step
             return sliced
 
     def point(self, idx):
+        self._flush()
         with self.activate_file:
             idx = int(idx)
             r = {}
@@ -6,12 +6,14 @@ import glob
 import json
 import os
 import shutil
+import tempfile
 
 import numpy as np
+from numpy.lib.format import open_memmap
 from ..backends import base
 
 
-def save_trace(trace, directory=None, overwrite=False):
+def save_trace(trace, directory=None, overwrite=False, compress=True):
     """Save multitrace to file.
 
     TODO: Also save warnings.
@@ -29,6 +31,10 @@ def save_trace(trace, directory=None, overwrite=False):
         path to a directory to save the trace
     overwrite : bool (default False)
         whether to overwrite an existing directory.
+    compress : bool (default True)
+        whether to save the samples compressed. Uncompressed samples are
+        saved in one `.npy` file per variable, which can be memory-mapped
+        by `load_trace`.
 
     Returns
     -------
@@ -50,11 +56,12 @@ def save_trace(trace, directory=None, overwrite=False):
     os.makedirs(directory)
 
     for chain, ndarray in trace._straces.items():
-        SerializeNDArray(os.path.join(directory, str(chain))).save(ndarray)
+        SerializeNDArray(os.path.join(directory, str(chain))).save(
+            ndarray, compress=compress)
     return directory
 
 
-def load_trace(directory, model=None):
+def load_trace(directory, model=None, mmap_mode=None):
     """Loads a multitrace that has been written to file.
 
     A the model used for the trace must be passed in, or the command
@@ -66,6 +73,10 @@ def load_trace(directory, model=None):
         Path to a pymc3 serialized trace
     model : pm.Model (optional)
         Model used to create the trace.  Can also be inferred from context
+    mmap_mode : {None, 'r', 'r+', 'c'} (optional)
+        If not None, the samples are memory-mapped with this mode instead
+        of being read into memory, see `numpy.load`. Requires a trace that
+        was saved with `compress=False` or sampled with `MemmapNDArray`.
 
     Returns
     -------
@@ -74,7 +85,8 @@ def load_trace(directory, model=None):
     straces = []
     for directory in glob.glob(os.path.join(directory, '*')):
         if os.path.isdir(directory):
-            straces.append(SerializeNDArray(directory).load(model))
+            straces.append(
+                SerializeNDArray(directory).load(model, mmap_mode=mmap_mode))
     return base.MultiTrace(straces)
 
 
@@ -88,6 +100,15 @@ class SerializeNDArray(object):
         self.metadata_path = os.path.join(self.directory, self.metadata_file)
         self.samples_path = os.path.join(self.directory, self.samples_file)
 
+    @staticmethod
+    def samples_file_names(varnames):
+        """Names of the uncompressed files of the samples of each variable.
+
+        The files are numbered, as variable names may not be valid file
+        names."""
+        return {varname: 'samples_{}.npy'.format(i)
+                for i, varname in enumerate(varnames)}
+
     @staticmethod
     def to_metadata(ndarray):
         """Extract ndarray metadata into json-serializable content"""
@@ -106,12 +127,15 @@ class SerializeNDArray(object):
         }
         return metadata
 
-    def save(self, ndarray):
+    def save(self, ndarray, compress=True):
         """Serialize a ndarray to file
 
         The goal here is to be modestly safer and more portable than a
         pickle file. The expense is that the model code must be available
         to reload the multitrace.
+
+        If `compress` is False, the samples of each variable are saved
+        uncompressed in a `.npy` file, which can be memory-mapped.
         """
         if not isinstance(ndarray, NDArray):
             raise TypeError('Can only save NDArray')
@@ -121,22 +145,49 @@ class SerializeNDArray(object):
 
         os.mkdir(self.directory)
 
+        metadata = SerializeNDArray.to_metadata(ndarray)
+        if compress:
+            np.savez_compressed(self.samples_path, **ndarray.samples)
+        else:
+            file_names = self.samples_file_names(ndarray.samples)
+            for varname, values in ndarray.samples.items():
+                np.save(os.path.join(self.directory, file_names[varname]),
+                        values)
+            metadata['samples_files'] = file_names
+        self.write_metadata(metadata)
+
+    def write_metadata(self, metadata):
         with open(self.metadata_path, 'w') as buff:
-            json.dump(SerializeNDArray.to_metadata(ndarray), buff)
+            json.dump(metadata, buff)
 
-        np.savez_compressed(self.samples_path, **ndarray.samples)
+    def load(self, model, mmap_mode=None):
+        """Load the saved ndarray from file
 
-    def load(self, model):
-        """Load the saved ndarray from file"""
+        If `mmap_mode` is not None, the samples are memory-mapped with
+        this mode."""
         new_trace = NDArray(model=model)
         with open(self.metadata_path, 'r') as buff:
             metadata = json.load(buff)
 
-        metadata['_stats'] = [{k: np.array(v) for k, v in stat.items()} for stat in metadata['_stats']]
+        if metadata['_stats'] is not None:
+            metadata['_stats'] = [{k: np.array(v) for k, v in stat.items()}
+                                  for stat in metadata['_stats']]
+        file_names = metadata.pop('samples_files', None)
 
         for key, value in metadata.items():
             setattr(new_trace, key, value)
-        new_trace.samples = dict(np.load(self.samples_path))
+        if file_names is None:
+            if mmap_mode is not None:
+                raise ValueError('The samples in {} are compressed and can '
+                                 'not be memory-mapped. Save the trace with '
+                                 '`compress=False`.'.format(self.directory))
+            new_trace.samples = dict(np.load(self.samples_path))
+        else:
+            # Files of a `MemmapNDArray` may contain unused draws at the end
+            new_trace.samples = {
+                varname: np.load(os.path.join(self.directory, file_name),
+                                 mmap_mode=mmap_mode)[:new_trace.draw_idx]
+                for varname, file_name in file_names.items()}
         return new_trace
 
 
@@ -162,6 +213,18 @@ class NDArray(base.BaseTrace):
         self.draws = None
         self.samples = {}
         self._stats = None
+        # Arrays that hold the samples and sampler statistics, which may
+        # have room for more draws than the arrays in `samples` and
+        # `_stats`, which are views of their first rows
+        self._buffers = {}
+        self._stats_buffers = []
+
+    def __getstate__(self):
+        # The unused rows of the buffers are not pickled
+        state = self.__dict__.copy()
+        state['_buffers'] = {}
+        state['_stats_buffers'] = []
+        return state
 
     # Sampling methods
 
@@ -181,42 +244,100 @@ class NDArray(base.BaseTrace):
         super(NDArray, self).setup(draws, chain, sampler_vars)
 
         self.chain = chain
-        if self.samples:  # Concatenate new array if chain is already present.
-            old_draws = len(self)
-            self.draws = old_draws + draws
-            self.draw_idx = old_draws
-            for varname, shape in self.var_shapes.items():
-                old_var_samples = self.samples[varname]
-                new_var_samples = np.zeros((draws, ) + shape,
-                                           self.var_dtypes[varname])
-                self.samples[varname] = np.concatenate((old_var_samples,
-                                                        new_var_samples),
-                                                       axis=0)
-        else:  # Otherwise, make array of zeros for each variable.
-            self.draws = draws
-            for varname, shape in self.var_shapes.items():
-                self.samples[varname] = np.zeros((draws, ) + shape,
-                                                 dtype=self.var_dtypes[varname])
+        self._setup_samples(draws)
 
         if sampler_vars is None:
             return
 
         if self._stats is None:
             self._stats = []
+            self._stats_buffers = []
             for sampler in sampler_vars:
                 data = dict()
                 self._stats.append(data)
+                self._stats_buffers.append(data.copy())
                 for varname, dtype in sampler.items():
                     data[varname] = np.zeros(draws, dtype=dtype)
+                    self._stats_buffers[-1][varname] = data[varname]
         else:
-            for data, vars in zip(self._stats, sampler_vars):
+            if len(self._stats_buffers) != len(self._stats):
+                self._stats_buffers = [{} for _ in self._stats]
+            old_draws = len(self)
+            for data, buffers, vars in zip(self._stats, self._stats_buffers,
+                                           sampler_vars):
                 if vars.keys() != data.keys():
                     raise ValueError("Sampler vars can't change")
-                old_draws = len(self)
-                for varname, dtype in vars.items():
-                    old = data[varname]
-                    new = np.zeros(draws, dtype=dtype)
-                    data[varname] = np.concatenate([old, new])
+                for varname in vars:
+                    data[varname], buffers[varname] = _extend(
+                        data[varname][:old_draws], draws,
+                        buffers.get(varname))
+
+    def _setup_samples(self, draws):
+        """Allocate the arrays of the samples for `draws` more draws."""
+        if self.samples:  # Extend the arrays if chain is already present.
+            old_draws = len(self)
+            self.draws = old_draws + draws
+            self.draw_idx = old_draws
+            for varname in self.var_shapes:
+                self.samples[varname], self._buffers[varname] = _extend(
+                    self.samples[varname][:old_draws], draws,
+                    self._buffers.get(varname))
+        else:  # Otherwise, make array of zeros for each variable.
+            self.draws = draws
+            for varname, shape in self.var_shapes.items():
+                self.samples[varname] = np.zeros((draws, ) + shape,
+                                                 dtype=self.var_dtypes[varname])
+                self._buffers[varname] = self.samples[varname]
+
+    def setup_from_arrays(self, chain, samples, sampler_vars=None, stats=None):
+        """Use existing arrays of draws as the trace of a chain.
+
+        The arrays are used as they are, without copying them. Values of
+        variables that are not in `samples`, like deterministics, are
+        computed from the draws.
+
+        Parameters
+        ----------
+        chain : int
+            Chain number
+        samples : dict
+            Arrays of draws of the free variables mapped to variable names
+        sampler_vars : list of dicts
+            Names and dtypes of the variables that are
+            exported by the samplers.
+        stats : list of dicts
+            Arrays of the sampler statistics for each sampler
+        """
+        if self.samples:
+            raise ValueError('Trace of chain %s is not empty.' % chain)
+        draws = len(next(iter(samples.values())))
+        super(NDArray, self).setup(draws, chain, sampler_vars)
+
+        self.chain = chain
+        self.draws = draws
+        self.draw_idx = draws
+        missing = [varname for varname in self.varnames
+                   if varname not in samples]
+        for varname in self.varnames:
+            if varname in missing:
+                self.samples[varname] = np.zeros(
+                    (draws,) + self.var_shapes[varname],
+                    dtype=self.var_dtypes[varname])
+            else:
+                self.samples[varname] = samples[varname]
+        if missing:
+            for idx in range(draws):
+                point = {name: vals[idx] for name, vals in samples.items()}
+                for varname, value in zip(self.varnames, self.fn(point)):
+                    if varname in missing:
+                        self.samples[varname][idx] = value
+        if self._online_kwargs is not None:
+            for idx in range(draws):
+                self._record_online([self.samples[varname][idx]
+                                     for varname in self.varnames])
+
+        if sampler_vars is not None:
+            self._stats = stats
 
     def record(self, point, sampler_stats=None):
         """Record results of a sampling iteration.
@@ -226,8 +347,10 @@ class NDArray(base.BaseTrace):
         point : dict
             Values mapped to variable names
         """
-        for varname, value in zip(self.varnames, self.fn(point)):
+        values = self.fn(point)
+        for varname, value in zip(self.varnames, values):
             self.samples[varname][self.draw_idx] = value
+        self._record_online(values)
 
         if self._stats is not None and sampler_stats is None:
             raise ValueError("Expected sampler_stats")
@@ -286,6 +409,7 @@ class NDArray(base.BaseTrace):
 
         sliced = NDArray(model=self.model, vars=self.vars)
         sliced.chain = self.chain
+        sliced.online = self._online_for_slice(idx)
         sliced.samples = {varname: values[idx]
                           for varname, values in self.samples.items()}
         sliced.sampler_vars = self.sampler_vars
@@ -311,9 +435,142 @@ class NDArray(base.BaseTrace):
                 for varname, values in self.samples.items()}
 
 
+class MemmapNDArray(NDArray):
+    """NDArray trace object stored in memory-mapped files
+
+    The samples of each variable are written to a `.npy` file while
+    sampling, so that traces that do not fit into memory can be sampled
+    and sliced. The files are stored in the format of `save_trace` with
+    `compress=False`, one directory per chain, and can be loaded with
+    `load_trace(name, mmap_mode='r')`.
+
+    Parameters
+    ----------
+    name : str
+        Name of the directory of the trace. A temporary directory is
+        created if None.
+    model : Model
+        If None, the model is taken from the `with` context.
+    vars : list of variables
+        Sampling values will be stored for these variables. If None,
+        `model.unobserved_RVs` is used.
+    """
+
+    def __init__(self, name=None, model=None, vars=None, test_point=None):
+        if name is None:
+            name = tempfile.mkdtemp(prefix='pymc_trace_')
+        name = os.path.abspath(name)
+        super(MemmapNDArray, self).__init__(name, model, vars, test_point)
+
+    @property
+    def _serializer(self):
+        return SerializeNDArray(os.path.join(self.name, str(self.chain)))
+
+    def _setup_samples(self, draws):
+        serializer = self._serializer
+        if not os.path.isdir(serializer.directory):
+            os.makedirs(serializer.directory)
+        file_names = serializer.samples_file_names(self.varnames)
+
+        old_draws = len(self)
+        self.draws = old_draws + draws
+        self.draw_idx = old_draws
+        for varname in self.varnames:
+            path = os.path.join(serializer.directory, file_names[varname])
+            shape = (self.draws,) + self.var_shapes[varname]
+            if not old_draws:
+                self.samples[varname] = open_memmap(
+                    path, mode='w+', dtype=self.var_dtypes[varname],
+                    shape=shape)
+                continue
+            # The draws are copied to a larger file when sampling continues
+            old_values = self.samples[varname][:old_draws]
+            values = open_memmap(path + '.tmp', mode='w+',
+                                 dtype=old_values.dtype, shape=shape)
+            values[:old_draws] = old_values
+            values.flush()
+            del values, old_values
+            self.samples[varname] = None
+            os.remove(path)
+            os.rename(path + '.tmp', path)
+            self.samples[varname] = np.load(path, mmap_mode='r+')
+
+    def setup_from_arrays(self, chain, samples, sampler_vars=None, stats=None):
+        """Write existing arrays of draws to the files of a chain.
+
+        See `NDArray.setup_from_arrays`."""
+        super(MemmapNDArray, self).setup_from_arrays(
+            chain, samples, sampler_vars, stats)
+        arrays, self.samples = self.samples, {}
+        self._setup_samples(self.draws)
+        for varname, values in arrays.items():
+            self.samples[varname][:] = values
+        self.draw_idx = self.draws
+
+    def close(self):
+        super(MemmapNDArray, self).close()
+        for values in self.samples.values():
+            values.flush()
+        serializer = self._serializer
+        metadata = serializer.to_metadata(self)
+        metadata['samples_files'] = serializer.samples_file_names(
+            self.varnames)
+        serializer.write_metadata(metadata)
+
+    def __getstate__(self):
+        # The samples are reopened from the files, instead of pickling
+        # the values
+        state = super(MemmapNDArray, self).__getstate__()
+        if self.samples:
+            state['samples'] = len(next(iter(self.samples.values())))
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if not isinstance(self.samples, dict):
+            serializer = self._serializer
+            file_names = serializer.samples_file_names(self.varnames)
+            self.samples = {
+                varname: np.load(
+                    os.path.join(serializer.directory, file_names[varname]),
+                    mmap_mode='r+')[:state['samples']]
+                for varname in self.varnames}
+
+
+def _extend(values, draws, buffer=None):
+    """Extend an array of draws by `draws` rows of zeros.
+
+    If `values` are the first rows of `buffer` and it has enough rows, the
+    result is a view of the buffer and nothing is copied. Otherwise a new
+    buffer with room for at least twice the number of draws is allocated,
+    so that repeatedly extending a trace by some draws costs amortized time
+    proportional to the new draws.
+
+    Returns
+    -------
+    The extended array and its buffer.
+    """
+    old_draws = len(values)
+    new_draws = old_draws + draws
+    if (buffer is not None and len(buffer) >= new_draws and
+            values.base is buffer and values.strides == buffer.strides and
+            (values.__array_interface__['data'][0] ==
+             buffer.__array_interface__['data'][0])):
+        extended = buffer[:new_draws]
+        # Rows after the valid draws may hold values of draws that were
+        # discarded by `close` or a continued sampling
+        extended[old_draws:] = 0
+        return extended, buffer
+    size = max(new_draws, 2 * old_draws)
+    buffer = np.zeros((size,) + values.shape[1:], dtype=values.dtype)
+    buffer[:old_draws] = values
+    return buffer[:new_draws], buffer
+
+
 def _slice_as_ndarray(strace, idx):
     sliced = NDArray(model=strace.model, vars=strace.vars)
     sliced.chain = strace.chain
+    sliced.online = strace._online_for_slice(idx)
 
     # Happy path where we do not need to load everything from the trace
     if ((idx.step is None or idx.step >= 1) and
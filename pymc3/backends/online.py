@@ -0,0 +1,284 @@
+"""Online summary statistics of traces
+
+Accumulators that are updated with every recorded draw of a chain, so that
+means, standard deviations, Monte Carlo errors, quantiles and convergence
+diagnostics are available during and after sampling without another pass
+over the stored draws. This is useful for backends that store the draws on
+disk, like SQLite or HDF5.
+
+The statistics of a trace are kept if `track_online` is called on the
+backend before sampling:
+
+    >>> import pymc3 as pm
+    >>> with model:
+    ...     db = pm.backends.SQLite('trace.sqlite')
+    ...     db.track_online(skip=500)
+    ...     trace = pm.sample(1000, tune=500, trace=db)
+    >>> pm.backends.online.summary(trace)
+
+The first `skip` draws of a chain, usually the tuning draws, are not
+included in the statistics.
+"""
+import numpy as np
+import pandas as pd
+
+from . import tracetab as ttab
+
+__all__ = ['OnlineStats', 'summary']
+
+
+class OnlineStats(object):
+    """Summary statistics of the draws of one chain, updated draw by draw.
+
+    All elements of all variables are accumulated together in one flat
+    vector, so that each update costs a few vectorized operations.
+
+    Parameters
+    ----------
+    varnames : list of str
+        Names of the variables, in the order of the values of `update`.
+    var_shapes : dict
+        Shapes of the variables, mapped to their names.
+    skip : int
+        Number of draws at the start that are ignored, usually the
+        tuning draws.
+    max_batches : int
+        Maximum number of batches for the batch means estimate of the Monte
+        Carlo error. When all batches are filled, neighbouring batches are
+        merged, so that the size of the batches grows with the number of
+        draws.
+    sketch_size : int
+        Number of draws kept in a uniform random sample of the draws
+        (reservoir sampling) to approximate quantiles. Set to 0 to not
+        estimate quantiles.
+    seed : int
+        Seed for the reservoir sampling. The global numpy random state is
+        not used, so sampling results do not depend on whether statistics
+        are tracked.
+    """
+    def __init__(self, varnames, var_shapes, skip=0, max_batches=64,
+                 sketch_size=1000, seed=None):
+        if max_batches < 2 or max_batches % 2:
+            raise ValueError('max_batches must be an even number >= 2.')
+        self.varnames = list(varnames)
+        self.var_shapes = {name: var_shapes[name] for name in self.varnames}
+        self.skip = skip
+        self.max_batches = max_batches
+        self.sketch_size = sketch_size
+
+        self._slices = {}
+        start = 0
+        for name in self.varnames:
+            size = int(np.prod(self.var_shapes[name], dtype=int))
+            self._slices[name] = slice(start, start + size)
+            start += size
+        self.n_elems = start
+
+        self.n_skipped = 0
+        self.count = 0
+        self._mean = np.zeros(self.n_elems)
+        self._m2 = np.zeros(self.n_elems)
+
+        self.batch_size = 1
+        self.n_batches = 0
+        self._batch_sums = np.zeros((max_batches, self.n_elems))
+        self._current_sum = np.zeros(self.n_elems)
+        self._current_count = 0
+
+        self._rng = np.random.RandomState(seed)
+        self._sketch = np.zeros((sketch_size, self.n_elems))
+
+    def update(self, values):
+        """Add a draw.
+
+        Parameters
+        ----------
+        values : list of arrays
+            Values of the variables, in the order of `varnames`.
+        """
+        if self.n_skipped < self.skip:
+            self.n_skipped += 1
+            return
+        x = np.concatenate([np.ravel(value) for value in values])
+        x = x.astype(float, copy=False)
+
+        # Welford's algorithm
+        self.count += 1
+        delta = x - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (x - self._mean)
+
+        # Batch means
+        self._current_sum += x
+        self._current_count += 1
+        if self._current_count == self.batch_size:
+            self._batch_sums[self.n_batches] = self._current_sum
+            self.n_batches += 1
+            self._current_sum[:] = 0
+            self._current_count = 0
+            if self.n_batches == self.max_batches:
+                sums = self._batch_sums
+                half = self.max_batches // 2
+                sums[:half] = sums[0::2] + sums[1::2]
+                sums[half:] = 0
+                self.n_batches = half
+                self.batch_size *= 2
+
+        # Reservoir sampling for the quantiles
+        if self.count <= self.sketch_size:
+            self._sketch[self.count - 1] = x
+        elif self.sketch_size > 0:
+            idx = self._rng.randint(self.count)
+            if idx < self.sketch_size:
+                self._sketch[idx] = x
+
+    def _reshape(self, varname, values):
+        """Select the elements of `varname` from flat statistics."""
+        values = values[..., self._slices[varname]]
+        return values.reshape(values.shape[:-1] + self.var_shapes[varname])
+
+    def mean(self, varname):
+        """Mean of the draws of `varname`."""
+        return self._reshape(varname, self._mean)
+
+    def var(self, varname, ddof=0):
+        """Variance of the draws of `varname`."""
+        if self.count <= ddof:
+            return self._reshape(varname, np.full(self.n_elems, np.nan))
+        return self._reshape(varname, self._m2 / (self.count - ddof))
+
+    def sd(self, varname, ddof=0):
+        """Standard deviation of the draws of `varname`."""
+        return np.sqrt(self.var(varname, ddof))
+
+    def _batch_means_var(self):
+        if self.n_batches < 2:
+            return np.full(self.n_elems, np.nan)
+        means = self._batch_sums[:self.n_batches] / self.batch_size
+        return np.var(means, axis=0, ddof=1)
+
+    def mc_error(self, varname):
+        """Batch means estimate of the Monte Carlo standard error of the
+        mean of `varname`."""
+        batch_var = self._batch_means_var()
+        return self._reshape(varname,
+                             np.sqrt(batch_var / max(1, self.n_batches)))
+
+    def n_eff(self, varname):
+        """Batch means estimate of the effective sample size of `varname`."""
+        batch_var = self._batch_means_var()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            n_eff = self.count * self._m2 / max(1, self.count - 1)
+            n_eff /= self.batch_size * batch_var
+        return self._reshape(varname, n_eff)
+
+    def sketch(self, varname):
+        """Uniform random sample of the draws of `varname`."""
+        n = min(self.count, self.sketch_size)
+        return self._reshape(varname, self._sketch[:n])
+
+    def quantiles(self, varname, qlist=(2.5, 25, 50, 75, 97.5)):
+        """Approximate quantiles of `varname` from the sample of the draws.
+
+        Returns a dictionary of arrays mapped to the percentiles."""
+        return _quantiles(self.sketch(varname), qlist)
+
+
+def _quantiles(sketch, qlist):
+    if len(sketch) == 0:
+        raise ValueError('No draws to compute quantiles.')
+    values = np.percentile(sketch, qlist, axis=0)
+    return dict(zip(qlist, values))
+
+
+def gelman_rubin(stats, varname):
+    """Gelman-Rubin statistic of `varname` from the online statistics of
+    several chains, as in `pymc3.diagnostics.gelman_rubin`."""
+    if len(stats) < 2:
+        raise ValueError('Gelman-Rubin diagnostic requires multiple chains.')
+    num_samples = np.mean([stat.count for stat in stats])
+    means = np.array([stat.mean(varname) for stat in stats])
+    variances = np.array([stat.var(varname, ddof=1) for stat in stats])
+    B = num_samples * np.var(means, axis=0, ddof=1)
+    W = np.mean(variances, axis=0)
+    Vhat = W * (num_samples - 1) / num_samples + B / num_samples
+    return np.sqrt(Vhat / W)
+
+
+def effective_n(stats, varname):
+    """Effective sample size of `varname` summed over the chains."""
+    return sum(stat.n_eff(varname) for stat in stats)
+
+
+def _online_stats(trace):
+    if hasattr(trace, '_straces'):
+        straces = [trace._straces[chain] for chain in trace.chains]
+    else:
+        straces = list(trace)
+    stats = [getattr(strace, 'online', None) for strace in straces]
+    if not stats or any(stat is None for stat in stats):
+        raise ValueError('Online statistics were not tracked for all '
+                         'chains. Call `track_online` on the backend '
+                         'before sampling.')
+    return stats
+
+
+def summary(trace, varnames=None, qlist=(2.5, 50, 97.5)):
+    """Summary of the online statistics of a trace, similar to
+    `pymc3.summary`, without reading the stored draws.
+
+    Parameters
+    ----------
+    trace : MultiTrace or list of backends
+        The chains, which must track online statistics.
+    varnames : list of str
+        Names of the variables in the summary, all by default.
+    qlist : list of floats
+        Percentiles of the approximate quantiles in the summary.
+
+    Returns
+    -------
+    `pandas.DataFrame` with one row per element of the variables, and
+    the columns `mean`, `sd`, `mc_error`, the quantiles, `n_eff` and
+    `Rhat` (only for several chains).
+    """
+    stats = _online_stats(trace)
+    if varnames is None:
+        varnames = stats[0].varnames
+    counts = np.array([stat.count for stat in stats], dtype=float)
+    weights = counts / counts.sum()
+
+    var_dfs = []
+    for var in varnames:
+        means = np.array([stat.mean(var) for stat in stats])
+        mean = np.tensordot(weights, means, axes=1)
+        # Pool the variances of the chains and the variance between them
+        variances = np.array([stat.var(var) for stat in stats])
+        var_ = np.tensordot(weights, variances + (means - mean) ** 2, axes=1)
+        mc_errors = np.array([stat.mc_error(var) for stat in stats])
+        mc_error = np.sqrt(np.tensordot(weights ** 2, mc_errors ** 2, axes=1))
+
+        columns = {'mean': mean, 'sd': np.sqrt(var_), 'mc_error': mc_error}
+        names = ['mean', 'sd', 'mc_error']
+        if all(stat.sketch_size > 0 for stat in stats):
+            # The union of the samples of chains of similar length is
+            # approximately a sample of all draws
+            sketch = np.concatenate([stat.sketch(var) for stat in stats])
+            quantiles = _quantiles(sketch, qlist)
+            for q in qlist:
+                name = 'q{0:g}'.format(q)
+                columns[name] = quantiles[q]
+                names.append(name)
+        columns['n_eff'] = effective_n(stats, var)
+        names.append('n_eff')
+        if len(stats) > 1:
+            columns['Rhat'] = gelman_rubin(stats, var)
+            names.append('Rhat')
+
+        shape = stats[0].var_shapes[var]
+        var_df = pd.DataFrame(
+            {name: np.ravel(columns[name]) for name in names},
+            columns=names)
+        var_df.index = ttab.create_flat_names(var, shape)
+        var_dfs.append(var_df)
+    return pd.concat(var_dfs, axis=0)
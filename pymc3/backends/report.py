@@ -2,6 +2,7 @@ from collections import namedtuple
 import logging
 import enum
 from ..util import is_transformed_name, get_untransformed_name
+from . import online
 
 
 logger = logging.getLogger('pymc3')
@@ -80,8 +81,20 @@ class SamplerReport(object):
             if rv_name in trace.varnames:
                 varnames.append(rv_name)
 
-        self._effective_n = effective_n = diagnostics.effective_n(trace, varnames)
-        self._gelman_rubin = gelman_rubin = diagnostics.gelman_rubin(trace, varnames)
+        straces = [trace._straces[chain] for chain in trace.chains]
+        stats = [getattr(strace, 'online', None) for strace in straces]
+        if all(stat is not None and stat.count == len(strace)
+               for stat, strace in zip(stats, straces)):
+            # Avoid reading the draws if the chains kept online statistics
+            effective_n = {var: online.effective_n(stats, var)
+                           for var in varnames}
+            gelman_rubin = {var: online.gelman_rubin(stats, var)
+                            for var in varnames}
+        else:
+            effective_n = diagnostics.effective_n(trace, varnames)
+            gelman_rubin = diagnostics.gelman_rubin(trace, varnames)
+        self._effective_n = effective_n
+        self._gelman_rubin = gelman_rubin
 
         warnings = []
         rhat_max = max(val.max() for val in gelman_rubin.values())
@@ -0,0 +1,166 @@
+"""In-memory stage storage for SMC with optional checkpoints
+
+Only the end points of the last completed stage and the state of the step
+method are kept, which is all the next stage needs. Optionally, they are
+written to disk every few stages in a background thread, so that sampling
+can be resumed from a completed stage.
+
+File format
+-----------
+
+The checkpoint of a stage is stored in the directory `stage_<stage>` under
+the base directory. It consists of
+
+  population.npz : array_population and outputs of the population, as
+                   written by :func:`numpy.savez`
+  atmip.params.pkl : the pickled SMC step method
+
+Both files are written to `stage_<stage>.tmp` first, and the directory is
+renamed once they are complete, so that a stage directory always holds a
+complete checkpoint.
+"""
+from glob import glob
+import os
+import pickle
+import shutil
+import threading
+
+import numpy as np
+import pymc3 as pm
+
+__all__ = ['MemoryStage']
+
+
+class MemoryStage(object):
+    """Store the population of the last completed SMC stage.
+
+    Parameters
+    ----------
+    base_dir : str
+        Directory for the checkpoints. If None, nothing is written to disk.
+    checkpoint_interval : int
+        Write a checkpoint every `checkpoint_interval` completed stages. If
+        0, no checkpoints are written.
+    """
+
+    def __init__(self, base_dir=None, checkpoint_interval=0):
+        self.base_dir = base_dir
+        self.checkpoint_interval = checkpoint_interval
+        if self.checkpointing and not os.path.isdir(base_dir):
+            os.makedirs(base_dir)
+
+        self.step = None
+        self.array_population = None
+        self.outputs = None
+        self._thread = None
+
+    @property
+    def checkpointing(self):
+        return self.base_dir is not None and self.checkpoint_interval > 0
+
+    def stage_path(self, stage):
+        return os.path.join(self.base_dir, 'stage_{}'.format(stage))
+
+    def stage_number(self, stage_path):
+        """Inverse function of MemoryStage.stage_path"""
+        return int(os.path.basename(stage_path).split('_')[-1])
+
+    def stage_paths(self):
+        """Return the directories of all complete checkpoints."""
+        return [path for path in glob(self.stage_path('*'))
+                if os.path.basename(path).split('_')[-1].isdigit()]
+
+    def clean_directory(self, rm_flag):
+        """Remove the checkpoints of previous runs. Does nothing if rm_flag is False."""
+        if not rm_flag or self.base_dir is None:
+            return
+        for path in glob(self.stage_path('*')):
+            pm._log.info('Removing previous sampling results ... %s' % path)
+            shutil.rmtree(path)
+
+    def update(self, step, array_population, outputs):
+        """Keep the end points of the stage `step.stage`, which has just been completed.
+
+        The arrays are stored without copying them, so they must not be changed in place
+        afterwards.
+        """
+        self.step = step
+        self.array_population = array_population
+        self.outputs = outputs
+        if self.checkpointing and step.stage % self.checkpoint_interval == 0:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Write the stored stage to disk in a background thread."""
+        self.wait()
+        # Pickle the step now, as it keeps changing while sampling continues
+        params = pickle.dumps(self.step, protocol=pickle.HIGHEST_PROTOCOL)
+        self._thread = threading.Thread(
+            target=self._write,
+            args=(self.step.stage, params, self.array_population, self.outputs))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _write(self, stage, params, array_population, outputs):
+        path = self.stage_path(stage)
+        # Write to a temporary directory first, so that an interrupted
+        # checkpoint never replaces a complete one
+        tmp_path = path + '.tmp'
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        np.savez(os.path.join(tmp_path, 'population.npz'),
+                 array_population=array_population, outputs=outputs)
+        with open(os.path.join(tmp_path, 'atmip.params.pkl'), 'wb') as buff:
+            buff.write(params)
+        if os.path.isdir(path):
+            # A directory can not be renamed onto a non-empty one
+            old_path = path + '.old'
+            os.rename(path, old_path)
+            os.rename(tmp_path, path)
+            shutil.rmtree(old_path)
+        else:
+            os.rename(tmp_path, path)
+
+    def wait(self):
+        """Wait until the last checkpoint is written."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def highest_checkpoint(self):
+        """Return the number of the last completed stage with a checkpoint."""
+        stages = [self.stage_number(path) for path in self.stage_paths()]
+        stages = [stage for stage in stages if stage >= 0]
+        if not stages:
+            raise ValueError('No checkpoints in %s.' % self.base_dir)
+        return max(stages)
+
+    def load(self, stage, model):
+        """Load the checkpoint of the stage before `stage`, to continue sampling at `stage`.
+
+        Parameters
+        ----------
+        stage : int
+            Stage to continue with, or -1 to continue after the last checkpoint
+        model : Model
+
+        Returns
+        -------
+        step, array_population, outputs
+        """
+        if self.base_dir is None:
+            raise ValueError('Stages can only be loaded from a directory.')
+        prev = self.highest_checkpoint() if stage == -1 else stage - 1
+        pm._log.info('Loading checkpoint of completed stage {}'.format(prev))
+        path = self.stage_path(prev)
+        with model:
+            with open(os.path.join(path, 'atmip.params.pkl'), 'rb') as buff:
+                step = pickle.load(buff)
+        with np.load(os.path.join(path, 'population.npz')) as data:
+            array_population = data['array_population']
+            outputs = data['outputs']
+        self.step = step
+        self.array_population = array_population
+        self.outputs = outputs
+        return step, array_population, outputs
@@ -6,51 +6,52 @@ Database format
 ---------------
 For each variable, a table is created with the following format:
 
- recid (INT), draw (INT), chain (INT),  v0 (FLOAT), v1 (FLOAT), v2 (FLOAT) ...
+ chain (INT), draw (INT), value (BLOB)
+
+The value column holds the raw bytes of the flattened values of the
+variable in a draw, in the dtype of the variable in the model. The
+primary key (chain, draw) indexes the table, so that selections of a
+chain and a range of draws only read the rows they return. The chain
+column denotes the chain index and starts at 0.
 
-The variable column names are extended to reflect additional dimensions.
-For example, a variable with the shape (2, 2) would be stored as
+Draws are buffered in memory and written with one `executemany` per
+variable in a single transaction every `buffer_size` draws.
 
- key (INT), draw (INT), chain (INT),  v0_0 (FLOAT), v0_1 (FLOAT), v1_0 (FLOAT) ...
+Older versions of the backend stored each element of a variable in its
+own column, in tables with the columns
 
-The key is autoincremented each time a new row is added to the table.
-The chain column denotes the chain index and starts at 0.
+ recid (INT), draw (INT), chain (INT),  v0 (FLOAT), v1 (FLOAT), v2 (FLOAT) ...
+
+`load` converts such databases to the current format in place.
 """
 import numpy as np
 import sqlite3
 
 from ..backends import base, ndarray
-from . import tracetab as ttab
 
 TEMPLATES = {
     'table':            ('CREATE TABLE IF NOT EXISTS [{table}] '
-                         '(recid INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, '
-                         'draw INTEGER, chain INT(5), '
-                         '{value_cols})'),
-    'insert':           ('INSERT INTO [{table}] '
-                         '(recid, draw, chain, {value_cols}) '
-                         'VALUES (NULL, ?, ?, {values})'),
+                         '(chain INTEGER NOT NULL, draw INTEGER NOT NULL, '
+                         'value BLOB NOT NULL, PRIMARY KEY (chain, draw)) '
+                         'WITHOUT ROWID'),
+    'insert':           ('INSERT INTO [{table}] (chain, draw, value) '
+                         'VALUES (?, ?, ?)'),
     'max_draw':         ('SELECT MAX(draw) FROM [{table}] '
                          'WHERE chain = ?'),
+    'min_draw':         ('SELECT MIN(draw) FROM [{table}] '
+                         'WHERE chain = ?'),
     'draw_count':       ('SELECT COUNT(*) FROM [{table}] '
                          'WHERE chain = ?'),
     # Named placeholders are used in the selection templates because
     # some values occur more than once in the same template.
-    'select':           ('SELECT * FROM [{table}] '
-                         'WHERE (chain = :chain)'),
-    'select_burn':      ('SELECT * FROM [{table}] '
-                         'WHERE (chain = :chain) AND (draw > :burn)'),
-    'select_thin':      ('SELECT * FROM [{table}] '
-                         'WHERE (chain = :chain) AND '
-                         '(draw - (SELECT draw FROM [{table}] '
-                         'WHERE chain = :chain '
-                         'ORDER BY draw LIMIT 1)) % :thin = 0'),
-    'select_burn_thin': ('SELECT * FROM [{table}] '
-                         'WHERE (chain = :chain) AND (draw > :burn) '
-                         'AND (draw - (SELECT draw FROM [{table}] '
-                         'WHERE (chain = :chain) AND (draw > :burn) '
-                         'ORDER BY draw LIMIT 1)) % :thin = 0'),
-    'select_point':     ('SELECT * FROM [{table}] '
+    'select':           ('SELECT value FROM [{table}] '
+                         'WHERE (chain = :chain) AND (draw >= :start) '
+                         'ORDER BY draw'),
+    'select_thin':      ('SELECT value FROM [{table}] '
+                         'WHERE (chain = :chain) AND (draw >= :start) '
+                         'AND (draw - :start) % :thin = 0 '
+                         'ORDER BY draw'),
+    'select_point':     ('SELECT value FROM [{table}] '
                          'WHERE (chain = :chain) AND (draw = :draw)'),
 }
 
@@ -72,12 +73,14 @@ class SQLite(base.BaseTrace):
         `model.unobserved_RVs` is used.
     test_point : dict
         use different test point that might be with changed variables shapes
+    buffer_size : int
+        Number of draws that are kept in memory before they are written
+        to the database in one transaction.
     """
 
-    def __init__(self, name, model=None, vars=None, test_point=None):
+    def __init__(self, name, model=None, vars=None, test_point=None,
+                 buffer_size=1000):
         super(SQLite, self).__init__(name, model, vars, test_point)
-        self._var_cols = {}
-        self.var_inserts = {}  # varname -> insert statement
         self.draw_idx = 0
         self._is_setup = False
         self._len = None
@@ -87,7 +90,7 @@ class SQLite(base.BaseTrace):
         # caused by hitting the database with transactions each
         # iteration.
         self._queue = {varname: [] for varname in self.varnames}
-        self._queue_limit = 5000
+        self._queue_limit = buffer_size
 
     # Sampling methods
 
@@ -108,35 +111,14 @@ class SQLite(base.BaseTrace):
             self.draw_idx = self._get_max_draw(chain) + 1
             self._len = None
         else:  # Table has not been created.
-            self._var_cols = {varname: ttab.create_flat_names('v', shape)
-                              for varname, shape in self.var_shapes.items()}
             self._create_table()
             self._is_setup = True
-        self._create_insert_queries()
 
     def _create_table(self):
         template = TEMPLATES['table']
         with self.db.con:
-            for varname, var_cols in self._var_cols.items():
-                if np.issubdtype(self.var_dtypes[varname], np.int):
-                    dtype = 'INT'
-                else:
-                    dtype = 'FLOAT'
-                colnames = ', '.join([v + ' ' + dtype for v in var_cols])
-                statement = template.format(table=varname,
-                                            value_cols=colnames)
-                self.db.cursor.execute(statement)
-
-    def _create_insert_queries(self):
-        template = TEMPLATES['insert']
-        for varname, var_cols in self._var_cols.items():
-            # Create insert statement for each variable.
-            var_str = ', '.join(var_cols)
-            placeholders = ', '.join(['?'] * len(var_cols))
-            statement = template.format(table=varname,
-                                        value_cols=var_str,
-                                        values=placeholders)
-            self.var_inserts[varname] = statement
+            for varname in self.varnames:
+                self.db.cursor.execute(template.format(table=varname))
 
     def record(self, point):
         """Record results of a sampling iteration.
@@ -146,21 +128,26 @@ class SQLite(base.BaseTrace):
         point : dict
             Values mapped to variable names
         """
-        for varname, value in zip(self.varnames, self.fn(point)):
-            values = (self.draw_idx, self.chain) + tuple(np.ravel(value))
-            self._queue[varname].append(values)
-
-        if len(self._queue[self.varnames[0]]) > self._queue_limit:
+        values = self.fn(point)
+        for varname, value in zip(self.varnames, values):
+            value = np.ascontiguousarray(value, self.var_dtypes[varname])
+            row = (self.chain, self.draw_idx, sqlite3.Binary(value.tobytes()))
+            self._queue[varname].append(row)
+        self._record_online(values)
+
+        if len(self._queue[self.varnames[0]]) >= self._queue_limit:
             self._execute_queue()
         self.draw_idx += 1
 
     def _execute_queue(self):
+        if not self._queue[self.varnames[0]]:
+            return
+        self.db.connect()
+        self._len = None
         with self.db.con:
             for varname in self.varnames:
-                if not self._queue[varname]:
-                    continue
-                self.db.cursor.executemany(self.var_inserts[varname],
-                                           self._queue[varname])
+                statement = TEMPLATES['insert'].format(table=varname)
+                self.db.cursor.executemany(statement, self._queue[varname])
                 self._queue[varname] = []
 
     def close(self):
@@ -174,7 +161,8 @@ class SQLite(base.BaseTrace):
             return 0
         if self._len is None:
             self._len = self._get_number_draws()
-        return self._len
+        # Queued draws are counted without writing them
+        return self._len + len(self._queue[self.varnames[0]])
 
     def _get_number_draws(self):
         self.db.connect()
@@ -187,14 +175,20 @@ class SQLite(base.BaseTrace):
             return counts
 
     def _get_max_draw(self, chain):
+        return self._get_draw('max_draw', chain)
+
+    def _get_min_draw(self, chain):
+        return self._get_draw('min_draw', chain)
+
+    def _get_draw(self, action, chain):
         self.db.connect()
-        statement = TEMPLATES['max_draw'].format(table=self.varnames[0])
+        statement = TEMPLATES[action].format(table=self.varnames[0])
         self.db.cursor.execute(statement, (chain, ))
-        counts = self.db.cursor.fetchall()[0][0]
-        if counts is None:
+        draw = self.db.cursor.fetchall()[0][0]
+        if draw is None:
             return 0
         else:
-            return counts
+            return draw
 
     def get_values(self, varname, burn=0, thin=1):
         """Get values from trace.
@@ -220,27 +214,26 @@ class SQLite(base.BaseTrace):
             raise ValueError('Only positive thin values are supported '
                              'in SQLite backend.')
         varname = str(varname)
+        self._execute_queue()
 
-        statement_args = {'chain': self.chain}
-        if burn == 0 and thin == 1:
+        statement_args = {'chain': self.chain,
+                          'start': self._get_min_draw(self.chain) + burn}
+        if thin == 1:
             action = 'select'
-        elif thin == 1:
-            action = 'select_burn'
-            statement_args['burn'] = burn - 1
-        elif burn == 0:
-            action = 'select_thin'
-            statement_args['thin'] = thin
         else:
-            action = 'select_burn_thin'
-            statement_args['burn'] = burn - 1
+            action = 'select_thin'
             statement_args['thin'] = thin
 
-        self.db.connect()
-        shape = (-1,) + self.var_shapes[varname]
         statement = TEMPLATES[action].format(table=varname)
         self.db.cursor.execute(statement, statement_args)
-        values = _rows_to_ndarray(self.db.cursor)
-        return values.reshape(shape)
+        return self._rows_to_ndarray(varname, self.db.cursor.fetchall())
+
+    def _rows_to_ndarray(self, varname, rows):
+        """Convert the value blobs of `rows` to an array of draws."""
+        shape = (len(rows),) + self.var_shapes[varname]
+        data = b''.join(bytes(row[0]) for row in rows)
+        values = np.frombuffer(data, dtype=self.var_dtypes[varname])
+        return values.reshape(shape).copy()
 
     def _slice(self, idx):
         if idx.stop is not None:
@@ -252,17 +245,18 @@ class SQLite(base.BaseTrace):
         with variables names as keys.
         """
         idx = int(idx)
+        self._execute_queue()
+        self.db.connect()
         if idx < 0:
             idx = self._get_max_draw(self.chain) + idx + 1
         statement = TEMPLATES['select_point']
-        self.db.connect()
         var_values = {}
         statement_args = {'chain': self.chain, 'draw': idx}
         for varname in self.varnames:
             self.db.cursor.execute(statement.format(table=varname),
                                    statement_args)
-            values = _rows_to_ndarray(self.db.cursor)
-            var_values[varname] = values.reshape(self.var_shapes[varname])
+            values = self._rows_to_ndarray(varname, self.db.cursor.fetchall())
+            var_values[varname] = values[0]
         return var_values
 
 
@@ -303,6 +297,10 @@ def load(name, model=None):
     Returns
     -------
     A MultiTrace instance
+
+    Databases in the format of older versions of the backend, with one
+    column per element of a variable, are converted to the current format
+    in place, see `convert_old_format`.
     """
     db = _SQLiteDB(name)
     db.connect()
@@ -310,14 +308,16 @@ def load(name, model=None):
     if len(varnames) == 0:
         raise ValueError(('Can not get variable list for database'
                           '`{}`'.format(name)))
+    if _is_old_format(db.cursor, varnames[0]):
+        db.close()
+        convert_old_format(name, model=model)
+        db.connect()
     chains = _get_chain_list(db.cursor, varnames[0])
 
     straces = []
     for chain in chains:
         strace = SQLite(name, model=model)
         strace.chain = chain
-        strace._var_cols = {varname: ttab.create_flat_names('v', shape)
-                            for varname, shape in strace.var_shapes.items()}
         strace._is_setup = True
         strace.db = db  # Share the db with all traces.
         straces.append(strace)
@@ -334,10 +334,75 @@ def _get_table_list(cursor):
     return [row[0] for row in cursor.fetchall()]
 
 
+def convert_old_format(name, model=None):
+    """Convert a database written by an older version of the backend,
+    with one column per element of a variable, to the current format.
+
+    The tables are rewritten in place. The values are stored in the dtype
+    of the variables in the model, variables that are not in the model
+    keep the integer or float type of their columns.
+
+    Parameters
+    ----------
+    name : str
+        Path to SQLite database file
+    model : Model
+        If None, the model is taken from the `with` context.
+    """
+    var_dtypes = SQLite(name, model=model).var_dtypes
+    db = _SQLiteDB(name)
+    db.connect()
+    cursor = db.cursor
+    try:
+        for varname in _get_table_list(cursor):
+            if not _is_old_format(cursor, varname):
+                continue
+            columns = _get_var_strs(cursor, varname)
+            dtype = var_dtypes.get(varname)
+            if dtype is None:
+                int_columns = [col_type.upper().startswith('INT')
+                               for _, col_type in columns]
+                dtype = np.int64 if all(int_columns) else np.float64
+            cursor.execute('SELECT chain, draw, {} FROM [{}] '
+                           'ORDER BY chain, draw'.format(
+                               ', '.join('[{}]'.format(col_name)
+                                         for col_name, _ in columns),
+                               varname))
+            rows = [(row[0], row[1],
+                     sqlite3.Binary(np.array(row[2:], dtype=dtype).tobytes()))
+                    for row in cursor.fetchall()]
+            # Write the new table before the old one is dropped
+            new_table = varname + '__converted'
+            with db.con:
+                cursor.execute(TEMPLATES['table'].format(table=new_table))
+                cursor.executemany(
+                    TEMPLATES['insert'].format(table=new_table), rows)
+            with db.con:
+                cursor.execute('DROP TABLE [{}]'.format(varname))
+                cursor.execute('ALTER TABLE [{}] RENAME TO [{}]'.format(
+                    new_table, varname))
+    finally:
+        db.close()
+
+
+def _get_columns(cursor, varname):
+    """Return the names and declared types of the columns of a table."""
+    cursor.execute('PRAGMA table_info([{}])'.format(varname))
+    return [(row[1], row[2]) for row in cursor.fetchall()]
+
+
+def _is_old_format(cursor, varname):
+    """Whether the table of `varname` has one column per element of the
+    variable, as written by older versions of the backend."""
+    return 'value' not in [name for name, _ in _get_columns(cursor, varname)]
+
+
 def _get_var_strs(cursor, varname):
-    cursor.execute('SELECT * FROM [{}]'.format(varname))
-    col_names = (col_descr[0] for col_descr in cursor.description)
-    return [name for name in col_names if name.startswith('v')]
+    """Return the names and declared types of the value columns of a
+    table in the format of older versions of the backend, in the order of
+    the flattened values."""
+    return [(name, col_type) for name, col_type in _get_columns(cursor, varname)
+            if name not in ('recid', 'draw', 'chain')]
 
 
 def _get_chain_list(cursor, varname):
@@ -347,7 +412,3 @@ def _get_chain_list(cursor, varname):
     chains.sort()
     return chains
 
-
-def _rows_to_ndarray(cursor):
-    """Convert SQL row to NDArray."""
-    return np.squeeze(np.array([row[3:] for row in cursor.fetchall()]))
@@ -93,10 +93,12 @@ class Text(base.BaseTrace):
             Values mapped to variable names
         """
         vals = {}
-        for varname, value in zip(self.varnames, self.fn(point)):
+        values = self.fn(point)
+        for varname, value in zip(self.varnames, values):
             vals[varname] = value.ravel()
         columns = [str(val) for var in self.varnames for val in vals[var]]
         self._fh.write(','.join(columns) + '\n')
+        self._record_online(values)
 
     def close(self):
         if self._fh is not None:
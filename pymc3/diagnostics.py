@@ -1,12 +1,113 @@
 """Convergence diagnostics and model validation"""
 
 import numpy as np
-from .stats import statfunc, autocov
+from .stats import statfunc
 from .util import get_default_varnames
 from .backends.base import MultiTrace
 
 __all__ = ['geweke', 'gelman_rubin', 'effective_n']
 
+# Maximum number of values in the FFT buffers of `_get_neff`. The elements
+# of a variable are processed in chunks so that this is not exceeded.
+_FFT_BUFFER_SIZE = 2 ** 23
+
+
+def _chain_array(values):
+    """Reshape the draws of a variable to `(chains, draws, n_elems)`.
+
+    Returns the reshaped array and the shape of the variable."""
+    x = np.asarray(values)
+    shape = x.shape[2:]
+    return x.reshape(x.shape[:2] + (-1,)), shape
+
+
+def _elemwise_result(values, shape):
+    """Reshape a result for the flattened elements to the shape of the
+    variable, or a float for scalars."""
+    if shape == ():
+        return values[0]
+    return values.reshape(shape)
+
+
+def _get_rhat(x):
+    """Gelman-Rubin statistic for each element of an array of shape
+    `(chains, draws, n_elems)`."""
+    num_samples = x.shape[1]
+    # Calculate between-chain variance
+    B = num_samples * np.var(np.mean(x, axis=1), axis=0, ddof=1)
+
+    # Calculate within-chain variance
+    W = np.mean(np.var(x, axis=1, ddof=1), axis=0)
+
+    # Estimate of marginal posterior variance
+    Vhat = W * (num_samples - 1) / num_samples + B / num_samples
+
+    return np.sqrt(Vhat / W)
+
+
+def _autocov(x):
+    """Autocovariances along the draw axis of an array of shape
+    `(chains, draws, n_elems)`, computed with one FFT for all chains and
+    elements.
+
+    As in `stats.autocov`, the sum of products at lag t is divided by the
+    number of its terms, `draws - t`.
+    """
+    n_samples = x.shape[1]
+    y = x - x.mean(axis=1, keepdims=True)
+    n_fft = 2 ** int(np.ceil(np.log2(2 * n_samples - 1)))
+    transform = np.fft.rfft(y, n=n_fft, axis=1)
+    acov = np.fft.irfft(transform * np.conj(transform), n=n_fft, axis=1)
+    acov = acov[:, :n_samples]
+    acov /= np.arange(n_samples, 0, -1)[None, :, None]
+    return acov
+
+
+def _get_neff(x):
+    """Effective sample size for each element of an array of shape
+    `(chains, draws, n_elems)`.
+
+    Geyer's initial positive and initial monotone sequences are computed
+    for all elements at once, using cumulative products and minimums over
+    the sums of pairs of autocorrelations.
+    """
+    nchain, n_samples, n_elems = x.shape
+    chunk = max(1, _FFT_BUFFER_SIZE // (2 * nchain * n_samples))
+    if n_elems > chunk:
+        return np.concatenate([_get_neff(x[:, :, i:i + chunk])
+                               for i in range(0, n_elems, chunk)])
+
+    acov = _autocov(x)
+
+    chain_mean = x.mean(axis=1)
+    chain_var = acov[:, 0] * n_samples / (n_samples - 1.)
+    acov_t = acov[:, 1] * n_samples / (n_samples - 1.)
+    mean_var = np.mean(chain_var, axis=0)
+    var_plus = mean_var * (n_samples - 1.) / n_samples
+    var_plus += np.var(chain_mean, axis=0, ddof=1)
+
+    rho_hat_t = 1. - (mean_var - np.mean(acov, axis=0)) / var_plus
+    rho_hat_first = 1. + 1. - (mean_var - np.mean(acov_t, axis=0)) / var_plus
+
+    # Sums of the pairs of autocorrelations at lags (2k, 2k + 1) for
+    # k >= 1, as far as Geyer's initial positive sequence may reach
+    n_pairs = len(range(1, n_samples - 2, 2))
+    pairs = rho_hat_t[2:2 + 2 * n_pairs].reshape(n_pairs, 2, n_elems)
+    pairs = pairs.sum(axis=1)
+
+    # Geyer's initial positive sequence: all pairs before the first
+    # negative one
+    positive = np.cumprod(pairs >= 0, axis=0).astype(bool)
+    positive &= rho_hat_first >= 0
+    pairs = np.where(positive, pairs, 0.)
+
+    # Geyer's initial monotone sequence
+    pairs = np.minimum.accumulate(pairs, axis=0)
+
+    ess = nchain * n_samples
+    ess = ess / (-1. + 2. * (rho_hat_first + pairs.sum(axis=0)))
+    return ess
+
 
 @statfunc
 def geweke(x, first=.1, last=.5, intervals=20):
@@ -142,21 +243,13 @@ def gelman_rubin(mtrace, varnames=None, include_transformed=False):
     Brooks and Gelman (1998)
     Gelman and Rubin (1992)"""
 
-    def rscore(x, num_samples):
-        # Calculate between-chain variance
-        B = num_samples * np.var(np.mean(x, axis=1), axis=0, ddof=1)
-
-        # Calculate within-chain variance
-        W = np.mean(np.var(x, axis=1, ddof=1), axis=0)
-
-        # Estimate of marginal posterior variance
-        Vhat = W * (num_samples - 1) / num_samples + B / num_samples
-
-        return np.sqrt(Vhat / W)
+    def rscore(values):
+        x, shape = _chain_array(values)
+        return _elemwise_result(_get_rhat(x), shape)
 
     if not isinstance(mtrace, MultiTrace):
         # Return rscore for passed arrays
-        return rscore(np.array(mtrace), mtrace.shape[1])
+        return rscore(mtrace)
 
     if mtrace.nchains < 2:
         raise ValueError(
@@ -169,9 +262,7 @@ def gelman_rubin(mtrace, varnames=None, include_transformed=False):
     Rhat = {}
 
     for var in varnames:
-        x = np.array(mtrace.get_values(var, combine=False))
-        num_samples = x.shape[1]
-        Rhat[var] = rscore(x, num_samples)
+        Rhat[var] = rscore(mtrace.get_values(var, combine=False))
 
     return Rhat
 
@@ -212,75 +303,9 @@ def effective_n(mtrace, varnames=None, include_transformed=False):
     ----------
     Gelman et al. BDA (2014)"""
 
-    def get_neff(x):
-        """Compute the effective sample size for a 2D array
-        """
-        trace_value = x.T
-        nchain, n_samples = trace_value.shape
-
-        acov = np.asarray([autocov(trace_value[chain]) for chain in range(nchain)])
-
-        chain_mean = trace_value.mean(axis=1)
-        chain_var = acov[:, 0] * n_samples / (n_samples - 1.)
-        acov_t = acov[:, 1] * n_samples / (n_samples - 1.)
-        mean_var = np.mean(chain_var)
-        var_plus = mean_var * (n_samples - 1.) / n_samples
-        var_plus += np.var(chain_mean, ddof=1)
-
-        rho_hat_t = np.zeros(n_samples)
-        rho_hat_even = 1.
-        rho_hat_t[0] = rho_hat_even
-        rho_hat_odd = 1. - (mean_var - np.mean(acov_t)) / var_plus
-        rho_hat_t[1] = rho_hat_odd
-        # Geyer's initial positive sequence
-        max_t = 1
-        t = 1
-        while t < (n_samples - 2) and (rho_hat_even + rho_hat_odd) >= 0.:
-            rho_hat_even = 1. - (mean_var - np.mean(acov[:, t + 1])) / var_plus
-            rho_hat_odd = 1. - (mean_var - np.mean(acov[:, t + 2])) / var_plus
-            if (rho_hat_even + rho_hat_odd) >= 0:
-                rho_hat_t[t + 1] = rho_hat_even
-                rho_hat_t[t + 2] = rho_hat_odd
-            max_t = t + 2
-            t += 2
-
-        # Geyer's initial monotone sequence
-        t = 3
-        while t <= max_t - 2:
-            if (rho_hat_t[t + 1] + rho_hat_t[t + 2]) > (rho_hat_t[t - 1] + rho_hat_t[t]):
-                rho_hat_t[t + 1] = (rho_hat_t[t - 1] + rho_hat_t[t]) / 2.
-                rho_hat_t[t + 2] = rho_hat_t[t + 1]
-            t += 2
-        ess = nchain * n_samples
-        ess = ess / (-1. + 2. * np.sum(rho_hat_t))
-        return ess
-
     def generate_neff(trace_values):
-        x = np.array(trace_values)
-        shape = x.shape
-
-        # Make sure to handle scalars correctly, adding extra dimensions if
-        # needed. We could use np.squeeze here, but we don't want to squeeze
-        # out dummy dimensions that a user inputs.
-        if len(shape) == 2:
-            x = np.atleast_3d(trace_values)
-
-        # Transpose all dimensions, which makes the loop below
-        # easier by moving the axes of the variable to the front instead
-        # of the chain and sample axes.
-        x = x.transpose()
-
-        # Get an array the same shape as the var
-        _n_eff = np.zeros(x.shape[:-2])
-
-        # Iterate over tuples of indices of the shape of var
-        for tup in np.ndindex(*list(x.shape[:-2])):
-            _n_eff[tup] = get_neff(x[tup])
-
-        if len(shape) == 2:
-            return _n_eff[0]
-
-        return np.transpose(_n_eff)
+        x, shape = _chain_array(trace_values)
+        return _elemwise_result(_get_neff(x), shape)
 
     if not isinstance(mtrace, MultiTrace):
         # Return neff for non-multitrace array
@@ -212,6 +212,48 @@ class DensityDist(Distribution):
 
 
 
+class BatchedPoint(dict):
+    """A point whose values have a leading sample dimension.
+
+    Passing it to the `random` method of a distribution, together with
+    `size=samples`, draws one value for each sample from the values of
+    that sample. `draw_values` evaluates theano expressions sample by
+    sample and broadcasts the parameters that depend on the point to
+    `(samples,) + shape`, so that the sample dimension is never mistaken
+    for a dimension of the variable.
+
+    Parameters
+    ----------
+    values : dict
+        Values of the variables, each with a leading sample dimension
+    samples : int
+        Length of the sample dimension
+    shape : tuple
+        Shape of a single draw of the variable
+    """
+
+    def __init__(self, values, samples, shape):
+        super(BatchedPoint, self).__init__(values)
+        self.samples = samples
+        self.shape = tuple(shape)
+
+    def align(self, param, value):
+        """Broadcast the value of `param` to `(samples,) + shape` if it
+        has the sample dimension."""
+        ndim = getattr(param, 'ndim', None)
+        if ndim is None or np.ndim(value) != ndim + 1:
+            return value
+        if ndim > len(self.shape):
+            raise ValueError('Parameter of shape %s can not be broadcast to '
+                             'draws of shape %s.'
+                             % (np.shape(value)[1:], self.shape))
+        value = np.asarray(value)
+        value = value.reshape((self.samples,) +
+                              (1,) * (len(self.shape) - ndim) +
+                              value.shape[1:])
+        return np.broadcast_to(value, (self.samples,) + self.shape)
+
+
 def draw_values(params, point=None, size=None):
     """
     Draw (fix) parameter values. Handles a number of cases:
@@ -229,37 +271,25 @@ def draw_values(params, point=None, size=None):
             a) are named parameters in the point
             b) are *RVs with a random method
 
+    If `point` is a `BatchedPoint`, the values of the parameters that
+    depend on it have a leading sample dimension and are broadcast to the
+    shape of the draws.
     """
     # Distribution parameters may be nodes which have named node-inputs
     # specified in the point. Need to find the node-inputs, their
-    # parents and children to replace them.
-    leaf_nodes = {}
-    named_nodes_parents = {}
-    named_nodes_children = {}
-    for param in params:
-        if hasattr(param, 'name'):
-            # Get the named nodes under the `param` node
-            nn, nnp, nnc = get_named_nodes_and_relations(param)
-            leaf_nodes.update(nn)
-            # Update the discovered parental relationships
-            for k in nnp.keys():
-                if k not in named_nodes_parents.keys():
-                    named_nodes_parents[k] = nnp[k]
-                else:
-                    named_nodes_parents[k].update(nnp[k])
-            # Update the discovered child relationships
-            for k in nnc.keys():
-                if k not in named_nodes_children.keys():
-                    named_nodes_children[k] = nnc[k]
-                else:
-                    named_nodes_children[k].update(nnc[k])
+    # parents and children to replace them. This only depends on the
+    # graphs of the params, so it is looked up in a cached plan.
+    plan_key = tuple(param if hasattr(param, 'name') else None
+                     for param in params)
+    (leaf_nodes, named_nodes_parents,
+     named_nodes_children, order) = _draw_values_plan(plan_key)
 
     # Init givens and the stack of nodes to try to `_draw_value` from
     givens = {}
     stored = set()  # Some nodes
-    stack = list(leaf_nodes.values())  # A queue would be more appropriate
+    stack = collections.deque(leaf_nodes)
     while stack:
-        next_ = stack.pop(0)
+        next_ = stack.popleft()
         if next_ in stored:
             # If the node already has a givens value, skip it
             continue
@@ -301,15 +331,16 @@ def draw_values(params, point=None, size=None):
 
     # the below makes sure the graph is evaluated in order
     # test_distributions_random::TestDrawValues::test_draw_order fails without it
+    # The plan orders the params such that, usually, a single pass suffices
     params = dict(enumerate(params))  # some nodes are not hashable
     evaluated = {}
-    to_eval = set()
-    missing_inputs = set(params)
+    to_eval = []
+    missing_inputs = list(order)
     while to_eval or missing_inputs:
         if to_eval == missing_inputs:
             raise ValueError('Cannot resolve inputs for {}'.format([str(params[j]) for j in to_eval]))
-        to_eval = set(missing_inputs)
-        missing_inputs = set()
+        to_eval = missing_inputs
+        missing_inputs = []
         for param_idx in to_eval:
             param = params[param_idx]
             if hasattr(param, 'name') and param.name in givens:
@@ -320,11 +351,84 @@ def draw_values(params, point=None, size=None):
                     if isinstance(param, collections.Hashable) and named_nodes_parents.get(param):
                         givens[param.name] = (param, evaluated[param_idx])
                 except theano.gof.fg.MissingInputError:
-                    missing_inputs.add(param_idx)
+                    missing_inputs.append(param_idx)
 
+    if isinstance(point, BatchedPoint):
+        return [point.align(params[j], evaluated[j]) for j in params]
     return [evaluated[j] for j in params] # set the order back
 
 
+@memoize
+def _draw_values_plan(params):
+    """Compute the parts of `draw_values` that only depend on the graphs
+    of the parameters.
+
+    This function is memoized, because `draw_values` is called with the
+    same parameters once per point when generating posterior or prior
+    predictive samples.
+
+    Parameters
+    ----------
+    params : tuple
+        The parameters passed to `draw_values`, with None in place of
+        those that are not theano variables.
+
+    Returns
+    -------
+    leaf_nodes : list of the named leaf nodes of the graphs
+    named_nodes_parents : dict of named node: set of named parents
+    named_nodes_children : dict of named node: set of named children
+    order : list of the indices of `params`, in an order in which each
+        param comes after the other params its graph depends on
+    """
+    leaf_nodes = {}
+    named_nodes_parents = {}
+    named_nodes_children = {}
+    param_nodes = []
+    for param in params:
+        if param is None:
+            param_nodes.append(set())
+            continue
+        # Get the named nodes under the `param` node
+        nn, nnp, nnc = get_named_nodes_and_relations(param)
+        leaf_nodes.update(nn)
+        param_nodes.append(set(nnc) - {param})
+        # Update the discovered parental relationships
+        for k in nnp.keys():
+            if k not in named_nodes_parents.keys():
+                named_nodes_parents[k] = set(nnp[k])
+            else:
+                named_nodes_parents[k].update(nnp[k])
+        # Update the discovered child relationships
+        for k in nnc.keys():
+            if k not in named_nodes_children.keys():
+                named_nodes_children[k] = set(nnc[k])
+            else:
+                named_nodes_children[k].update(nnc[k])
+
+    # Depth first topological sort of the params, where a param depends
+    # on every other param that is a named node of its graph.
+    index = {}
+    for idx, param in enumerate(params):
+        if param is not None:
+            index.setdefault(param, idx)
+    order = []
+    visited = set()
+
+    def visit(idx):
+        if idx in visited:
+            return
+        visited.add(idx)
+        for node in param_nodes[idx]:
+            if node in index:
+                visit(index[node])
+        order.append(idx)
+
+    for idx in range(len(params)):
+        visit(idx)
+    return list(leaf_nodes.values()), named_nodes_parents, named_nodes_children, order
+
+
 @memoize
 def _compile_theano_function(param, vars, givens=None):
     """Compile theano function for a given parameter and input variables.
@@ -378,6 +482,12 @@ def _draw_value(param, point=None, givens=None, size=None):
     elif isinstance(param, (tt.TensorVariable, MultiObservedRV)):
         if point and hasattr(param, 'model') and param.name in point:
             return point[param.name]
+        elif isinstance(point, BatchedPoint) and (
+                getattr(param, 'random', None) is not None or
+                hasattr(param, 'distribution')):
+            # A single draw would not have the sample dimension
+            raise ValueError('The value of %s is missing in the batched '
+                             'point.' % param.name)
         elif hasattr(param, 'random') and param.random is not None:
             return param.random(point=point, size=size)
         elif (hasattr(param, 'distribution') and
@@ -400,6 +510,9 @@ def _draw_value(param, point=None, givens=None, size=None):
             else:
                 variables = values = []
             func = _compile_theano_function(param, variables)
+            if isinstance(point, BatchedPoint) and values:
+                # Evaluate the expression for each sample
+                return np.array([func(*v) for v in zip(*values)])
             if size and values and not all(var.dshape == val.shape for var, val in zip(variables, values)):
                 return np.array([func(*v) for v in zip(*values)])
             else:
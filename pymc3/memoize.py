@@ -1,18 +1,94 @@
 import functools
 import pickle
 import collections
+import theano
 from .util import biwrap
 CACHE_REGISTRY = []
 
+# Default maximum number of entries of a memoization cache, None means
+# unbounded. Change it with `set_cache_maxsize`.
+MAXSIZE = None
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+
+class LRUCache(collections.OrderedDict):
+    """
+    A dict that keeps at most `maxsize` entries, evicting the least
+    recently used ones, and counts its hits, misses and evictions.
+
+    If `maxsize` is not given, the module wide `MAXSIZE` is used.
+    """
+    def __init__(self, maxsize=None, name=None):
+        super(LRUCache, self).__init__()
+        self._maxsize = maxsize
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def maxsize(self):
+        if self._maxsize is None:
+            return MAXSIZE
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize):
+        self._maxsize = maxsize
+        self.trim()
+
+    def lookup(self, key, compute):
+        """Return the value stored under `key`, storing `compute()` first
+        if there is none"""
+        try:
+            value = self[key]
+        except KeyError:
+            self.misses += 1
+            value = self[key] = compute()
+            self.trim()
+        else:
+            self.hits += 1
+            # mark as most recently used
+            del self[key]
+            self[key] = value
+        return value
+
+    def trim(self):
+        maxsize = self.maxsize
+        if maxsize is None:
+            return
+        while len(self) > maxsize:
+            self.popitem(last=False)
+            self.evictions += 1
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions,
+                         self.maxsize, len(self))
+
+    def __reduce__(self):
+        # caches are not meant to be pickled with their content
+        return (self.__class__, (self._maxsize, self.name))
+
 
 @biwrap
-def memoize(obj, bound=False):
+def memoize(obj, bound=False, maxsize=None):
     """
     An expensive memoizer that works with unhashables
+
+    Parameters
+    ----------
+    bound : bool
+        Whether `obj` is a method, in which case the cache is stored
+        on the instance
+    maxsize : int
+        Maximum number of entries of the cache, the least recently used
+        ones are evicted first. Defaults to the module wide `MAXSIZE`
     """
     # this is declared not to be a bound method, so just attach new attr to obj
     if not bound:
-        obj.cache = {}
+        obj.cache = LRUCache(maxsize, name=_qualname(obj))
         CACHE_REGISTRY.append(obj.cache)
 
     @functools.wraps(obj)
@@ -24,16 +100,21 @@ def memoize(obj, bound=False):
             # bound methods have self as first argument, remove it to compute key
             key = (hashable(args[1:]), hashable(kwargs))
             if not hasattr(args[0], '_cache'):
-                setattr(args[0], '_cache', collections.defaultdict(dict))
+                setattr(args[0], '_cache', {})
                 # do not add to cache regestry
-            cache = getattr(args[0], '_cache')[obj.__name__]
-        if key not in cache:
-            cache[key] = obj(*args, **kwargs)
-
-        return cache[key]
+            caches = getattr(args[0], '_cache')
+            if obj.__name__ not in caches:
+                caches[obj.__name__] = LRUCache(maxsize, name=obj.__name__)
+            cache = caches[obj.__name__]
+        return cache.lookup(key, lambda: obj(*args, **kwargs))
     return memoizer
 
 
+def _qualname(obj):
+    return '{}.{}'.format(getattr(obj, '__module__', None),
+                          getattr(obj, '__qualname__', obj.__name__))
+
+
 def clear_cache(obj=None):
     if obj is None:
         for c in CACHE_REGISTRY:
@@ -46,6 +127,39 @@ def clear_cache(obj=None):
             obj.cache.clear()
 
 
+def cache_info(obj=None):
+    """
+    Get the hit, miss and eviction counters of memoization caches.
+
+    Parameters
+    ----------
+    obj : memoized function or WithMemoization instance, optional
+        If not given, the counters of all memoized functions are returned
+
+    Returns
+    -------
+    CacheInfo of the memoized function `obj`, or dict of name: CacheInfo
+    for a WithMemoization instance or for all memoized functions
+    """
+    if obj is None:
+        return {c.name: c.info() for c in CACHE_REGISTRY}
+    if isinstance(obj, WithMemoization):
+        return {k: v.info() for k, v in getattr(obj, '_cache', {}).items()}
+    return obj.cache.info()
+
+
+def set_cache_maxsize(maxsize):
+    """
+    Set the default maximum number of entries of the memoization caches,
+    None makes them unbounded. Caches with their own `maxsize` are not
+    affected.
+    """
+    global MAXSIZE
+    MAXSIZE = maxsize
+    for c in CACHE_REGISTRY:
+        c.trim()
+
+
 class WithMemoization(object):
     def __hash__(self):
         return hash(id(self))
@@ -63,8 +177,14 @@ def hashable(a):
     """
     Turn some unhashable objects into hashable ones.
     """
+    if isinstance(a, theano.gof.graph.Variable):
+        # Theano variables are keyed by identity, which is much cheaper
+        # than hashing constants or pickling graphs
+        return id(a)
     if isinstance(a, dict):
         return hashable(tuple((hashable(a1), hashable(a2)) for a1, a2 in a.items()))
+    if isinstance(a, (list, tuple)):
+        return hash((type(a), tuple(hashable(a1) for a1 in a)))
     try:
         return hash(a)
     except TypeError:
@@ -1,7 +1,11 @@
 import collections
 import functools
 import itertools
+import os
+import pickle
+import tempfile
 import threading
+import warnings
 import six
 
 import numpy as np
@@ -15,7 +19,7 @@ from pymc3.theanof import set_theano_conf, floatX
 import pymc3 as pm
 from pymc3.math import flatten_list
 from .memoize import memoize, WithMemoization
-from .theanof import gradient, hessian, inputvars, generator
+from .theanof import gradient, hessian, inputvars, generator, graph_hash
 from .vartypes import typefilter, discrete_types, continuous_types, isgenerator
 from .blocking import DictToArrayBijection, ArrayOrdering
 from .util import get_transformed_name
@@ -383,6 +387,12 @@ class ValueGradFunction(object):
         See `numpy.can_cast` for a description of the options.
         Keep in mind that we cast the variables to the array *and*
         back from the array dtype to the variable dtype.
+    cache_dir : str or None
+        If set, the optimized theano function is stored in this directory,
+        keyed by a structural hash of the graph, and loaded from there
+        instead of being compiled again by later instances (possibly in
+        other processes) with the same graph. Graphs with shared variables
+        are not cached.
     kwargs
         Extra arguments are passed on to `theano.function`.
 
@@ -396,7 +406,7 @@ class ValueGradFunction(object):
         kwargs.
     """
     def __init__(self, cost, grad_vars, extra_vars=None, dtype=None,
-                 casting='no', **kwargs):
+                 casting='no', cache_dir=None, **kwargs):
         if extra_vars is None:
             extra_vars = []
 
@@ -443,9 +453,52 @@ class ValueGradFunction(object):
         grad.name = '__grad'
 
         inputs = [self._vars_joined]
+        outputs = [self._cost_joined, grad]
 
-        self._theano_function = theano.function(
-            inputs, [self._cost_joined, grad], givens=givens, **kwargs)
+        if cache_dir is None or self._has_shared_inputs(outputs):
+            self._theano_function = theano.function(
+                inputs, outputs, givens=givens, **kwargs)
+        else:
+            self._theano_function = self._cached_function(
+                cache_dir, inputs, outputs, givens, kwargs)
+
+    def _has_shared_inputs(self, outputs):
+        # The shared variables of a loaded function are copies, so
+        # updates of the originals would not reach it
+        return any(isinstance(var, theano.compile.SharedVariable)
+                   for var in theano.gof.graph.inputs(outputs))
+
+    def _cached_function(self, cache_dir, inputs, outputs, givens, kwargs):
+        key = graph_hash(outputs, self.dtype, sorted(self._extra_var_names),
+                         sorted(kwargs.items()))
+        path = os.path.join(os.path.expanduser(cache_dir), key + '.pkl')
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    function = pickle.load(f)
+            except Exception as e:
+                warnings.warn('Could not load cached function %s: %s' % (path, e))
+            else:
+                # Use the shared variables of the loaded function
+                for shared in function.get_shared():
+                    name = shared.name[:-len('_shared__')]
+                    if name in self._extra_vars_shared:
+                        self._extra_vars_shared[name] = shared
+                return function
+
+        function = theano.function(inputs, outputs, givens=givens, **kwargs)
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            # Write to a temporary file first, so that concurrent
+            # processes never read a partially written function
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(function, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, path)
+        except Exception as e:
+            warnings.warn('Could not cache function in %s: %s' % (path, e))
+        return function
 
     def set_extra_values(self, extra_vars):
         self._extra_are_set = True
@@ -554,6 +607,10 @@ class Model(six.with_metaclass(InitContextMeta, Context, Factor, WithMemoization
         temporarily in the model context. See the documentation
         of theano for a complete list. Set config key
         ``compute_test_value`` to `raise` if it is None.
+    function_cache_dir : str
+        Directory in which the optimized logp and gradient functions are
+        cached across processes, see :class:`~.ValueGradFunction`.
+        Defaults to the one of the parent model, None disables the cache.
 
     Examples
     --------
@@ -633,8 +690,12 @@ class Model(six.with_metaclass(InitContextMeta, Context, Factor, WithMemoization
         instance._theano_config = theano_config
         return instance
 
-    def __init__(self, name='', model=None, theano_config=None):
+    def __init__(self, name='', model=None, theano_config=None,
+                 function_cache_dir=None):
         self.name = name
+        if function_cache_dir is None and self.parent is not None:
+            function_cache_dir = self.parent.function_cache_dir
+        self.function_cache_dir = function_cache_dir
         if self.parent is not None:
             self.named_vars = treedict(parent=self.parent.named_vars)
             self.free_RVs = treelist(parent=self.parent.free_RVs)
@@ -706,6 +767,7 @@ class Model(six.with_metaclass(InitContextMeta, Context, Factor, WithMemoization
                                      "continuous types: %s" % var)
         varnames = [var.name for var in grad_vars]
         extra_vars = [var for var in self.free_RVs if var.name not in varnames]
+        kwargs.setdefault('cache_dir', self.function_cache_dir)
         return ValueGradFunction(self.logpt, grad_vars, extra_vars, **kwargs)
 
     @property
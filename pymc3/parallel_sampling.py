@@ -1,15 +1,21 @@
 import multiprocessing
 import multiprocessing.sharedctypes
+import copy
 import ctypes
+import gc
+import threading
 import time
 import logging
 from collections import namedtuple
 import traceback
+import types
 
 import six
 import numpy as np
+import theano
 
 from . import theanof
+from .model import Model, modelcontext
 
 logger = logging.getLogger('pymc3')
 
@@ -40,26 +46,54 @@ def rebuild_exc(exc, tb):
 
 
 # Messages
-# ('writing_done', is_last, sample_idx, tuning, stats)
+# ('writing_done', is_last, first_sample_idx, tunings, stats, warnings, points)
+# ('progress', is_last, num_draws, tuning, warnings)
 # ('error', *exception_info)
+# ('aborted',)
 
 # ('abort', reason)
 # ('write_next',)
 # ('start',)
+# ('job', draws, tune, seed, start, shared_values, transfer_batch)
+# ('close',)
+
+
+def _shared_array(shape, dtype):
+    """Allocate shared memory for an array and return it together with
+    a numpy view on it."""
+    dtype = np.dtype(dtype)
+    size = dtype.itemsize
+    for dim in shape:
+        size *= int(dim)
+    if size != ctypes.c_size_t(size).value:
+        raise ValueError('Array of shape %s is too large' % (shape,))
+    array = multiprocessing.sharedctypes.RawArray('c', size)
+    return array, np.frombuffer(array, dtype).reshape(shape)
 
 
 class _Process(multiprocessing.Process):
     """Seperate process for each chain.
 
     We communicate with the main process using a pipe,
-    and send finished samples using shared memory.
+    and send finished samples using shared memory, in batches
+    of up to `transfer_batch` draws.
+
+    If `shared_trace` is given, the process writes all draws directly
+    into these shared buffers and only reports its progress through
+    the pipe, without waiting for the main process.
     """
+    # Time in seconds after which a process reports its progress to
+    # the main process.
+    progress_interval = 0.1
+
     def __init__(self, name, msg_pipe, step_method, shared_point,
-                 draws, tune, seed):
+                 draws, tune, seed, shared_trace=None, transfer_batch=1):
         super(_Process, self).__init__(daemon=True, name=name)
         self._msg_pipe = msg_pipe
         self._step_method = step_method
         self._shared_point = shared_point
+        self._shared_trace = shared_trace
+        self._transfer_batch = transfer_batch
         self._seed = seed
         self._tt_seed = seed + 1
         self._draws = draws
@@ -69,8 +103,15 @@ class _Process(multiprocessing.Process):
         try:
             # We do not create this in __init__, as pickling this
             # would destroy the shared memory.
-            self._point = self._make_numpy_refs()
-            self._start_loop()
+            self._shared_batch = self._make_numpy_refs()
+            # The first row of the shared memory contains the start point
+            self._point = {name: vals[0].copy()
+                           for name, vals in self._shared_batch.items()}
+            if self._shared_trace is None:
+                self._start_loop()
+            else:
+                self._trace, self._stats = self._make_trace_refs()
+                self._start_trace_loop()
         except KeyboardInterrupt:
             pass
         except BaseException as e:
@@ -81,16 +122,26 @@ class _Process(multiprocessing.Process):
 
     def _make_numpy_refs(self):
         shape_dtypes = self._step_method.vars_shape_dtype
-        point = {}
+        batch = {}
         for name, (shape, dtype) in shape_dtypes.items():
             array = self._shared_point[name]
             self._shared_point[name] = array
-            point[name] = np.frombuffer(array, dtype).reshape(shape)
-        return point
-
-    def _write_point(self, point):
-        for name, vals in point.items():
-            self._point[name][...] = vals
+            batch[name] = np.frombuffer(array, dtype).reshape(
+                (self._transfer_batch,) + tuple(shape))
+        return batch
+
+    def _make_trace_refs(self):
+        shared_point, shared_stats = self._shared_trace
+        length = self._draws + self._tune
+        trace = {}
+        for name, (shape, dtype) in self._step_method.vars_shape_dtype.items():
+            trace[name] = np.frombuffer(
+                shared_point[name], dtype).reshape((length,) + tuple(shape))
+        stats = []
+        for shared, dtypes in zip(shared_stats, _stats_dtypes(self._step_method)):
+            stats.append({name: np.frombuffer(shared[name], dtype)
+                          for name, dtype in dtypes.items()})
+        return trace, stats
 
     def _recv_msg(self):
         return self._msg_pipe.recv()
@@ -99,8 +150,8 @@ class _Process(multiprocessing.Process):
         np.random.seed(self._seed)
         theanof.set_tt_rng(self._tt_seed)
 
-        draw = 0
         tuning = True
+        num_draws = self._draws + self._tune
 
         msg = self._recv_msg()
         if msg[0] == 'abort':
@@ -108,32 +159,104 @@ class _Process(multiprocessing.Process):
         if msg[0] != 'start':
             raise ValueError('Unexpected msg ' + msg[0])
 
-        while True:
-            if draw < self._draws + self._tune:
-                point, stats = self._compute_point()
-            else:
-                return
+        # Draws are collected in a local batch, and written to the
+        # shared memory once the main process asks for them.
+        batch = {name: np.empty((self._transfer_batch,) + tuple(shape), dtype)
+                 for name, (shape, dtype)
+                 in self._step_method.vars_shape_dtype.items()}
+        batch_tuning = []
+        batch_stats = []
+        last_send = time.time()
+        for draw in range(num_draws):
+            point, stats = self._compute_point()
 
             if draw == self._tune:
                 self._step_method.stop_tuning()
                 tuning = False
 
+            self._point = point
+            idx = len(batch_tuning)
+            for name, vals in point.items():
+                batch[name][idx] = vals
+            batch_tuning.append(tuning)
+            batch_stats.append(stats)
+
+            is_last = draw + 1 == num_draws
+            # Send incomplete batches of slow samplers, to keep the
+            # progress bar up to date
+            if not (is_last or len(batch_tuning) == self._transfer_batch or
+                    time.time() - last_send > self.progress_interval):
+                continue
+
             msg = self._recv_msg()
             if msg[0] == 'abort':
                 raise KeyboardInterrupt()
             elif msg[0] == 'write_next':
-                self._write_point(point)
-                is_last = draw + 1 == self._draws + self._tune
+                num = len(batch_tuning)
+                if self._shared_batch is None:
+                    # Without shared memory, the draws go through the pipe
+                    points = {name: vals[:num].copy()
+                              for name, vals in batch.items()}
+                else:
+                    points = None
+                    for name, vals in batch.items():
+                        self._shared_batch[name][:num] = vals[:num]
                 if is_last:
                     warns = self._collect_warnings()
                 else:
                     warns = None
                 self._msg_pipe.send(
-                    ('writing_done', is_last, draw, tuning, stats, warns))
-                draw += 1
+                    ('writing_done', is_last, draw + 1 - num, batch_tuning,
+                     batch_stats, warns, points))
+                batch_tuning = []
+                batch_stats = []
+                last_send = time.time()
             else:
                 raise ValueError('Unknown message ' + msg[0])
 
+    def _start_trace_loop(self):
+        np.random.seed(self._seed)
+        theanof.set_tt_rng(self._tt_seed)
+
+        tuning = True
+        num_draws = self._draws + self._tune
+
+        msg = self._recv_msg()
+        if msg[0] == 'abort':
+            raise KeyboardInterrupt()
+        if msg[0] != 'start':
+            raise ValueError('Unexpected msg ' + msg[0])
+
+        last_report = time.time()
+        for draw in range(num_draws):
+            point, stats = self._compute_point()
+
+            if draw == self._tune:
+                self._step_method.stop_tuning()
+                tuning = False
+
+            self._point = point
+            for name, vals in point.items():
+                self._trace[name][draw] = vals
+            if stats is not None:
+                for data, vars in zip(self._stats, stats):
+                    for key, val in vars.items():
+                        data[key][draw] = val
+
+            is_last = draw + 1 == num_draws
+            if is_last:
+                self._msg_pipe.send(('progress', True, num_draws, tuning,
+                                     self._collect_warnings()))
+            elif time.time() - last_report > self.progress_interval:
+                last_report = time.time()
+                if self._msg_pipe.poll():
+                    msg = self._recv_msg()
+                    if msg[0] == 'abort':
+                        raise KeyboardInterrupt()
+                    raise ValueError('Unknown message ' + msg[0])
+                self._msg_pipe.send(
+                    ('progress', False, draw + 1, tuning, None))
+
     def _compute_point(self):
         if self._step_method.generates_stats:
             point, stats = self._step_method.step(self._point)
@@ -149,9 +272,31 @@ class _Process(multiprocessing.Process):
             return []
 
 
+def _stats_dtypes(step_method):
+    if step_method.generates_stats:
+        return step_method.stats_dtypes
+    return []
+
+
+def supports_shared_trace(step_method):
+    """Whether all sampler stats of `step_method` can be stored in
+    shared trace buffers."""
+    return all(np.dtype(dtype) != np.dtype(object)
+               for dtypes in _stats_dtypes(step_method)
+               for dtype in dtypes.values())
+
+
 class ProcessAdapter(object):
-    """Control a Chain process from the main thread."""
-    def __init__(self, draws, tune, step_method, chain, seed, start):
+    """Control a Chain process from the main thread.
+
+    The process sends batches of up to `transfer_batch` draws at once.
+    If `shared_trace` is True, the draws and sampler stats of all
+    iterations are stored in shared memory instead, see `trace_view`.
+    """
+    def __init__(self, draws, tune, step_method, chain, seed, start,
+                 shared_trace=False, transfer_batch=1):
+        if transfer_batch < 1:
+            raise ValueError('transfer_batch must be at least 1.')
         self.chain = chain
         process_name = "worker_chain_%s" % chain
         self._msg_pipe, remote_conn = multiprocessing.Pipe()
@@ -159,25 +304,42 @@ class ProcessAdapter(object):
         self._shared_point = {}
         self._point = {}
         for name, (shape, dtype) in step_method.vars_shape_dtype.items():
-            size = 1
-            for dim in shape:
-                size *= int(dim)
-            size *= dtype.itemsize
-            if size != ctypes.c_size_t(size).value:
+            try:
+                array, array_np = _shared_array(
+                    (transfer_batch,) + tuple(shape), dtype)
+            except ValueError:
                 raise ValueError('Variable %s is too large' % name)
-
-            array = multiprocessing.sharedctypes.RawArray('c', size)
             self._shared_point[name] = array
-            array_np = np.frombuffer(array, dtype).reshape(shape)
-            array_np[...] = start[name]
+            array_np[0] = start[name]
             self._point[name] = array_np
 
+        shared = None
+        self._trace = None
+        self._stats = None
+        if shared_trace:
+            length = draws + tune
+            shared_point, self._trace = {}, {}
+            for name, (shape, dtype) in step_method.vars_shape_dtype.items():
+                try:
+                    shared_point[name], self._trace[name] = _shared_array(
+                        (length,) + tuple(shape), dtype)
+                except ValueError:
+                    raise ValueError('Trace of variable %s is too large' % name)
+            shared_stats, self._stats = [], []
+            for dtypes in _stats_dtypes(step_method):
+                arrays = {name: _shared_array((length,), dtype)
+                          for name, dtype in dtypes.items()}
+                shared_stats.append({name: array for name, (array, _) in arrays.items()})
+                self._stats.append({name: view for name, (_, view) in arrays.items()})
+            shared = (shared_point, shared_stats)
+
         self._readable = True
         self._num_samples = 0
+        self._received_points = None
 
         self._process = _Process(
             process_name, remote_conn, step_method, self._shared_point,
-            draws, tune, seed)
+            draws, tune, seed, shared, transfer_batch)
         # We fork right away, so that the main process can start tqdm threads
         self._process.start()
 
@@ -185,11 +347,31 @@ class ProcessAdapter(object):
     def shared_point_view(self):
         """May only be written to or read between a `recv_draw`
         call from the process and a `write_next` or `abort` call.
+
+        The arrays have an additional first dimension of length
+        `transfer_batch`. The draws of the last batch are at its start.
         """
         if not self._readable:
             raise RuntimeError()
+        if self._received_points is not None:
+            return self._received_points
         return self._point
 
+    def trace_view(self):
+        """Return the shared trace buffers of the draws that are finished,
+        as a dict of arrays and a list of dicts of sampler stats.
+
+        The arrays are views on the shared memory, they are only
+        complete once the process sent its last progress message.
+        """
+        if self._trace is None:
+            raise RuntimeError('Process does not use a shared trace.')
+        length = self._num_samples
+        trace = {name: vals[:length] for name, vals in self._trace.items()}
+        stats = [{name: vals[:length] for name, vals in data.items()}
+                 for data in self._stats]
+        return trace, stats
+
     def start(self):
         self._msg_pipe.send(('start',))
 
@@ -223,8 +405,14 @@ class ProcessAdapter(object):
             six.raise_from(RuntimeError('Chain %s failed.' % proc.chain), old)
         elif msg[0] == 'writing_done':
             proc._readable = True
-            proc._num_samples += 1
-            return (proc,) + msg[1:]
+            proc._num_samples += len(msg[3])
+            proc._received_points = msg[6]
+            return (proc,) + msg[1:6]
+        elif msg[0] == 'progress':
+            is_last, num_draws, tuning, warns = msg[1:]
+            new_draws = num_draws - proc._num_samples
+            proc._num_samples = num_draws
+            return proc, is_last, new_draws, tuning, warns
         else:
             raise ValueError('Sampler sent bad message.')
 
@@ -252,6 +440,259 @@ class ProcessAdapter(object):
                 process.join()
 
 
+# Objects that are referenced, but not copied, by the copies of the step
+# method that a `_PoolProcess` makes for each job. Copying them would be
+# expensive, and the compiled functions must keep using the shared
+# variables whose values are set by the main process.
+_POOL_SHARED_TYPES = (theano.compile.function_module.Function,
+                      theano.gof.graph.Variable,
+                      theano.gof.graph.Apply,
+                      theano.gof.Op,
+                      theano.gof.FunctionGraph,
+                      theano.gof.link.Container,
+                      Model)
+
+
+def _find_shared_objects(obj):
+    """Find the objects referenced by `obj` that must not be copied.
+
+    Returns a dict of id: object, that can be used as memo for
+    `copy.deepcopy`.
+    """
+    shared = {}
+    seen = set()
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, _POOL_SHARED_TYPES):
+            shared[id(obj)] = obj
+        elif not isinstance(obj, (type, types.ModuleType, np.ndarray)):
+            stack.extend(gc.get_referents(obj))
+    return shared
+
+
+class _PoolProcess(_Process):
+    """Process of a `SamplerPool`, that samples chains of several jobs.
+
+    Each job starts with a fresh copy of the step method, that shares the
+    compiled theano functions with the original. The draws are sent
+    through the pipe, as the shared memory can not be resized per job.
+    """
+    def __init__(self, name, msg_pipe, step_method, shared_vars):
+        super(_PoolProcess, self).__init__(
+            name, msg_pipe, step_method, None, 0, 0, 0)
+        self._shared_vars = shared_vars
+
+    def run(self):
+        try:
+            step_method = self._step_method
+            memo = _find_shared_objects(step_method)
+            self._shared_batch = None
+            while True:
+                msg = self._recv_msg()
+                if msg[0] == 'close':
+                    return
+                elif msg[0] == 'abort':
+                    # Sent to a process that was already done
+                    self._msg_pipe.send(('aborted',))
+                    continue
+                elif msg[0] != 'job':
+                    raise ValueError('Unexpected msg ' + msg[0])
+
+                (draws, tune, seed, start,
+                 shared_values, transfer_batch) = msg[1:]
+                for name, value in shared_values.items():
+                    self._shared_vars[name].set_value(value)
+                self._step_method = copy.deepcopy(step_method, dict(memo))
+                self._draws = draws
+                self._tune = tune
+                self._seed = seed
+                self._tt_seed = seed + 1
+                self._transfer_batch = transfer_batch
+                self._point = start
+                try:
+                    self._start_loop()
+                except KeyboardInterrupt:
+                    self._msg_pipe.send(('aborted',))
+                except Exception as e:
+                    e = ExceptionWithTraceback(e, e.__traceback__)
+                    self._msg_pipe.send(('error', e))
+        except KeyboardInterrupt:
+            pass
+        except BaseException as e:
+            e = ExceptionWithTraceback(e, e.__traceback__)
+            self._msg_pipe.send(('error', e))
+        finally:
+            self._msg_pipe.close()
+
+
+class _PoolProcessAdapter(ProcessAdapter):
+    """Control a `_PoolProcess` from the main thread."""
+    def __init__(self, step_method, idx, shared_vars):
+        self.chain = None
+        self._msg_pipe, remote_conn = multiprocessing.Pipe()
+        self._point = None
+        self._trace = None
+        self._stats = None
+        self._readable = True
+        self._num_samples = 0
+        self._received_points = None
+
+        self._process = _PoolProcess(
+            "worker_pool_%s" % idx, remote_conn, step_method, shared_vars)
+        self._process.start()
+
+    def submit(self, chain, draws, tune, seed, start, shared_values,
+               transfer_batch):
+        self.chain = chain
+        self._readable = True
+        self._num_samples = 0
+        self._received_points = None
+        self._msg_pipe.send(('job', draws, tune, seed, start,
+                             shared_values, transfer_batch))
+
+    def cancel(self, patience=2):
+        """Abort the job of the process and wait until it is ready
+        for the next one."""
+        try:
+            self.abort()
+            while self._msg_pipe.poll(patience):
+                msg = self._msg_pipe.recv()
+                if msg[0] in ('aborted', 'error'):
+                    return
+        except (EOFError, OSError):
+            pass
+        logger.warn('Pool process did not abort as expected. '
+                    'Terminating forcefully...')
+        self.terminate()
+        self.join()
+
+    def close(self):
+        try:
+            self._msg_pipe.send(('close',))
+        except (EOFError, OSError):
+            pass
+
+
+class SamplerPool(object):
+    """Worker processes that are kept alive across calls of `pm.sample`.
+
+    The processes hold the step method, so that later calls of `pm.sample`
+    with this step method only send the start points, seeds and the
+    values of the named shared variables of the model to them, instead of
+    starting and setting up new processes. Use it as a context manager:
+
+    .. code-block:: python
+
+        with model:
+            step = pm.NUTS()
+            with pm.SamplerPool(step, cores=4):
+                for value in values:
+                    data.set_value(value)
+                    trace = pm.sample(step=step, cores=4)
+
+    Each chain starts with the state the step method had when the pool
+    was created. Worker processes that died, for example because they
+    were terminated when a job could not be aborted, are replaced by new
+    processes that start with the current state of the step method.
+
+    Parameters
+    ----------
+    step_method : step method
+        The step method that is used by `pm.sample` calls with the pool.
+    cores : int
+        The number of worker processes. Defaults to the number of CPUs
+        but at most 4, like in `pm.sample`.
+    model : Model (optional if in `with` context)
+    """
+    contexts = threading.local()
+
+    def __init__(self, step_method, cores=None, model=None):
+        model = modelcontext(model)
+        if cores is None:
+            cores = min(4, multiprocessing.cpu_count())
+        self.step_method = step_method
+        self.cores = cores
+        self._shared_vars = {
+            var.name: var for var in theano.gof.graph.inputs([model.logpt])
+            if isinstance(var, theano.compile.SharedVariable) and
+            var.name is not None}
+        self._workers = [
+            _PoolProcessAdapter(step_method, idx, self._shared_vars)
+            for idx in range(cores)]
+        self._idle = list(self._workers)
+        self._closed = False
+
+    def shared_values(self):
+        """Current values of the shared variables that are sent to the
+        processes."""
+        return {name: var.get_value()
+                for name, var in self._shared_vars.items()}
+
+    def _respawn(self, worker):
+        """Replace a worker whose process died by a new one."""
+        worker.join()
+        idx = self._workers.index(worker)
+        worker = _PoolProcessAdapter(self.step_method, idx, self._shared_vars)
+        self._workers[idx] = worker
+        return worker
+
+    def acquire(self):
+        """Take an idle worker, or None if there is none."""
+        if not self._idle:
+            return None
+        worker = self._idle.pop(0)
+        if not worker._process.is_alive():
+            worker = self._respawn(worker)
+        return worker
+
+    def release(self, worker):
+        """Mark a worker whose job is done as idle."""
+        if self._closed:
+            return
+        if not worker._process.is_alive():
+            worker = self._respawn(worker)
+        self._idle.append(worker)
+
+    def close(self):
+        """Stop all worker processes."""
+        for worker in self._workers:
+            worker.close()
+        for worker in self._workers:
+            worker.join(2)
+            if worker._process.is_alive():
+                worker.terminate()
+                worker.join()
+        self._idle = []
+        self._closed = True
+
+    @classmethod
+    def get_contexts(cls):
+        if not hasattr(cls.contexts, 'stack'):
+            cls.contexts.stack = []
+        return cls.contexts.stack
+
+    @classmethod
+    def get_context(cls, step_method):
+        """Return the deepest pool on the context stack for the step
+        method, or None."""
+        for pool in reversed(cls.get_contexts()):
+            if pool.step_method is step_method:
+                return pool
+        return None
+
+    def __enter__(self):
+        type(self).get_contexts().append(self)
+        return self
+
+    def __exit__(self, *args):
+        type(self).get_contexts().pop()
+        self.close()
+
+
 Draw = namedtuple(
     'Draw',
     ['chain', 'is_last', 'draw_idx', 'tuning', 'stats', 'point', 'warnings']
@@ -259,8 +700,24 @@ Draw = namedtuple(
 
 
 class ParallelSampler(object):
+    """Sample several chains in separate processes.
+
+    Iterating over the sampler yields a `Draw` for each draw of each chain.
+    The processes send their draws in batches of up to `transfer_batch`
+    draws, or the draws of the last `_Process.progress_interval` seconds
+    if that are fewer. If `shared_trace` is True, the processes write
+    their draws directly into shared memory instead, and only one `Draw`
+    is yielded per chain once it is finished. Its `point` is a dict of the
+    arrays of all draws of the chain, and its `stats` a list of dicts of
+    sampler stat arrays. These arrays are views on the shared memory and
+    are not copied.
+
+    If a `SamplerPool` is given, its processes are used instead of
+    starting new ones. This can not be combined with `shared_trace`.
+    """
     def __init__(self, draws, tune, chains, cores, seeds, start_points,
-                 step_method, start_chain_num=0, progressbar=True):
+                 step_method, start_chain_num=0, progressbar=True,
+                 shared_trace=False, transfer_batch=1, pool=None):
         if progressbar:
             import tqdm
             tqdm_ = tqdm.tqdm
@@ -269,11 +726,31 @@ class ParallelSampler(object):
             raise ValueError(
                 'Number of seeds and start_points must be %s.' % chains)
 
-        self._samplers = [
-            ProcessAdapter(draws, tune, step_method,
-                           chain + start_chain_num, seed, start)
-            for chain, seed, start in zip(range(chains), seeds, start_points)
-        ]
+        self._pool = pool
+        if pool is None:
+            self._samplers = [
+                ProcessAdapter(draws, tune, step_method,
+                               chain + start_chain_num, seed, start,
+                               shared_trace, transfer_batch)
+                for chain, seed, start
+                in zip(range(chains), seeds, start_points)
+            ]
+        else:
+            if shared_trace:
+                raise ValueError('A SamplerPool can not use shared traces.')
+            if pool.step_method is not step_method:
+                raise ValueError('The SamplerPool uses a different step method.')
+            # The processes of the pool are assigned to jobs when they
+            # are idle, see `_make_active`
+            self._samplers = []
+            self._jobs = [
+                (chain + start_chain_num, seed,
+                 {name: start[name] for name in step_method.vars_shape_dtype})
+                for chain, seed, start
+                in zip(range(chains), seeds, start_points)
+            ]
+            self._job_args = (draws, tune, pool.shared_values(),
+                              transfer_batch)
 
         self._inactive = self._samplers.copy()
         self._finished = []
@@ -282,6 +759,7 @@ class ParallelSampler(object):
 
         self._in_context = False
         self._start_chain_num = start_chain_num
+        self._shared_trace = shared_trace
 
         self._progress = None
         if progressbar:
@@ -290,10 +768,30 @@ class ParallelSampler(object):
                 desc='Sampling %s chains' % chains)
 
     def _make_active(self):
+        if self._pool is not None:
+            draws, tune, shared_values, transfer_batch = self._job_args
+            while self._jobs and len(self._active) < self._max_active:
+                proc = self._pool.acquire()
+                if proc is None:
+                    if not self._active:
+                        raise RuntimeError(
+                            'No worker of the SamplerPool is available for '
+                            'the remaining %s chains.' % len(self._jobs))
+                    break
+                chain, seed, start = self._jobs.pop(0)
+                proc.submit(chain, draws, tune, seed, start, shared_values,
+                            transfer_batch)
+                self._samplers.append(proc)
+                proc.start()
+                proc.write_next()
+                self._active.append(proc)
+            return
+
         while self._inactive and len(self._active) < self._max_active:
             proc = self._inactive.pop(0)
             proc.start()
-            proc.write_next()
+            if not self._shared_trace:
+                proc.write_next()
             self._active.append(proc)
 
     def __iter__(self):
@@ -301,36 +799,85 @@ class ParallelSampler(object):
             raise ValueError('Use ParallelSampler as context manager.')
         self._make_active()
 
+        if self._shared_trace:
+            for draw in self._iter_shared_trace():
+                yield draw
+            return
+
         while self._active:
             draw = ProcessAdapter.recv_draw(self._active)
-            proc, is_last, draw, tuning, stats, warns = draw
+            proc, is_last, draw, tunings, stats, warns = draw
+            num = len(tunings)
+            chain = proc.chain
             if self._progress is not None:
-                self._progress.update()
-
-            if is_last:
-                proc.join()
-                self._active.remove(proc)
-                self._finished.append(proc)
-                self._make_active()
+                self._progress.update(num)
 
             # We could also yield proc.shared_point_view directly,
             # and only call proc.write_next() after the yield returns.
             # This seems to be faster overally though, as the worker
             # loses less time waiting.
-            point = {name: val.copy()
+            batch = {name: val[:num].copy()
                      for name, val in proc.shared_point_view.items()}
 
-            # Already called for new proc in _make_active
-            if not is_last:
+            if is_last:
+                self._active.remove(proc)
+                self._finished.append(proc)
+                if self._pool is None:
+                    proc.join()
+                else:
+                    self._pool.release(proc)
+                self._make_active()
+            else:
+                # Already called for new proc in _make_active
                 proc.write_next()
 
-            yield Draw(proc.chain, is_last, draw, tuning, stats, point, warns)
+            for i in range(num):
+                point = {name: val[i] for name, val in batch.items()}
+                if i + 1 < num:
+                    yield Draw(chain, False, draw + i, tunings[i],
+                               stats[i], point, None)
+                else:
+                    yield Draw(chain, is_last, draw + i, tunings[i],
+                               stats[i], point, warns)
+
+    def _iter_shared_trace(self):
+        while self._active:
+            proc, is_last, new_draws, tuning, warns = ProcessAdapter.recv_draw(
+                self._active)
+            if self._progress is not None:
+                self._progress.update(new_draws)
+
+            if is_last:
+                proc.join()
+                self._active.remove(proc)
+                self._finished.append(proc)
+                self._make_active()
+
+                point, stats = proc.trace_view()
+                yield Draw(proc.chain, is_last, proc._num_samples - 1,
+                           tuning, stats, point, warns)
+
+    def trace_views(self):
+        """Return the shared trace buffers of the finished draws of all
+        chains as a dict of chain: (samples, sampler stats).
+
+        This can be used to recover the draws of chains that did not
+        finish, for example after an interrupt.
+        """
+        return {proc.chain: proc.trace_view() for proc in self._samplers}
 
     def __enter__(self):
         self._in_context = True
         return self
 
     def __exit__(self, *args):
-        ProcessAdapter.terminate_all(self._samplers)
+        if self._pool is None:
+            ProcessAdapter.terminate_all(self._samplers)
+        else:
+            # Keep the processes of the pool alive for the next jobs
+            for proc in self._active:
+                proc.cancel()
+                self._pool.release(proc)
+            self._active = []
         if self._progress is not None:
             self._progress.close()
@@ -12,11 +12,11 @@ import theano.gradient as tg
 
 from .backends.base import BaseTrace, MultiTrace
 from .backends.ndarray import NDArray
-from .distributions.distribution import draw_values
+from .distributions.distribution import BatchedPoint, draw_values, to_tuple
 from .model import modelcontext, Point, all_continuous
 from .step_methods import (NUTS, HamiltonianMC, Metropolis, BinaryMetropolis,
                            BinaryGibbsMetropolis, CategoricalGibbsMetropolis,
-                           Slice, CompoundStep, arraystep, smc)
+                           Slice, CompoundStep, arraystep, smc, BatchNUTS)
 from .util import update_start_vals, get_untransformed_name, is_transformed_name, get_default_varnames
 from .vartypes import discrete_types
 from pymc3.step_methods.hmc import quadpotential
@@ -190,7 +190,8 @@ def _cpu_count():
 def sample(draws=500, step=None, init='auto', n_init=200000, start=None, trace=None, chain_idx=0,
            chains=None, cores=None, tune=500, nuts_kwargs=None, step_kwargs=None, progressbar=True,
            model=None, random_seed=None, live_plot=False, discard_tuned_samples=True,
-           live_plot_kwargs=None, compute_convergence_checks=True, use_mmap=False, **kwargs):
+           live_plot_kwargs=None, compute_convergence_checks=True, use_mmap=False,
+           shared_trace=False, transfer_batch=1, **kwargs):
     """Draw samples from the posterior using the given step methods.
 
     Multiple step methods are supported via compound step methods.
@@ -290,6 +291,15 @@ def sample(draws=500, step=None, init='auto', n_init=200000, start=None, trace=N
     use_mmap : bool, default=False
         Whether to use joblib's memory mapping to share numpy arrays when sampling across multiple
         cores. Ignored when using 'SMC'
+    shared_trace : bool, default=False
+        When sampling chains in parallel, let the worker processes write all draws directly into
+        shared memory that is used as the final trace, instead of sending every draw to the main
+        process. This is faster for models with cheap gradients. Only used with the default
+        NDArray backend. Not used with a `SamplerPool`.
+    transfer_batch : int, default=1
+        When sampling chains in parallel, the maximum number of draws the worker processes send to
+        the main process at once. Larger values reduce the overhead of the communication for models
+        with cheap gradients. Ignored if `shared_trace` is used.
 
     Returns
     -------
@@ -337,6 +347,8 @@ def sample(draws=500, step=None, init='auto', n_init=200000, start=None, trace=N
                                model=model,
                                random_seed=random_seed,
                                rm_flag=step_kwargs.get('rm_flag', True),
+                               vectorized=step_kwargs.get('vectorized', False),
+                               checkpoint_interval=step_kwargs.get('checkpoint_interval', 0),
                                **kwargs)
     else:
         if cores is None:
@@ -434,14 +446,18 @@ def sample(draws=500, step=None, init='auto', n_init=200000, start=None, trace=N
                        'live_plot': live_plot,
                        'live_plot_kwargs': live_plot_kwargs,
                        'cores': cores,
-                       'use_mmap': use_mmap}
+                       'use_mmap': use_mmap,
+                       'shared_trace': shared_trace,
+                       'transfer_batch': transfer_batch}
 
         sample_args.update(kwargs)
 
         has_population_samplers = np.any([ isinstance(m, arraystep.PopulationArrayStepShared)
             for m in (step.methods if isinstance(step, CompoundStep) else [step])])
 
-        parallel = cores > 1 and chains > 1 and not has_population_samplers
+        batched = isinstance(step, BatchNUTS)
+        parallel = (cores > 1 and chains > 1 and not has_population_samplers and
+                    not batched)
         if parallel:
             _log.info('Multiprocess sampling ({} chains in {} jobs)'.format(chains, cores))
             _print_step_hierarchy(step)
@@ -459,7 +475,11 @@ def sample(draws=500, step=None, init='auto', n_init=200000, start=None, trace=N
                 else:
                     raise
         if not parallel:
-            if has_population_samplers:
+            if batched:
+                _log.info('Batched sampling ({} chains in 1 job)'.format(chains))
+                _print_step_hierarchy(step)
+                trace = _sample_batched(**sample_args)
+            elif has_population_samplers:
                 _log.info('Population sampling ({} chains)'.format(chains))
                 _print_step_hierarchy(step)
                 trace = _sample_population(**sample_args)
@@ -544,6 +564,69 @@ def _sample_population(draws, chain, chains, start, random_seed, step, tune,
     return MultiTrace(latest_traces)
 
 
+def _sample_batched(draws, chain, chains, start, random_seed, step, tune,
+                    model, progressbar=None, trace=None, live_plot=False,
+                    live_plot_kwargs=None, **kwargs):
+    """Sample all chains together with a `BatchNUTS` step method."""
+    skip_first = kwargs.get('skip_first', 0)
+    refresh_every = kwargs.get('refresh_every', 100)
+
+    model = modelcontext(model)
+    if random_seed is not None:
+        np.random.seed(random_seed)
+
+    traces = []
+    points = []
+    for c in range(chains):
+        if trace is not None:
+            strace = _choose_backend(copy(trace), chain + c, model=model)
+        else:
+            strace = _choose_backend(None, chain + c, model=model)
+        if len(strace) > 0:
+            update_start_vals(start[c], strace.point(-1), model)
+        else:
+            update_start_vals(start[c], model.test_point, model)
+        points.append(Point(start[c], model=model))
+        if strace.supports_sampler_stats:
+            strace.setup(draws, chain + c, step.stats_dtypes)
+        else:
+            strace.setup(draws, chain + c)
+        traces.append(strace)
+
+    chain_steps = step.iter_chains(points, draws, tune)
+    sampling = chain_steps
+    if progressbar:
+        sampling = tqdm(sampling, total=draws)
+    steppers = None
+    try:
+        for it, (steppers, updates) in enumerate(sampling):
+            for strace, (point, stats) in zip(traces, updates):
+                if strace.supports_sampler_stats:
+                    strace.record(point, stats)
+                else:
+                    strace.record(point)
+            if live_plot:
+                if live_plot_kwargs is None:
+                    live_plot_kwargs = {}
+                if it >= skip_first:
+                    mtrace = MultiTrace(traces)
+                    if it == skip_first:
+                        ax = plots.traceplot(mtrace, live_plot=False, **live_plot_kwargs)
+                    elif (it - skip_first) % refresh_every == 0 or it == draws - 1:
+                        plots.traceplot(mtrace, ax=ax, live_plot=True, **live_plot_kwargs)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if progressbar:
+            sampling.close()
+        chain_steps.close()
+        for c, strace in enumerate(traces):
+            strace.close()
+            if steppers is not None:
+                strace._add_warnings(steppers[c].warnings())
+    return MultiTrace(traces)
+
+
 def _sample(chain, progressbar, random_seed, start, draws=None, step=None,
             trace=None, tune=None, model=None, live_plot=False,
             live_plot_kwargs=None, **kwargs):
@@ -968,7 +1051,7 @@ def _choose_backend(trace, chain, shortcuts=None, **kwds):
 
 def _mp_sample(draws, tune, step, chains, cores, chain, random_seed,
                start, progressbar, trace=None, model=None, use_mmap=False,
-               **kwargs):
+               shared_trace=False, transfer_batch=1, **kwargs):
 
     if sys.version_info.major >= 3:
         import pymc3.parallel_sampling as ps
@@ -976,6 +1059,18 @@ def _mp_sample(draws, tune, step, chains, cores, chain, random_seed,
         # We did draws += tune in pm.sample
         draws -= tune
 
+        if step.generates_stats:
+            sampler_vars = step.stats_dtypes
+        else:
+            sampler_vars = None
+
+        # Reuse the processes of an active pool for this step method
+        pool = ps.SamplerPool.get_context(step)
+
+        # The workers can only write into shared buffers that are used
+        # directly as the trace if the trace is an empty NDArray
+        shared_trace = (shared_trace and pool is None and
+                        ps.supports_shared_trace(step))
         traces = []
         for idx in range(chain, chain + chains):
             if trace is not None:
@@ -984,20 +1079,29 @@ def _mp_sample(draws, tune, step, chains, cores, chain, random_seed,
                 strace = _choose_backend(None, idx, model=model)
             # TODO what is this for?
             update_start_vals(start[idx - chain], model.test_point, model)
-            if step.generates_stats and strace.supports_sampler_stats:
-                strace.setup(draws + tune, idx + chain, step.stats_dtypes)
-            else:
-                strace.setup(draws + tune, idx + chain)
+            shared_trace = (shared_trace and isinstance(strace, NDArray) and
+                            len(strace) == 0)
             traces.append(strace)
 
+        if not shared_trace:
+            for idx, strace in zip(range(chain, chain + chains), traces):
+                if step.generates_stats and strace.supports_sampler_stats:
+                    strace.setup(draws + tune, idx + chain, step.stats_dtypes)
+                else:
+                    strace.setup(draws + tune, idx + chain)
+
         sampler = ps.ParallelSampler(
             draws, tune, chains, cores, random_seed, start, step,
-            chain, progressbar)
+            chain, progressbar, shared_trace=shared_trace,
+            transfer_batch=transfer_batch, pool=pool)
         try:
             with sampler:
                 for draw in sampler:
                     trace = traces[draw.chain - chain]
-                    if trace.supports_sampler_stats and draw.stats is not None:
+                    if shared_trace:
+                        trace.setup_from_arrays(
+                            draw.chain, draw.point, sampler_vars, draw.stats)
+                    elif trace.supports_sampler_stats and draw.stats is not None:
                         trace.record(draw.point, draw.stats)
                     else:
                         trace.record(draw.point)
@@ -1007,6 +1111,12 @@ def _mp_sample(draws, tune, step, chains, cores, chain, random_seed,
                             trace._add_warnings(draw.warnings)
             return MultiTrace(traces)
         except KeyboardInterrupt:
+            if shared_trace:
+                # Keep the draws of the chains that did not finish
+                for idx, (point, stats) in sampler.trace_views().items():
+                    trace = traces[idx - chain]
+                    if len(trace) == 0 and point:
+                        trace.setup_from_arrays(idx, point, sampler_vars, stats)
             traces, length = _choose_chains(traces, tune)
             return MultiTrace(traces)[:length]
         finally:
@@ -1068,7 +1178,7 @@ def stop_tuning(step):
 
 
 def sample_ppc(trace, samples=None, model=None, vars=None, size=None,
-               random_seed=None, progressbar=True):
+               random_seed=None, progressbar=True, batched=False):
     """Generate posterior predictive samples from a model given a trace.
 
     Parameters
@@ -1092,6 +1202,12 @@ def sample_ppc(trace, samples=None, model=None, vars=None, size=None,
         Whether or not to display a progress bar in the command line. The bar shows the percentage
         of completion, the sampling speed in samples per second (SPS), and the estimated remaining
         time until completion ("expected time of arrival"; ETA).
+    batched : bool
+        If True, the selected trace points are stacked into arrays with a
+        leading sample dimension and the `random` method of each variable is
+        called once for all of them instead of once per point. Variables
+        whose `random` method does not support it are drawn one point at a
+        time, with a warning. Ignored if `size` is given. Defaults to False.
 
     Returns
     -------
@@ -1118,6 +1234,9 @@ def sample_ppc(trace, samples=None, model=None, vars=None, size=None,
 
     indices = np.random.randint(0, nchain * len_trace, samples)
 
+    if batched and size is None:
+        return _sample_ppc_batched(trace, indices, vars, progressbar)
+
     if progressbar:
         indices = tqdm(indices, total=samples)
 
@@ -1144,6 +1263,89 @@ def sample_ppc(trace, samples=None, model=None, vars=None, size=None,
     return {k: np.asarray(v) for k, v in ppc.items()}
 
 
+def _stack_points(trace, indices):
+    """Gather the trace points at `indices` into a single point whose values
+    have a leading sample dimension.
+
+    `indices` run over all chains of a `MultiTrace`, in the same order that
+    `MultiTrace.get_values` concatenates them.
+    """
+    if isinstance(trace, MultiTrace):
+        return {name: trace.get_values(name, combine=True)[indices]
+                for name in trace.varnames}
+    if isinstance(trace, BaseTrace):
+        return {name: trace.get_values(name)[indices]
+                for name in trace.varnames}
+    points = [trace[idx] for idx in indices]
+    return {name: np.stack([np.asarray(point[name]) for point in points])
+            for name in points[0]}
+
+
+def _draw_batched(var, point, samples):
+    """Draw `samples` values of `var` with a single call to its `random`
+    method, where every value in `point` has a leading sample dimension.
+
+    Raises ValueError, TypeError or IndexError if the distribution does not
+    support batched draws.
+    """
+    dist = var.distribution
+    if hasattr(var, 'observations'):
+        try:
+            shape = tuple(var.observations.shape.eval())
+        except AttributeError:
+            shape = tuple(var.observations.shape)
+    else:
+        shape = to_tuple(dist.shape)
+    if shape != to_tuple(dist.shape):
+        # Observed variables often leave their shape to be inferred from
+        # the observations. The model keeps its own distribution.
+        dist = copy(dist)
+        dist.shape = np.array(shape, dtype=int)
+    draws = np.asarray(dist.random(point=BatchedPoint(point, samples, shape),
+                                   size=samples))
+    if draws.shape != (samples,) + shape:
+        raise ValueError('Expected draws of shape {}, got {}.'.format(
+            (samples,) + shape, draws.shape))
+    return draws
+
+
+def _sample_ppc_batched(trace, indices, vars, progressbar):
+    """Posterior predictive sampling with one `random` call per variable
+    over all selected trace points. See `sample_ppc`."""
+    samples = len(indices)
+    points = _stack_points(trace, indices)
+
+    if progressbar:
+        vars = tqdm(vars)
+
+    ppc = {}
+    try:
+        for var in vars:
+            draws = None
+            if samples > 1:
+                try:
+                    draws = _draw_batched(var, points, samples)
+                except (ValueError, TypeError, IndexError) as e:
+                    warnings.warn('The random method of {} does not support '
+                                  'batched draws ({}). Drawing one sample at '
+                                  'a time.'.format(var.name, e))
+            if draws is None:
+                draws = np.asarray([
+                    var.distribution.random(
+                        point={name: value[i] for name, value in points.items()})
+                    for i in range(samples)])
+            ppc[var.name] = draws
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        if progressbar:
+            vars.close()
+
+    return ppc
+
+
 def sample_ppc_w(traces, samples=None, models=None, weights=None,
                  random_seed=None, progressbar=True):
     """Generate weighted posterior predictive samples from a list of models and
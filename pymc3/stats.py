@@ -1,11 +1,17 @@
 """Statistical utility functions for PyMC"""
 
+import hashlib
 import numpy as np
 import pandas as pd
 import itertools
+import tempfile
+import weakref
 from tqdm import tqdm
 import warnings
 from collections import namedtuple
+import theano
+import theano.tensor as tt
+from .memoize import memoize
 from .model import modelcontext
 from .util import get_default_varnames
 import pymc3 as pm
@@ -15,6 +21,7 @@ from scipy.special import logsumexp
 from scipy.stats import dirichlet
 from scipy.optimize import minimize
 from scipy.signal import fftconvolve
+from joblib import Parallel, delayed
 
 
 __all__ = ['autocorr', 'autocov', 'waic', 'loo', 'hpd', 'quantiles',
@@ -116,6 +123,132 @@ def autocov(x, lag=None):
         return acov[lag]
 
 
+# Maximum number of values of the log likelihood of draws and observations
+# that are computed or processed at once
+_LOG_LIK_CHUNK_SIZE = 2 ** 22
+
+# Maximum size in bytes of the matrix of the log likelihood of all draws
+# and observations for `loo` that is kept in memory. Larger matrices are
+# written to a temporary memory-mapped file.
+_LOG_LIK_MAX_MEMORY = 2 ** 30
+
+
+@memoize(bound=True)
+def _log_lik_function(model):
+    """Compile a function for the elementwise logp of the observed variables
+    for several draws.
+
+    The function takes one array for each free variable of the model, with
+    the draws along the first axis, and returns one array of shape
+    `(draws,) + shape` for each observed variable. The draws are evaluated
+    one after the other by a theano scan inside a single call.
+
+    The compiled function is cached on the model, so that later calls of
+    `waic`, `loo` or `compare` with the same model do not compile it again.
+    """
+    inputs = []
+    for var in model.vars:
+        batch = tt.TensorType(var.dtype, (False,) + var.broadcastable)(
+            var.name + '_draws')
+        test_value = np.asarray(model.test_point[var.name], dtype=var.dtype)
+        batch.tag.test_value = test_value[None]
+        inputs.append(batch)
+    outputs = [var.logp_elemwiset for var in model.observed_RVs]
+
+    def draw_logp(*values):
+        return theano.clone(outputs, replace=dict(zip(model.vars, values)))
+
+    logps, _ = theano.map(draw_logp, sequences=inputs)
+    if not isinstance(logps, (list, tuple)):
+        logps = [logps]
+    with model:
+        return theano.function(inputs, list(logps),
+                               allow_input_downcast=True,
+                               on_unused_input='ignore',
+                               accept_inplace=True)
+
+
+def _trace_draws(trace, model):
+    """Values of the free variables of the model for all draws of trace,
+    as one array per variable with the draws along the first axis."""
+    names = [var.name for var in model.vars]
+    if hasattr(trace, 'get_values'):
+        return [np.asarray(trace.get_values(name)) for name in names]
+    try:
+        points = trace.points()
+    except AttributeError:
+        points = trace
+    points = list(points)
+    return [np.array([point[name] for point in points]) for name in names]
+
+
+def _log_post_chunks(trace, model=None, chunk_size=None, progressbar=False):
+    """Iterate over the elementwise log-posterior for chunks of draws.
+
+    The log likelihood of many draws is computed with a single call of a
+    compiled function that scans over the draws, without evaluating the
+    full matrix of all draws and observations at once.
+
+    Parameters
+    ----------
+    trace : result of MCMC run
+    model : PyMC Model
+        Optional model. Default None, taken from context.
+    chunk_size : int
+        Number of draws per chunk. By default, chunks are chosen to have
+        at most `_LOG_LIK_CHUNK_SIZE` values.
+    progressbar: bool
+        Whether or not to display a progress bar in the command line.
+
+    Yields
+    ------
+    logp : array of shape (chunk_size, n_observations)
+        The contribution of the observations to the logp of the whole model
+        for each draw of the chunk.
+    """
+    model = modelcontext(model)
+    draws = _trace_draws(trace, model)
+    n_draws = len(draws[0]) if draws else len(trace)
+
+    if not model.observed_RVs:
+        if n_draws:
+            yield floatX(np.zeros((n_draws, 0)))
+        return
+
+    func = _log_lik_function(model)
+    masks = [~var.observations.mask if var.missing_values else None
+             for var in model.observed_RVs]
+
+    def logp_chunk(start, stop):
+        logps = func(*[values[start:stop] for values in draws])
+        logp_vals = []
+        for logp, mask in zip(logps, masks):
+            if mask is not None:
+                logp = logp[:, mask]
+            logp_vals.append(logp.reshape(stop - start, -1))
+        return np.concatenate(logp_vals, axis=1)
+
+    if not n_draws:
+        return
+    first = logp_chunk(0, 1)
+    if chunk_size is None:
+        chunk_size = max(1, _LOG_LIK_CHUNK_SIZE // max(1, first.shape[1]))
+
+    progress = tqdm(total=n_draws) if progressbar else None
+    try:
+        yield first
+        if progress is not None:
+            progress.update(1)
+        for start in range(1, n_draws, chunk_size):
+            stop = min(start + chunk_size, n_draws)
+            yield logp_chunk(start, stop)
+            if progress is not None:
+                progress.update(stop - start)
+    finally:
+        if progress is not None:
+            progress.close()
+
+
 def _log_post_trace(trace, model=None, progressbar=False):
     """Calculate the elementwise log-posterior for the sampled trace.
 
@@ -134,35 +267,53 @@ def _log_post_trace(trace, model=None, progressbar=False):
     logp : array of shape (n_samples, n_observations)
         The contribution of the observations to the logp of the whole model.
     """
-    model = modelcontext(model)
-    cached = [(var, var.logp_elemwise) for var in model.observed_RVs]
-
-    def logp_vals_point(pt):
-        if len(model.observed_RVs) == 0:
-            return floatX(np.array([], dtype='d'))
+    chunks = list(_log_post_chunks(trace, model, progressbar=progressbar))
+    if not chunks:
+        raise ValueError('The trace does not contain any draws.')
+    return np.concatenate(chunks)
 
-        logp_vals = []
-        for var, logp in cached:
-            logp = logp(pt)
-            if var.missing_values:
-                logp = logp[~var.observations.mask]
-            logp_vals.append(logp.ravel())
-
-        return np.concatenate(logp_vals)
-
-    try:
-        points = trace.points()
-    except AttributeError:
-        points = trace
 
-    points = tqdm(points) if progressbar else points
+def _log_lik_moments(chunks):
+    """Reduce chunks of the log likelihood of draws to the log of the mean
+    likelihood and the variance of the log likelihood of each observation.
 
-    try:
-        logp = (logp_vals_point(pt) for pt in points)
-        return np.stack(logp)
-    finally:
-        if progressbar:
-            points.close()
+    Returns the number of draws and both arrays.
+    """
+    n = 0
+    for chunk in chunks:
+        size = len(chunk)
+        chunk_lse = logsumexp(chunk, axis=0)
+        chunk_mean = chunk.mean(axis=0)
+        chunk_m2 = ((chunk - chunk_mean) ** 2).sum(axis=0)
+        if n == 0:
+            lse, mean, m2 = chunk_lse, chunk_mean, chunk_m2
+        else:
+            # Combine with the previous chunks (Chan et al.)
+            total = n + size
+            delta = chunk_mean - mean
+            mean = mean + delta * size / total
+            m2 = m2 + chunk_m2 + delta ** 2 * n * size / total
+            lse = np.logaddexp(lse, chunk_lse)
+        n += size
+    if n == 0:
+        raise ValueError('The trace does not contain any draws.')
+    return n, lse - np.log(n), m2 / n
+
+
+def _log_lik_matrix(chunks, n_draws, n_obs, directory=None):
+    """Collect chunks of the log likelihood in a matrix of shape
+    `(n_draws, n_obs)`. The matrix is a memory-mapped temporary file if it
+    is larger than `_LOG_LIK_MAX_MEMORY`."""
+    if n_draws * n_obs * 8 > _LOG_LIK_MAX_MEMORY:
+        matrix = np.memmap(tempfile.TemporaryFile(dir=directory),
+                           dtype=float, mode='w+', shape=(n_draws, n_obs))
+    else:
+        matrix = np.empty((n_draws, n_obs))
+    start = 0
+    for chunk in chunks:
+        matrix[start:start + len(chunk)] = chunk
+        start += len(chunk)
+    return matrix
 
 
 def waic(trace, model=None, pointwise=False, progressbar=False):
@@ -196,13 +347,10 @@ def waic(trace, model=None, pointwise=False, progressbar=False):
     """
     model = modelcontext(model)
 
-    log_py = _log_post_trace(trace, model, progressbar=progressbar)
-    if log_py.size == 0:
+    chunks = _log_post_chunks(trace, model, progressbar=progressbar)
+    _, lppd_i, vars_lpd = _log_lik_moments(chunks)
+    if lppd_i.size == 0:
         raise ValueError('The model does not contain observed values.')
-
-    lppd_i = logsumexp(log_py, axis=0, b=1.0 / log_py.shape[0])
-
-    vars_lpd = np.var(log_py, axis=0)
     warn_mg = 0
     if np.any(vars_lpd > 0.4):
         warnings.warn("""For one or more samples the posterior variance of the
@@ -232,7 +380,8 @@ def waic(trace, model=None, pointwise=False, progressbar=False):
         return WAIC_r(waic, waic_se, p_waic, warn_mg)
 
 
-def loo(trace, model=None, pointwise=False, reff=None, progressbar=False):
+def loo(trace, model=None, pointwise=False, reff=None, progressbar=False,
+        cores=1):
     """Calculates leave-one-out (LOO) cross-validation for out of sample
     predictive model fit, following Vehtari et al. (2015). Cross-validation is
     computed using Pareto-smoothed importance sampling (PSIS).
@@ -253,6 +402,9 @@ def loo(trace, model=None, pointwise=False, reff=None, progressbar=False):
         Whether or not to display a progress bar in the command line. The
         bar shows the percentage of completion, the evaluation speed, and
         the estimated time to completion
+    cores : int
+        Number of processes for Pareto smoothed importance sampling.
+        Default 1, useful for many observations.
 
     Returns
     -------
@@ -275,12 +427,31 @@ def loo(trace, model=None, pointwise=False, reff=None, progressbar=False):
             samples = len(trace) * trace.nchains
             reff = eff_ave / samples
 
-    log_py = _log_post_trace(trace, model, progressbar=progressbar)
-    if log_py.size == 0:
+    n_draws = len(trace) * getattr(trace, 'nchains', 1)
+    chunks = _log_post_chunks(trace, model, progressbar=progressbar)
+    first = next(chunks, None)
+    if first is None:
+        raise ValueError('The trace does not contain any draws.')
+    n_obs = first.shape[1]
+    if n_obs == 0:
         raise ValueError('The model does not contain observed values.')
-
-    lw, ks = _psislw(-log_py, reff)
-    lw += log_py
+    log_py = _log_lik_matrix(itertools.chain([first], chunks),
+                             n_draws, n_obs)
+
+    # The observations are independent in PSIS, so they are processed in
+    # blocks of columns to limit the size of temporary arrays
+    block = max(1, _LOG_LIK_CHUNK_SIZE // n_draws)
+    ks = np.empty(n_obs)
+    loo_lppd_i = np.empty(n_obs)
+    lppd_i = np.empty(n_obs)
+    for start in range(0, n_obs, block):
+        cols = slice(start, start + block)
+        log_py_block = np.asarray(log_py[:, cols])
+        lw, ks[cols] = _psislw(-log_py_block, reff, cores=cores)
+        lw += log_py_block
+        loo_lppd_i[cols] = - 2 * logsumexp(lw, axis=0)
+        lppd_i[cols] = logsumexp(log_py_block, axis=0, b=1. / n_draws)
+    del log_py
 
     warn_mg = 0
     if np.any(ks > 0.7):
@@ -292,10 +463,9 @@ def loo(trace, model=None, pointwise=False, reff=None, progressbar=False):
         happen with a non-robust model and highly influential observations.""")
         warn_mg = 1
 
-    loo_lppd_i = - 2 * logsumexp(lw, axis=0)
     loo_lppd = loo_lppd_i.sum()
     loo_lppd_se = (len(loo_lppd_i) * np.var(loo_lppd_i)) ** 0.5
-    lppd = np.sum(logsumexp(log_py, axis=0, b=1. / log_py.shape[0]))
+    lppd = np.sum(lppd_i)
     p_loo = lppd + (0.5 * loo_lppd)
 
     if pointwise:
@@ -311,7 +481,7 @@ def loo(trace, model=None, pointwise=False, reff=None, progressbar=False):
         return LOO_r(loo_lppd, loo_lppd_se, p_loo, warn_mg)
 
 
-def _psislw(lw, reff):
+def _psislw(lw, reff, cores=1):
     """Pareto smoothed importance sampling (PSIS).
 
     Parameters
@@ -320,6 +490,9 @@ def _psislw(lw, reff):
         Array of size (n_samples, n_observations)
     reff : float
         relative MCMC efficiency, `effective_n / n`
+    cores : int
+        Number of processes. The observations are split into one block
+        per process.
 
     Returns
     -------
@@ -328,57 +501,80 @@ def _psislw(lw, reff):
     kss : array
         Pareto tail indices
     """
+    m = lw.shape[1]
+    if cores > 1 and m > 1:
+        bounds = np.linspace(0, m, min(cores, m) + 1).astype(int)
+        jobs = (delayed(_psislw_block)(lw[:, start:stop], reff)
+                for start, stop in zip(bounds[:-1], bounds[1:]))
+        results = Parallel(n_jobs=cores)(jobs)
+        lw_out = np.concatenate([result[0] for result in results], axis=1)
+        kss = np.concatenate([result[1] for result in results])
+        return lw_out, kss
+    return _psislw_block(lw, reff)
+
+
+def _psislw_block(lw, reff):
+    """PSIS for all observations at once, see `_psislw`.
+
+    The tails of all observations are sorted together, and the generalized
+    Pareto distributions are fitted at once for all observations with the
+    same number of tail samples.
+    """
     n, m = lw.shape
+    cols = np.arange(m)
 
-    lw_out = np.copy(lw, order='F')
-    kss = np.empty(m)
+    # improve numerical accuracy
+    lw_out = lw - np.max(lw, axis=0)
+    kss = np.full(m, np.inf)
 
     # precalculate constants
     cutoff_ind = - int(np.ceil(min(n / 5., 3 * (n / reff) ** 0.5))) - 1
     cutoffmin = np.log(np.finfo(float).tiny)
     k_min = 1. / 3
 
-    # loop over sets of log weights
-    for i, x in enumerate(lw_out.T):
-        # improve numerical accuracy
-        x -= np.max(x)
-        # sort the array
-        x_sort_ind = np.argsort(x)
-        # divide log weights into body and right tail
-        xcutoff = max(x[x_sort_ind[cutoff_ind]], cutoffmin)
-
-        expxcutoff = np.exp(xcutoff)
-        tailinds, = np.where(x > xcutoff)
-        x2 = x[tailinds]
-        n2 = len(x2)
+    # sort the log weights of each observation
+    order = np.argsort(lw_out, axis=0, kind='mergesort')
+    lw_sort = lw_out[order, cols]
+    # divide log weights into body and right tail
+    xcutoff = np.maximum(lw_sort[cutoff_ind], cutoffmin)
+    expxcutoff = np.exp(xcutoff)
+    n2s = np.sum(lw_out > xcutoff, axis=0)
+
+    for n2 in np.unique(n2s):
         if n2 <= 4:
             # not enough tail samples for gpdfit
-            k = np.inf
-        else:
-            # order of tail samples
-            x2si = np.argsort(x2)
-            # fit generalized Pareto distribution to the right tail samples
-            x2 = np.exp(x2) - expxcutoff
-            k, sigma = _gpdfit(x2[x2si])
-
-        if k >= k_min and not np.isinf(k):
-            # no smoothing if short tail or GPD fit failed
-            # compute ordered statistic for the fit
-            sti = np.arange(0.5, n2) / n2
-            qq = _gpinv(sti, k, sigma)
-            qq = np.log(qq + expxcutoff)
-            # place the smoothed tail into the output array
-            x[tailinds[x2si]] = qq
-            # truncate smoothed values to the largest raw weight 0
-            x[x > 0] = 0
-        # renormalize weights
-        x -= logsumexp(x)
-        # store tail index k
-        kss[i] = k
+            continue
+        idx, = np.where(n2s == n2)
+        # fit generalized Pareto distribution to the right tail samples
+        x2 = np.exp(lw_sort[n - n2:, idx]) - expxcutoff[idx]
+        k, sigma = _gpdfit(x2)
+        kss[idx] = k
+
+        # no smoothing if short tail or GPD fit failed
+        smooth = (k >= k_min) & ~np.isinf(k)
+        if not np.any(smooth):
+            continue
+        idx = idx[smooth]
+        # compute ordered statistic for the fit
+        sti = np.arange(0.5, n2) / n2
+        qq = _gpinv(sti[:, None], k[smooth], sigma[smooth])
+        qq = np.log(qq + expxcutoff[idx])
+        # place the smoothed tail into the output array
+        lw_out[order[n - n2:, idx], idx] = qq
+
+    # truncate smoothed values to the largest raw weight 0
+    lw_out[lw_out > 0] = 0
+    # renormalize weights
+    lw_out -= logsumexp(lw_out, axis=0)
 
     return lw_out, kss
 
 
+# Maximum number of values in the temporary arrays of `_gpdfit`. The
+# columns of the data are processed in chunks so that this is not exceeded.
+_GPDFIT_BUFFER_SIZE = 2 ** 22
+
+
 def _gpdfit(x):
     """Estimate the parameters for the Generalized Pareto Distribution (GPD)
 
@@ -388,40 +584,47 @@ def _gpdfit(x):
     Parameters
     ----------
     x : array
-        sorted 1D data array
+        sorted 1D data array, or 2D array with sorted data in each column
 
     Returns
     -------
-    k : float
-        estimated shape parameter
-    sigma : float
-        estimated scale parameter
+    k : float or array
+        estimated shape parameter, for each column of 2D data
+    sigma : float or array
+        estimated scale parameter, for each column of 2D data
     """
+    if x.ndim == 1:
+        k, sigma = _gpdfit(x[:, None])
+        return k[0], sigma[0]
+
     prior_bs = 3
     prior_k = 10
-    n = len(x)
+    n, n_cols = x.shape
     m = 30 + int(n**0.5)
 
+    chunk = max(1, _GPDFIT_BUFFER_SIZE // (m * max(m, n)))
+    if n_cols > chunk:
+        results = [_gpdfit(x[:, i:i + chunk]) for i in range(0, n_cols, chunk)]
+        return (np.concatenate([k for k, _ in results]),
+                np.concatenate([sigma for _, sigma in results]))
+
     bs = 1 - np.sqrt(m / (np.arange(1, m + 1, dtype=float) - 0.5))
-    bs /= prior_bs * x[int(n/4 + 0.5) - 1]
+    bs = bs[:, None] / (prior_bs * x[int(n/4 + 0.5) - 1])
     bs += 1 / x[-1]
 
-    ks = np.log1p(-bs[:, None] * x).mean(axis=1)
+    ks = np.log1p(-bs[:, None, :] * x).mean(axis=1)
     L = n * (np.log(-(bs / ks)) - ks - 1)
     w = 1 / np.exp(L - L[:, None]).sum(axis=1)
 
     # remove negligible weights
-    dii = w >= 10 * np.finfo(float).eps
-    if not np.all(dii):
-        w = w[dii]
-        bs = bs[dii]
+    w[w < 10 * np.finfo(float).eps] = 0
     # normalise w
-    w /= w.sum()
+    w /= w.sum(axis=0)
 
     # posterior mean for b
-    b = np.sum(bs * w)
+    b = np.sum(bs * w, axis=0)
     # estimate for k
-    k = np.log1p(- b * x).mean()
+    k = np.log1p(- b * x).mean(axis=0)
     # add prior for k
     k = (n * k + prior_k * 0.5) / (n + prior_k)
     sigma = - k / b
@@ -430,34 +633,71 @@ def _gpdfit(x):
 
 
 def _gpinv(p, k, sigma):
-    """Inverse Generalized Pareto distribution function"""
-    x = np.full_like(p, np.nan)
-    if sigma <= 0:
-        return x
-    ok = (p > 0) & (p < 1)
-    if np.all(ok):
-        if np.abs(k) < np.finfo(float).eps:
-            x = - np.log1p(-p)
-        else:
-            x = np.expm1(-k * np.log1p(-p)) / k
-        x *= sigma
-    else:
-        if np.abs(k) < np.finfo(float).eps:
-            x[ok] = - np.log1p(-p[ok])
-        else:
-            x[ok] = np.expm1(-k * np.log1p(-p[ok])) / k
-        x *= sigma
-        x[p == 0] = 0
-        if k >= 0:
-            x[p == 1] = np.inf
-        else:
-            x[p == 1] = - sigma / k
-
+    """Inverse Generalized Pareto distribution function
+
+    `p`, `k` and `sigma` are broadcast against each other."""
+    p, k, sigma = np.broadcast_arrays(p, k, sigma)
+    x = np.full(p.shape, np.nan)
+    ok = (p > 0) & (p < 1) & (sigma > 0)
+    small = np.abs(k) < np.finfo(float).eps
+    with np.errstate(divide='ignore', invalid='ignore'):
+        q = - np.log1p(-p[ok])
+        x[ok] = np.where(small[ok], q, np.expm1(k[ok] * q) / k[ok])
+        x[ok] *= sigma[ok]
+        x[(p == 0) & (sigma > 0)] = 0
+        upper = (p == 1) & (sigma > 0)
+        x[upper] = np.where(k[upper] >= 0, np.inf, - sigma[upper] / k[upper])
     return x
 
 
+# Pointwise information criteria computed by `compare`, by trace and model
+_ic_cache = weakref.WeakKeyDictionary()
+
+
+def _cached_ic(trace, model, ic):
+    try:
+        return _ic_cache[trace][model][ic]
+    except (KeyError, TypeError):
+        return None
+
+
+def _cache_ic(trace, model, ic, result):
+    try:
+        models = _ic_cache.setdefault(trace, weakref.WeakKeyDictionary())
+    except TypeError:
+        # Traces that are not hashable, like lists of points
+        return
+    models.setdefault(model, {})[ic] = result
+
+
+def _ic_key(trace, model, ic):
+    """Cache key of an information criterion, which changes when draws
+    are added to the trace or shared observed data of the model is set."""
+    return (ic, len(trace), getattr(trace, 'nchains', 1),
+            _shared_fingerprint(model))
+
+
+def _shared_fingerprint(model):
+    """Hash of the values of the shared variables in the logp of the
+    observed variables."""
+    logps = [obs.logpt for obs in model.observed_RVs]
+    digest = hashlib.sha1()
+    for var in theano.gof.graph.inputs(logps):
+        if isinstance(var, theano.compile.SharedVariable):
+            value = np.ascontiguousarray(var.get_value(borrow=True))
+            digest.update(str((var.name, value.dtype, value.shape)).encode())
+            digest.update(value.tobytes())
+    return digest.hexdigest()
+
+
+def _pointwise_ic(ic_func, trace, model):
+    # A plain tuple, as the namedtuple classes of waic and loo can not be
+    # pickled to return the result from a worker process
+    return tuple(ic_func(trace, model, pointwise=True))
+
+
 def compare(model_dict, ic='WAIC', method='stacking', b_samples=1000,
-            alpha=1, seed=None, round_to=2):
+            alpha=1, seed=None, round_to=2, cores=1):
     R"""Compare models based on the widely available information criterion (WAIC)
     or leave-one-out (LOO) cross-validation.
     Read more theory here - in a paper by some of the leading authorities on
@@ -493,6 +733,11 @@ def compare(model_dict, ic='WAIC', method='stacking', b_samples=1000,
            np.random state is used.
     round_to : int
         Number of decimals used to round results (default 2).
+    cores : int
+        Number of processes used to compute the information criteria of
+        the models. Default 1. The pointwise information criteria are
+        cached, so comparing a model and trace again does not recompute
+        them.
 
     Returns
     -------
@@ -547,9 +792,21 @@ def compare(model_dict, ic='WAIC', method='stacking', b_samples=1000,
         raise ValueError('The method {}, to compute weights,'
                          'is not supported.'.format(method))
 
-    ics = []
+    results = {}
+    missing = []
     for n, (m, t) in zip(names, model_dict.items()):
-        ics.append((n, ic_func(t, m, pointwise=True)))
+        results[n] = _cached_ic(t, m, _ic_key(t, m, ic))
+        if results[n] is None:
+            missing.append((n, m, t))
+    if cores > 1 and len(missing) > 1:
+        jobs = (delayed(_pointwise_ic)(ic_func, t, m) for _, m, t in missing)
+        computed = Parallel(n_jobs=cores)(jobs)
+    else:
+        computed = [_pointwise_ic(ic_func, t, m) for _, m, t in missing]
+    for (n, m, t), res in zip(missing, computed):
+        _cache_ic(t, m, _ic_key(t, m, ic), res)
+        results[n] = res
+    ics = [(n, results[n]) for n in names]
 
     ics.sort(key=lambda x: x[1][0])
 
@@ -563,19 +820,12 @@ def compare(model_dict, ic='WAIC', method='stacking', b_samples=1000,
 
         def log_score(w):
             w_full = w_fuller(w)
-            score = 0.
-            for i in range(N):
-                score += np.log(np.dot(exp_ic_i[i], w_full))
-            return -score
+            return -np.sum(np.log(np.dot(exp_ic_i, w_full)))
 
         def gradient(w):
             w_full = w_fuller(w)
-            grad = np.zeros(Km)
-            for k in range(Km):
-                for i in range(N):
-                    grad[k] += (exp_ic_i[i, k] - exp_ic_i[i, Km]) / \
-                        np.dot(exp_ic_i[i], w_full)
-            return -grad
+            diff = exp_ic_i[:, :Km] - exp_ic_i[:, Km:]
+            return -np.dot(1. / np.dot(exp_ic_i, w_full), diff)
 
         theta = np.full(Km, 1. / K)
         bounds = [(0., 1.) for i in range(Km)]
@@ -597,13 +847,9 @@ def compare(model_dict, ic='WAIC', method='stacking', b_samples=1000,
 
         b_weighting = dirichlet.rvs(alpha=[alpha] * N, size=b_samples,
                                     random_state=seed)
-        weights = np.zeros((b_samples, K))
-        z_bs = np.zeros_like(weights)
-        for i in range(b_samples):
-            z_b = np.dot(b_weighting[i], ic_i)
-            u_weights = np.exp(-0.5 * (z_b - np.min(z_b)))
-            z_bs[i] = z_b
-            weights[i] = u_weights / np.sum(u_weights)
+        z_bs = np.dot(b_weighting, ic_i)
+        u_weights = np.exp(-0.5 * (z_bs - np.min(z_bs, axis=1)[:, None]))
+        weights = u_weights / np.sum(u_weights, axis=1)[:, None]
 
         weights = weights.mean(0)
         ses = z_bs.std(0)
@@ -693,6 +939,32 @@ def calc_min_interval(x, alpha):
     return hdi_min, hdi_max
 
 
+def _calc_min_intervals(x, alpha):
+    """Internal method to determine the minimum intervals of a given width
+    for each column of `x`.
+
+    Assumes that the columns of x are sorted.
+    """
+    n = len(x)
+    cred_mass = 1.0 - alpha
+
+    interval_idx_inc = int(np.floor(cred_mass * n))
+    n_intervals = n - interval_idx_inc
+    if n_intervals <= 0:
+        raise ValueError('Too few elements for interval calculation')
+
+    interval_width = x[interval_idx_inc:] - x[:n_intervals]
+    min_idx = np.argmin(interval_width, axis=0)
+    columns = np.arange(x.shape[1])
+    hdi_min = x[min_idx, columns]
+    hdi_max = x[min_idx + interval_idx_inc, columns]
+    return np.stack([hdi_min, hdi_max], axis=-1)
+
+
+# Maximum number of values that `hpd` sorts at once
+_HPD_CHUNK_SIZE = 2 ** 22
+
+
 @statfunc
 def hpd(x, alpha=0.05, transform=lambda x: x):
     """Calculate highest posterior density (HPD) of array for given alpha. The HPD is the
@@ -710,37 +982,17 @@ def hpd(x, alpha=0.05, transform=lambda x: x):
     # Make a copy of trace
     x = transform(x.copy())
 
-    # For multivariate node
-    if x.ndim > 1:
-
-        # Transpose first, then sort
-        tx = np.transpose(x, list(range(x.ndim))[1:] + [0])
-        dims = np.shape(tx)
-
-        # Container list for intervals
-        intervals = np.resize(0.0, dims[:-1] + (2,))
-
-        for index in make_indices(dims[:-1]):
-
-            try:
-                index = tuple(index)
-            except TypeError:
-                pass
-
-            # Sort trace
-            sx = np.sort(tx[index])
-
-            # Append to list
-            intervals[index] = calc_min_interval(sx, alpha)
-
-        # Transpose back before returning
-        return np.array(intervals)
-
-    else:
-        # Sort univariate node
-        sx = np.sort(x)
-
-        return np.array(calc_min_interval(sx, alpha))
+    # The intervals of all elements are computed at once, sorting
+    # chunks of elements along the axis of the samples
+    flat = x.reshape(len(x), -1)
+    n_samples, n_elems = flat.shape
+    chunk = max(1, _HPD_CHUNK_SIZE // max(1, n_samples))
+    intervals = np.empty((n_elems, 2), dtype=np.result_type(x, float))
+    for start in range(0, n_elems, chunk):
+        sx = np.sort(flat[:, start:start + chunk], axis=0)
+        intervals[start:start + chunk] = _calc_min_intervals(sx, alpha)
+
+    return intervals.reshape(x.shape[1:] + (2,))
 
 
 def _hpd_df(x, alpha):
@@ -1,12 +1,13 @@
 from .compound import CompoundStep
 
-from .hmc import HamiltonianMC, NUTS
+from .hmc import HamiltonianMC, NUTS, BatchNUTS
 
 from .metropolis import Metropolis
 from .metropolis import DEMetropolis
 from .metropolis import BinaryMetropolis
 from .metropolis import BinaryGibbsMetropolis
 from .metropolis import CategoricalGibbsMetropolis
+from .metropolis import MultipleTryMetropolis
 from .metropolis import NormalProposal
 from .metropolis import CauchyProposal
 from .metropolis import LaplaceProposal
@@ -78,6 +78,11 @@ class BlockedStep(object):
     def __getnewargs_ex__(self):
         return self.__newargs
 
+    def _array_layout(self):
+        """Ordering and dtype of the flat array that `step_array` updates,
+        or None if the step method can only step on dict points."""
+        return None
+
     @staticmethod
     def competence(var, has_grad):
         return Competence.INCOMPATIBLE
@@ -131,17 +136,38 @@ class ArrayStep(BlockedStep):
     def step(self, point):
         bij = DictToArrayBijection(self.ordering, point)
 
-        inputs = [bij.mapf(x) for x in self.fs]
-        if self.allvars:
-            inputs.append(point)
-
         if self.generates_stats:
-            apoint, stats = self.astep(bij.map(point), *inputs)
+            apoint, stats = self.step_array(bij.map(point), point)
             return bij.rmap(apoint), stats
         else:
-            apoint = self.astep(bij.map(point), *inputs)
+            apoint = self.step_array(bij.map(point), point)
             return bij.rmap(apoint)
 
+    def step_array(self, apoint, point):
+        """Step on the array of the sampled variables.
+
+        Parameters
+        ----------
+        apoint : array
+            Values of the sampled variables in the order of `ordering`.
+        point : dict
+            Values of all variables. The values of the sampled variables
+            are ignored.
+        """
+        bij = DictToArrayBijection(self.ordering, point)
+
+        inputs = [bij.mapf(x) for x in self.fs]
+        if self.allvars:
+            inputs.append(point)
+
+        return self.astep(apoint, *inputs)
+
+    def _array_layout(self):
+        if _overrides_step(self, ArrayStep):
+            return None
+        bij = DictToArrayBijection(self.ordering, {})
+        return self.ordering, bij.array_dtype
+
 
 class ArrayStepShared(BlockedStep):
     """Faster version of ArrayStep that requires the substep method that does not wrap
@@ -166,17 +192,37 @@ class ArrayStepShared(BlockedStep):
         self.bij = None
 
     def step(self, point):
+        bij = DictToArrayBijection(self.ordering, point)
+
+        if self.generates_stats:
+            apoint, stats = self.step_array(bij.map(point), point)
+            return bij.rmap(apoint), stats
+        else:
+            apoint = self.step_array(bij.map(point), point)
+            return bij.rmap(apoint)
+
+    def step_array(self, apoint, point):
+        """Step on the array of the sampled variables.
+
+        Parameters
+        ----------
+        apoint : array
+            Values of the sampled variables in the order of `ordering`.
+        point : dict
+            Values of all variables. The values of the sampled variables
+            are ignored.
+        """
         for var, share in self.shared.items():
             share.set_value(point[var])
 
         self.bij = DictToArrayBijection(self.ordering, point)
+        return self.astep(apoint)
 
-        if self.generates_stats:
-            apoint, stats = self.astep(self.bij.map(point))
-            return self.bij.rmap(apoint), stats
-        else:
-            apoint = self.astep(self.bij.map(point))
-            return self.bij.rmap(apoint)
+    def _array_layout(self):
+        if _overrides_step(self, ArrayStepShared):
+            return None
+        bij = DictToArrayBijection(self.ordering, {})
+        return self.ordering, bij.array_dtype
 
 
 class PopulationArrayStepShared(ArrayStepShared):
@@ -240,18 +286,48 @@ class GradientSharedStep(BlockedStep):
         self._logp_dlogp_func = func
 
     def step(self, point):
-        self._logp_dlogp_func.set_extra_values(point)
         array = self._logp_dlogp_func.dict_to_array(point)
 
         if self.generates_stats:
-            apoint, stats = self.astep(array)
+            apoint, stats = self.step_array(array, point)
             point = self._logp_dlogp_func.array_to_full_dict(apoint)
             return point, stats
         else:
-            apoint = self.astep(array)
+            apoint = self.step_array(array, point)
             point = self._logp_dlogp_func.array_to_full_dict(apoint)
             return point
 
+    def step_array(self, apoint, point):
+        """Step on the array of the sampled variables.
+
+        Parameters
+        ----------
+        apoint : array
+            Values of the sampled variables, as in `dict_to_array` of the
+            logp function.
+        point : dict
+            Values of all variables. The values of the sampled variables
+            are ignored.
+        """
+        self._logp_dlogp_func.set_extra_values(point)
+        return self.astep(apoint)
+
+    def _array_layout(self):
+        if _overrides_step(self, GradientSharedStep):
+            return None
+        func = self._logp_dlogp_func
+        return func._ordering, func.dtype
+
+
+def _overrides_step(method, base):
+    """Whether a subclass of `base` replaces the `step` method of `base`."""
+    for cls in type(method).__mro__:
+        if cls is base:
+            return False
+        if 'step' in vars(cls):
+            return True
+    return False
+
 
 def metrop_select(mr, q, q0):
     """Perform rejection/acceptance step for Metropolis class samplers.
@@ -3,13 +3,28 @@ Created on Mar 7, 2011
 
 @author: johnsalvatier
 '''
+import numpy as np
+
+from ..blocking import VarMap
 
 
 class CompoundStep(object):
     """Step method composed of a list of several other step
-    methods applied in sequence."""
+    methods applied in sequence.
+
+    Parameters
+    ----------
+    methods : list of step methods
+    array_state : bool
+        Keep the values of all sampled variables in one flat array during
+        an iteration. The step methods update views of their part of the
+        array instead of converting the point to a dict and back in every
+        step, and the point is converted back to a dict once per
+        iteration. Step methods that only work on dict points are
+        supported as well. Defaults to False.
+    """
 
-    def __init__(self, methods):
+    def __init__(self, methods, array_state=False):
         self.methods = list(methods)
         self.generates_stats = any(
             method.generates_stats for method in self.methods)
@@ -17,8 +32,15 @@ class CompoundStep(object):
         for method in self.methods:
             if method.generates_stats:
                 self.stats_dtypes.extend(method.stats_dtypes)
+        self.array_state = array_state
+        self._layout = None
 
     def step(self, point):
+        if self.array_state:
+            if self._layout is None:
+                self._setup_layout()
+            if self._layout:
+                return self._step_array_state(point)
         if self.generates_stats:
             states = []
             for method in self.methods:
@@ -33,6 +55,101 @@ class CompoundStep(object):
                 point = method.step(point)
             return point
 
+    def _setup_layout(self):
+        """Place the variables of all step methods in one flat array."""
+        layouts = []
+        for method in self.methods:
+            layout = getattr(method, '_array_layout', None)
+            layouts.append(layout() if layout is not None else None)
+        if all(layout is None for layout in layouts):
+            self._layout = ()
+            return
+
+        dtypes = set(layout[1] for layout in layouts if layout is not None)
+        dtype = dtypes.pop() if len(dtypes) == 1 else 'float64'
+
+        vmap = []
+        by_name = {}
+        size = 0
+        for layout in layouts:
+            if layout is None:
+                continue
+            for varmap in layout[0].vmap:
+                if varmap.var in by_name:
+                    continue
+                n = int(np.prod(varmap.shp, dtype=int))
+                varmap = VarMap(varmap.var, slice(size, size + n),
+                                varmap.shp, varmap.dtyp)
+                vmap.append(varmap)
+                by_name[varmap.var] = varmap
+                size += n
+
+        # Each step method works on a slice of the array if its variables
+        # are stored in the same order, and on a copy otherwise. Values
+        # of variables with another dtype than the array are copies, that
+        # are updated after each step.
+        indices = []
+        for layout in layouts:
+            if layout is None:
+                indices.append(None)
+                continue
+            ordering, method_dtype = layout
+            slcs = [by_name[varmap.var].slc for varmap in ordering.vmap]
+            contiguous = all(a.stop == b.start
+                             for a, b in zip(slcs[:-1], slcs[1:]))
+            if contiguous:
+                idx = slice(slcs[0].start, slcs[-1].stop)
+            else:
+                idx = np.concatenate([np.arange(slc.start, slc.stop)
+                                      for slc in slcs])
+            casts = [by_name[varmap.var] for varmap in ordering.vmap
+                     if np.dtype(varmap.dtyp) != dtype]
+            indices.append((idx, np.dtype(method_dtype), casts))
+
+        views = [varmap for varmap in vmap
+                 if np.dtype(varmap.dtyp) == np.dtype(dtype)]
+        self._layout = vmap, views, size, np.dtype(dtype), indices
+
+    def _step_array_state(self, point):
+        vmap, views, size, dtype, indices = self._layout
+
+        array = np.empty(size, dtype=dtype)
+        for var, slc, _, _ in vmap:
+            array[slc] = point[var].ravel()
+        # Values of the variables with the dtype of the array are views,
+        # which always hold the current state.
+        point = point.copy()
+        for var, slc, shp, _ in views:
+            point[var] = array[slc].reshape(shp)
+
+        states = []
+        for method, index in zip(self.methods, indices):
+            if index is None:
+                result = method.step(point)
+                if method.generates_stats:
+                    result, state = result
+                    states.extend(state)
+                point = result.copy()
+                for var, slc, _, _ in vmap:
+                    array[slc] = point[var].ravel()
+                for var, slc, shp, _ in views:
+                    point[var] = array[slc].reshape(shp)
+                continue
+
+            idx, method_dtype, casts = index
+            apoint = array[idx].astype(method_dtype, copy=False)
+            result = method.step_array(apoint, point)
+            if method.generates_stats:
+                result, state = result
+                states.extend(state)
+            array[idx] = np.ravel(result)
+            for var, slc, shp, dtyp in casts:
+                point[var] = array[slc].reshape(shp).astype(dtyp)
+
+        if self.generates_stats:
+            return point, states
+        return point
+
     def warnings(self):
         warns = []
         for method in self.methods:
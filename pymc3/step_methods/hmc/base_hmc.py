@@ -110,7 +110,12 @@ class BaseHMC(arraystep.GradientSharedStep):
         """Perform a single HMC iteration."""
         p0 = self.potential.random()
         start = self.integrator.compute_state(q0, p0)
+        step_size = self._start_step(start)
+        hmc_step = self._hamiltonian_step(start, p0, step_size)
+        return self._finish_step(hmc_step)
 
+    def _start_step(self, start):
+        """Check the start of a trajectory and return its step size."""
         if not np.isfinite(start.energy):
             self.potential.raise_ok(self._logp_dlogp_func._ordering.vmap)
             raise ValueError('Bad initial energy: %s. The model '
@@ -122,9 +127,11 @@ class BaseHMC(arraystep.GradientSharedStep):
 
         if self._step_rand is not None:
             step_size = self._step_rand(step_size)
+        return step_size
 
-        hmc_step = self._hamiltonian_step(start, p0, step_size)
-
+    def _finish_step(self, hmc_step):
+        """Update the adaptation and return the new point and stats."""
+        adapt_step = self.tune and self.adapt_step_size
         self.step_adapt.update(hmc_step.accept_stat, adapt_step)
         self.potential.update(hmc_step.end.q, hmc_step.end.q_grad, self.tune)
         if hmc_step.divergence_info:
@@ -137,7 +144,8 @@ class BaseHMC(arraystep.GradientSharedStep):
                 self._num_divs_sample += 1
                 # We don't want to fill up all memory with divergence info
                 if self._num_divs_sample < 100:
-                    point = self._logp_dlogp_func.array_to_dict(info.state.q)
+                    point = self._logp_dlogp_func.array_to_dict(
+                        info.state.q.copy())
                 else:
                     point = None
             warning = SamplerWarning(
@@ -158,7 +166,8 @@ class BaseHMC(arraystep.GradientSharedStep):
         stats.update(hmc_step.stats)
         stats.update(self.step_adapt.stats())
 
-        return hmc_step.end.q, [stats]
+        # The state may use buffers of the state pool of the integrator
+        return hmc_step.end.q.copy(), [stats]
 
     def reset(self, start=None):
         self.tune = True
@@ -0,0 +1,226 @@
+import copy
+
+import numpy as np
+from scipy import linalg
+
+from .base_hmc import HMCStepData
+from .integration import (CpuLeapfrogIntegrator, IntegrationError,
+                          as_integration_error)
+from .nuts import NUTS, _Tree, logbern
+from pymc3.theanof import floatX
+
+__all__ = ['BatchNUTS']
+
+
+class _Done(object):
+    """Last item of a generator of logp requests, which holds its result."""
+
+    def __init__(self, value):
+        self.value = value
+
+
+class _LogpRequest(object):
+    """A position at which a chain needs the logp and its gradient.
+
+    The sampler that drives the chains writes the gradient to `q_grad`
+    and sets `logp`, or sets `error` if the computation failed.
+    """
+
+    def __init__(self, q, q_grad):
+        self.q = q
+        self.q_grad = q_grad
+        self.logp = None
+        self.error = None
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return self.logp
+
+
+class _BatchTree(_Tree):
+    """NUTS tree whose methods are generators, that yield a `_LogpRequest`
+    for every leapfrog step and a `_Done` with the result of the method.
+
+    This lets one loop advance the trees of several chains together.
+    """
+
+    def extend(self, direction):
+        if direction > 0:
+            left, epsilon = self.right, self.step_size
+        else:
+            left, epsilon = self.left, -self.step_size
+        for request in self._build_subtree(
+                left, self.depth, floatX(np.asarray(epsilon))):
+            if isinstance(request, _Done):
+                break
+            yield request
+        tree, diverging, turning = request.value
+        yield _Done(self._add_subtree(direction, tree, diverging, turning))
+
+    def _single_step(self, left, epsilon):
+        integrator = self.integrator
+        try:
+            try:
+                out = integrator.state_pool.get()
+                new = integrator.step_position(epsilon, left, out=out)
+                request = _LogpRequest(new.q, new.q_grad)
+                yield request
+                right = integrator.step_momentum(epsilon, new,
+                                                 request.result())
+            except (linalg.LinAlgError, ValueError) as err:
+                error = as_integration_error(err)
+                if error is None:
+                    raise
+                raise error
+        except IntegrationError as err:
+            yield _Done(self._leaf(left, None, err))
+        else:
+            yield _Done(self._leaf(left, right, None))
+
+    def _build_subtree(self, left, depth, epsilon):
+        if depth == 0:
+            for request in self._single_step(left, epsilon):
+                yield request
+            return
+
+        for request in self._build_subtree(left, depth - 1, epsilon):
+            if isinstance(request, _Done):
+                break
+            yield request
+        tree1, diverging, turning = request.value
+        if diverging or turning:
+            yield request
+            return
+
+        for request in self._build_subtree(tree1.right, depth - 1, epsilon):
+            if isinstance(request, _Done):
+                break
+            yield request
+        tree2, diverging, turning = request.value
+        yield _Done(self._merge(tree1, tree2, diverging, turning))
+
+
+class BatchNUTS(NUTS):
+    R"""A NUTS sampler that advances several chains together in one process.
+
+    Each chain has its own trajectories, step size and mass matrix
+    adaptation. The trajectories of all chains are built in a single
+    loop: every chain runs until it needs the logp and its gradient at a
+    new position, and the requests of all chains are then computed
+    together, one chain after the other. Theano can not compile the logp
+    of an arbitrary model for a leading chain dimension, so the requests
+    are not evaluated in a single vectorized call.
+
+    `pm.sample` uses this step method for all chains at once, the
+    `cores` argument is ignored. All free variables of the model must be
+    sampled by this step method.
+
+    Parameters
+    ----------
+    vars : list of Theano variables, default all continuous vars
+    kwargs: passed to NUTS
+    """
+    name = 'batch_nuts'
+
+    def __init__(self, vars=None, **kwargs):
+        super(BatchNUTS, self).__init__(vars, **kwargs)
+        if self._logp_dlogp_func._extra_vars:
+            raise ValueError('BatchNUTS must sample all free variables.')
+
+    def _chain_copy(self):
+        """Copy of the step method for one chain, with its own adaptation
+        state and state pool."""
+        step = copy.copy(self)
+        step.potential = copy.deepcopy(self.potential)
+        step.step_adapt = copy.deepcopy(self.step_adapt)
+        step._warnings = []
+        step.integrator = CpuLeapfrogIntegrator(
+            step.potential, self._logp_dlogp_func)
+        return step
+
+    def _draw(self, q0):
+        """Generator version of `astep`, see `_BatchTree`."""
+        p0 = self.potential.random()
+        request = _LogpRequest(q0, np.empty_like(q0))
+        yield request
+        start = self.integrator.state_from_logp(
+            q0, p0, request.result(), request.q_grad)
+        step_size = self._start_step(start)
+
+        max_treedepth = self._max_treedepth()
+        # A trajectory has less than 2 ** max_treedepth leapfrog steps
+        self.integrator.state_pool.reset(2 ** max_treedepth)
+        tree = _BatchTree(len(p0), self.integrator, start, step_size,
+                          self.Emax)
+
+        for _ in range(max_treedepth):
+            direction = logbern(np.log(0.5)) * 2 - 1
+            for request in tree.extend(direction):
+                if isinstance(request, _Done):
+                    break
+                yield request
+            divergence_info, turning = request.value
+            if divergence_info or turning:
+                break
+        else:
+            if not self.tune:
+                self._reached_max_treedepth += 1
+
+        stats = tree.stats()
+        hmc_step = HMCStepData(tree.proposal, stats['mean_tree_accept'],
+                               divergence_info, stats)
+        yield _Done(self._finish_step(hmc_step))
+
+    def _draw_chains(self, steps, arrays):
+        """Draw the next array and stats of every chain."""
+        func = self._logp_dlogp_func
+        draws = [step._draw(q) for step, q in zip(steps, arrays)]
+        results = [None] * len(draws)
+        pending = list(range(len(draws)))
+        while pending:
+            requests = []
+            for chain in pending:
+                request = next(draws[chain])
+                if isinstance(request, _Done):
+                    results[chain] = request.value
+                else:
+                    requests.append((chain, request))
+            for _, request in requests:
+                try:
+                    request.logp = func(request.q, request.q_grad)
+                except Exception as err:
+                    request.error = err
+            pending = [chain for chain, _ in requests]
+        return results
+
+    def iter_chains(self, starts, draws, tune=None):
+        """Generate draws of one chain per start point.
+
+        Parameters
+        ----------
+        starts : list of dicts
+            The start points of the chains
+        draws : int
+            The number of draws per chain, including tuning
+        tune : int
+            The number of tuning draws, after which the tuning of the
+            step methods of the chains is stopped.
+
+        Yields
+        ------
+        The list of the step methods of the chains, and a list of
+        tuples `(point, stats)` for each draw
+        """
+        func = self._logp_dlogp_func
+        func.set_extra_values({})
+        steps = [self._chain_copy() for _ in starts]
+        arrays = [func.dict_to_array(start) for start in starts]
+        for i in range(draws):
+            if i == tune:
+                for step in steps:
+                    step.stop_tuning()
+            results = self._draw_chains(steps, arrays)
+            arrays = [q for q, _ in results]
+            yield steps, [(func.array_to_full_dict(q), stats)
+                          for q, stats in results]
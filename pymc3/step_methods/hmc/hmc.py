@@ -94,9 +94,14 @@ class HamiltonianMC(BaseHMC):
         energy_change = -np.inf
         state = start
         div_info = None
+        # Alternate between two buffers, only the last state is needed
+        pool = self.integrator.state_pool
+        pool.reset(2)
+        buffers = [pool.get(), pool.get()]
         try:
-            for _ in range(n_steps):
-                state = self.integrator.step(step_size, state)
+            for i in range(n_steps):
+                state = self.integrator.step(
+                    step_size, state, out=buffers[i % 2])
         except IntegrationError as e:
             div_info = DivergenceInfo('Divergence encountered.', e, state)
         else:
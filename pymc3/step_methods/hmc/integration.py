@@ -11,6 +11,74 @@ class IntegrationError(RuntimeError):
     pass
 
 
+def as_integration_error(err):
+    """Return an IntegrationError for an error of scipy.linalg during a
+    leapfrog step, or None if `err` is a different error."""
+    if isinstance(err, linalg.LinAlgError):
+        return IntegrationError("LinAlgError during leapfrog step.")
+    # Raised by many scipy.linalg functions
+    scipy_msg = "array must not contain infs or nans"
+    if (isinstance(err, ValueError) and len(err.args) > 0 and
+            scipy_msg in err.args[0].lower()):
+        return IntegrationError(
+            "Infs or nans in scipy.linalg during leapfrog step.")
+    return None
+
+
+class StatePool(object):
+    def __init__(self, ndim, dtype, max_bytes=2 ** 27):
+        """Preallocated arrays for the states of trajectories.
+
+        The arrays of a state are allocated the first time they are needed
+        and are reused by all later trajectories. States obtained by `get`
+        stay valid until the next call of `reset`.
+
+        Parameters
+        ----------
+        ndim : int
+            Number of dimensions of the states.
+        dtype : numpy dtype
+            dtype of the states.
+        max_bytes : int
+            Maximum memory used by the arrays of the pool. `get` returns
+            None if the pool can not grow any further.
+        """
+        self._ndim = ndim
+        self._dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        self._max_states = max_bytes // max(1, 4 * ndim * self._dtype.itemsize)
+        self._states = []
+        self._size = 0
+        self._used = 0
+
+    def reset(self, size):
+        """Release all states and use at most `size` states until the
+        next reset."""
+        self._size = min(size, self._max_states)
+        self._used = 0
+
+    def get(self):
+        """Return an unused state, or None if the pool is exhausted.
+
+        The energy of the returned state is undefined."""
+        if self._used >= self._size:
+            return None
+        if self._used == len(self._states):
+            arrays = [np.empty(self._ndim, dtype=self._dtype)
+                      for _ in range(4)]
+            self._states.append(State(*arrays, energy=None))
+        state = self._states[self._used]
+        self._used += 1
+        return state
+
+    def __getstate__(self):
+        # Do not copy the buffers to other processes
+        state = self.__dict__.copy()
+        state['_states'] = []
+        state['_size'] = state['_used'] = 0
+        return state
+
+
 class CpuLeapfrogIntegrator(object):
     def __init__(self, potential, logp_dlogp_func):
         """Leapfrog integrator using CPU."""
@@ -21,12 +89,18 @@ class CpuLeapfrogIntegrator(object):
             raise ValueError("dtypes of potential (%s) and logp function (%s)"
                              "don't match."
                              % (self._potential.dtype, self._dtype))
+        self.state_pool = StatePool(self._logp_dlogp_func.size, self._dtype)
 
     def compute_state(self, q, p):
         """Compute Hamiltonian functions using a position and momentum."""
         if q.dtype != self._dtype or p.dtype != self._dtype:
             raise ValueError('Invalid dtype. Must be %s' % self._dtype)
         logp, dlogp = self._logp_dlogp_func(q)
+        return self.state_from_logp(q, p, logp, dlogp)
+
+    def state_from_logp(self, q, p, logp, dlogp):
+        """Compute Hamiltonian functions from a position and momentum and
+        the logp and its gradient at the position."""
         v = self._potential.velocity(p)
         kinetic = self._potential.energy(p, velocity=v)
         energy = kinetic - logp
@@ -44,27 +118,33 @@ class CpuLeapfrogIntegrator(object):
         state: State namedtuple,
             current position data
         out: (optional) State namedtuple,
-            preallocated arrays to write to in place
+            preallocated arrays to write to in place. They must not
+            share memory with `state`.
 
         Returns
         -------
-        None if `out` is provided, else a State namedtuple
+        A State namedtuple, which uses the arrays of `out` if provided
         """
         try:
-            return self._step(epsilon, state, out=None)
-        except linalg.LinAlgError as err:
-            msg = "LinAlgError during leapfrog step."
-            raise IntegrationError(msg)
-        except ValueError as err:
-            # Raised by many scipy.linalg functions
-            scipy_msg = "array must not contain infs or nans"
-            if len(err.args) > 0 and scipy_msg in err.args[0].lower():
-                msg = "Infs or nans in scipy.linalg during leapfrog step."
-                raise IntegrationError(msg)
-            else:
+            return self._step(epsilon, state, out=out)
+        except (linalg.LinAlgError, ValueError) as err:
+            error = as_integration_error(err)
+            if error is None:
                 raise
+            raise error
 
     def _step(self, epsilon, state, out=None):
+        new = self.step_position(epsilon, state, out=out)
+        logp = self._logp_dlogp_func(new.q, new.q_grad)
+        return self.step_momentum(epsilon, new, logp)
+
+    def step_position(self, epsilon, state, out=None):
+        """First part of a leapfrog step, up to the new position.
+
+        Returns a State namedtuple without energy, whose `q_grad` array
+        must be filled with the gradient at the new position before
+        calling `step_momentum`.
+        """
         pot = self._potential
         axpy = linalg.blas.get_blas_funcs('axpy', dtype=self._dtype)
 
@@ -75,7 +155,7 @@ class CpuLeapfrogIntegrator(object):
             v_new = np.empty_like(q)
             q_new_grad = np.empty_like(q)
         else:
-            q_new, p_new, v_new, q_new_grad, energy = out
+            q_new, p_new, v_new, q_new_grad, _ = out
             q_new[:] = q
             p_new[:] = p
 
@@ -90,16 +170,19 @@ class CpuLeapfrogIntegrator(object):
         # q_new = q + epsilon * v_new
         axpy(v_new, q_new, a=epsilon)
 
-        logp = self._logp_dlogp_func(q_new, q_new_grad)
+        return State(q_new, p_new, v_new, q_new_grad, None)
+
+    def step_momentum(self, epsilon, new, logp):
+        """Second part of a leapfrog step, from the state returned by
+        `step_position` and the logp at the new position."""
+        axpy = linalg.blas.get_blas_funcs('axpy', dtype=self._dtype)
+        q_new, p_new, v_new, q_new_grad, _ = new
+        dt = 0.5 * epsilon
 
         # p_new = p_new + dt * q_new_grad
         axpy(q_new_grad, p_new, a=dt)
 
-        kinetic = pot.velocity_energy(p_new, v_new)
+        kinetic = self._potential.velocity_energy(p_new, v_new)
         energy = kinetic - logp
 
-        if out is not None:
-            out.energy = energy
-            return
-        else:
-            return State(q_new, p_new, v_new, q_new_grad, energy)
+        return State(q_new, p_new, v_new, q_new_grad, energy)
@@ -155,12 +155,16 @@ class NUTS(BaseHMC):
         self.early_max_treedepth = early_max_treedepth
         self._reached_max_treedepth = 0
 
-    def _hamiltonian_step(self, start, p0, step_size):
+    def _max_treedepth(self):
         if self.tune and self.iter_count < 200:
-            max_treedepth = self.early_max_treedepth
-        else:
-            max_treedepth = self.max_treedepth
+            return self.early_max_treedepth
+        return self.max_treedepth
 
+    def _hamiltonian_step(self, start, p0, step_size):
+        max_treedepth = self._max_treedepth()
+
+        # A trajectory has less than 2 ** max_treedepth leapfrog steps
+        self.integrator.state_pool.reset(2 ** max_treedepth)
         tree = _Tree(len(p0), self.integrator, start, step_size, self.Emax)
 
         for _ in range(max_treedepth):
@@ -254,10 +258,16 @@ class _Tree(object):
         if direction > 0:
             tree, diverging, turning = self._build_subtree(
                 self.right, self.depth, floatX(np.asarray(self.step_size)))
-            self.right = tree.right
         else:
             tree, diverging, turning = self._build_subtree(
                 self.left, self.depth, floatX(np.asarray(-self.step_size)))
+        return self._add_subtree(direction, tree, diverging, turning)
+
+    def _add_subtree(self, direction, tree, diverging, turning):
+        """Add the subtree that `extend` built in `direction`."""
+        if direction > 0:
+            self.right = tree.right
+        else:
             self.left = tree.right
 
         self.depth += 1
@@ -283,10 +293,17 @@ class _Tree(object):
     def _single_step(self, left, epsilon):
         """Perform a leapfrog step and handle error cases."""
         try:
-            right = self.integrator.step(epsilon, left)
+            out = self.integrator.state_pool.get()
+            right = self.integrator.step(epsilon, left, out=out)
         except IntegrationError as err:
-            error_msg = str(err)
-            error = err
+            return self._leaf(left, None, err)
+        return self._leaf(left, right, None)
+
+    def _leaf(self, left, right, error):
+        """Subtree of the leapfrog step from `left` to `right`, or of a
+        failed step if `right` is None."""
+        if right is None:
+            error_msg = str(error)
         else:
             energy_change = right.energy - self.start_energy
             if np.isnan(energy_change):
@@ -321,7 +338,10 @@ class _Tree(object):
 
         tree2, diverging, turning = self._build_subtree(
             tree1.right, depth - 1, epsilon)
+        return self._merge(tree1, tree2, diverging, turning)
 
+    def _merge(self, tree1, tree2, diverging, turning):
+        """Join two adjacent subtrees of the same depth."""
         left, right = tree1.left, tree2.right
 
         if not (diverging or turning):
@@ -1,8 +1,10 @@
 import numpy as np
 import numpy.random as nr
 import theano
+import theano.tensor as tt
 import scipy.linalg
 import warnings
+from multiprocessing.pool import ThreadPool
 
 from ..distributions import draw_values
 from .arraystep import ArrayStepShared, PopulationArrayStepShared, ArrayStep, metrop_select, Competence
@@ -10,8 +12,8 @@ import pymc3 as pm
 from pymc3.theanof import floatX
 
 __all__ = ['Metropolis', 'BinaryMetropolis', 'BinaryGibbsMetropolis',
-           'CategoricalGibbsMetropolis', 'NormalProposal', 'CauchyProposal',
-           'LaplaceProposal', 'PoissonProposal', 'MultivariateNormalProposal']
+           'CategoricalGibbsMetropolis', 'MultipleTryMetropolis',
+           'NormalProposal', 'CauchyProposal', 'LaplaceProposal', 'PoissonProposal', 'MultivariateNormalProposal']
 
 # Available proposal distributions for Metropolis
 
@@ -311,11 +313,18 @@ class BinaryGibbsMetropolis(ArrayStep):
         which resulting in more efficient antithetical sampling.
     model : PyMC Model
         Optional model for sampling step. Defaults to None (taken from context).
+    elemwise : bool
+        Declare that the elements of each variable are independent given
+        the other variables, like the latent assignments of a mixture
+        model. All elements of a variable are then updated at once, with
+        one vectorized evaluation of the elementwise logp of the terms of
+        the model that depend on the variable. The order is ignored.
 
     """
     name = 'binary_gibbs_metropolis'
 
-    def __init__(self, vars, order='random', transit_p=.8, model=None):
+    def __init__(self, vars, order='random', transit_p=.8, model=None,
+                 elemwise=False):
 
         model = pm.modelcontext(model)
 
@@ -337,9 +346,17 @@ class BinaryGibbsMetropolis(ArrayStep):
             raise ValueError(
                 'All variables must be binary for BinaryGibbsMetropolis')
 
-        super(BinaryGibbsMetropolis, self).__init__(vars, [model.fastlogp])
+        fs = [model.fastlogp]
+        self.elemwise = elemwise
+        if elemwise:
+            fs += [elemwise_logp(model, var) for var in vars]
+
+        super(BinaryGibbsMetropolis, self).__init__(vars, fs)
+
+    def astep(self, q0, logp, *elemwise_logps):
+        if self.elemwise:
+            return self.astep_elemwise(q0, elemwise_logps)
 
-    def astep(self, q0, logp):
         order = self.order
         if self.shuffle_dims:
             nr.shuffle(order)
@@ -359,6 +376,17 @@ class BinaryGibbsMetropolis(ArrayStep):
 
         return q
 
+    def astep_elemwise(self, q0, elemwise_logps):
+        q = np.copy(q0)
+        for (_, slc, _, _), logp in zip(self.ordering.vmap, elemwise_logps):
+            logp_curr = logp(q).ravel()
+            flip = nr.rand(slc.stop - slc.start) < self.transit_p
+            q[slc] = np.where(flip, True - q[slc], q[slc])
+            delta = logp(q).ravel() - logp_curr
+            accept = np.isfinite(delta) & (np.log(nr.uniform(size=len(flip))) < delta)
+            q[slc] = np.where(flip & ~accept, True - q[slc], q[slc])
+        return q
+
     @staticmethod
     def competence(var):
         '''
@@ -381,15 +409,25 @@ class CategoricalGibbsMetropolis(ArrayStep):
        two types of proposals: A uniform proposal and a proportional proposal,
        which was introduced by Liu in his 1996 technical report
        "Metropolized Gibbs Sampler: An Improvement".
+
+       If the elements of each variable are independent given the other
+       variables, like the latent assignments of a mixture model, set
+       `elemwise=True`. All elements of a variable are then updated at
+       once, and each proposed category costs one vectorized evaluation
+       of the elementwise logp of the terms of the model that depend on
+       the variable, instead of one logp evaluation per element. The
+       order is ignored in this case.
     """
     name = 'caregorical_gibbs_metropolis'
 
-    def __init__(self, vars, proposal='uniform', order='random', model=None):
+    def __init__(self, vars, proposal='uniform', order='random', model=None,
+                 elemwise=False):
 
         model = pm.modelcontext(model)
         vars = pm.inputvars(vars)
 
         dimcats = []
+        var_cats = []
         # The above variable is a list of pairs (aggregate dimension, number
         # of categories). For example, if vars = [x, y] with x being a 2-D
         # variable with M categories and y being a 3-D variable with N
@@ -405,6 +443,7 @@ class CategoricalGibbsMetropolis(ArrayStep):
                                  'for CategoricalGibbsMetropolis')
             start = len(dimcats)
             dimcats += [(dim, k) for dim in range(start, start + v.dsize)]
+            var_cats.append(k)
 
         if order == 'random':
             self.shuffle_dims = True
@@ -424,7 +463,16 @@ class CategoricalGibbsMetropolis(ArrayStep):
             raise ValueError('Argument \'proposal\' should either be ' +
                     '\'uniform\' or \'proportional\'')
 
-        super(CategoricalGibbsMetropolis, self).__init__(vars, [model.fastlogp])
+        fs = [model.fastlogp]
+        if elemwise:
+            self.var_cats = var_cats
+            fs += [elemwise_logp(model, var) for var in vars]
+            if proposal == 'uniform':
+                self.astep = self.astep_unif_elemwise
+            else:
+                self.astep = self.astep_prop_elemwise
+
+        super(CategoricalGibbsMetropolis, self).__init__(vars, fs)
 
     def astep_unif(self, q0, logp):
         dimcats = self.dimcats
@@ -475,6 +523,31 @@ class CategoricalGibbsMetropolis(ArrayStep):
         q[dim] = proposed_cat
         return log_probs[proposed_cat]
 
+    def astep_unif_elemwise(self, q0, logp, *elemwise_logps):
+        q = np.copy(q0)
+        for (_, slc, _, _), k, logp_elems in zip(
+                self.ordering.vmap, self.var_cats, elemwise_logps):
+            curr = q[slc].copy()
+            logp_curr = logp_elems(q).ravel()
+            # Uniform proposal among the other categories
+            q[slc] = (curr + nr.randint(1, k, size=len(curr))) % k
+            delta = logp_elems(q).ravel() - logp_curr
+            accept = np.isfinite(delta) & (np.log(nr.uniform(size=len(curr))) < delta)
+            q[slc] = np.where(accept, q[slc], curr)
+        return q
+
+    def astep_prop_elemwise(self, q0, logp, *elemwise_logps):
+        q = np.copy(q0)
+        for (_, slc, _, _), k, logp_elems in zip(
+                self.ordering.vmap, self.var_cats, elemwise_logps):
+            given_cat = q[slc].astype(int)
+            log_probs = np.empty((k, len(given_cat)))
+            for cat in range(k):
+                q[slc] = cat
+                log_probs[cat] = logp_elems(q).ravel()
+            q[slc] = metropolis_proportional_elemwise(log_probs, given_cat)
+        return q
+
     @staticmethod
     def competence(var):
         '''
@@ -608,6 +681,169 @@ class DEMetropolis(PopulationArrayStepShared):
         return Competence.COMPATIBLE
 
 
+class MultipleTryMetropolis(ArrayStepShared):
+    """
+    Multiple-try Metropolis sampling step.
+
+    Each iteration proposes `n_proposals` points around the current point
+    and selects one of them with probability proportional to its
+    posterior density. The selected point is accepted or rejected by
+    comparing the proposals with `n_proposals - 1` reference points
+    drawn around it and the current point [Liu2000]_. The proposals of an
+    iteration can be evaluated in parallel threads, which pays off if the
+    logp is expensive and releases the GIL, for example for a black-box
+    `DensityDist`.
+
+    Parameters
+    ----------
+    vars : list
+        List of variables for sampler
+    S : standard deviation or covariance matrix
+        Some measure of variance to parameterize proposal distribution
+    proposal_dist : function
+        Function that returns zero-mean deviates when parameterized with
+        S (and n). Must be symmetric. Defaults to normal.
+    scaling : scalar or array
+        Initial scale factor for proposal. Defaults to 1.
+    n_proposals : int
+        Number of proposals per iteration. Defaults to 4. With a single
+        proposal, this is a Metropolis step.
+    tune : bool
+        Flag for tuning. Defaults to True.
+    tune_interval : int
+        The frequency of tuning. Defaults to 100 iterations.
+    cores : int
+        Number of threads that evaluate the logp of the proposals. By
+        default, the logp of the proposals is computed by one call of a
+        compiled function, which loops over them in a theano scan.
+        Threads only help if the logp releases the GIL.
+    model : PyMC Model
+        Optional model for sampling step. Defaults to None (taken from context).
+    mode :  string or `Mode` instance.
+        compilation mode passed to Theano functions
+
+    References
+    ----------
+    .. [Liu2000] Jun S. Liu, Faming Liang and Wing Hung Wong (2000).
+        The Multiple-Try Method and Local Optimization in Metropolis
+        Sampling. Journal of the American Statistical Association
+        `link <https://doi.org/10.1080/01621459.2000.10473908>`__
+    """
+    name = 'multiple_try_metropolis'
+
+    default_blocked = True
+    generates_stats = True
+    stats_dtypes = [{
+        'accept': np.float64,
+        'tune': np.bool,
+    }]
+
+    def __init__(self, vars=None, S=None, proposal_dist=None, scaling=1.,
+                 n_proposals=4, tune=True, tune_interval=100, cores=1,
+                 model=None, mode=None, **kwargs):
+
+        model = pm.modelcontext(model)
+
+        if vars is None:
+            vars = model.vars
+        vars = pm.inputvars(vars)
+
+        if S is None:
+            S = np.ones(sum(v.dsize for v in vars))
+
+        if proposal_dist is not None:
+            self.proposal_dist = proposal_dist(S)
+        elif S.ndim == 1:
+            self.proposal_dist = NormalProposal(S)
+        elif S.ndim == 2:
+            self.proposal_dist = MultivariateNormalProposal(S)
+        else:
+            raise ValueError("Invalid rank for variance: %s" % S.ndim)
+
+        if n_proposals < 1:
+            raise ValueError('n_proposals must be at least 1.')
+        self.n_proposals = int(n_proposals)
+
+        self.scaling = np.atleast_1d(scaling).astype('d')
+        self.tune = tune
+        self.tune_interval = tune_interval
+        self.steps_until_tune = tune_interval
+        self.accepted = 0
+
+        # Determine type of variables
+        self.discrete = np.concatenate(
+            [[v.dtype in pm.discrete_types] * (v.dsize or 1) for v in vars])
+        self.any_discrete = self.discrete.any()
+        self.all_discrete = self.discrete.all()
+
+        self.mode = mode
+
+        shared = pm.make_shared_replacements(vars, model)
+        self.rows_logp = rows_logp_function(model.logpt, vars, shared, cores, mode)
+        super(MultipleTryMetropolis, self).__init__(vars, shared)
+
+    def propose(self, q0, n):
+        """Draw `n` proposals around `q0`, as rows of an array."""
+        if not n:
+            # With a single proposal, the only reference point is q0
+            return np.empty((0, q0.size), dtype=q0.dtype)
+        delta = np.array([self.proposal_dist() for _ in range(n)])
+        delta = delta.reshape(n, -1) * self.scaling
+
+        if self.any_discrete:
+            if self.all_discrete:
+                delta = np.round(delta, 0).astype('int64')
+                return (q0.astype('int64') + delta).astype('int64')
+            delta[:, self.discrete] = np.round(delta[:, self.discrete], 0)
+            return q0 + delta
+        return floatX(q0 + delta)
+
+    def astep(self, q0):
+        if not self.steps_until_tune and self.tune:
+            # Tune scaling parameter
+            self.scaling = tune(
+                self.scaling, self.accepted / float(self.tune_interval))
+            # Reset counter
+            self.steps_until_tune = self.tune_interval
+            self.accepted = 0
+
+        if self.all_discrete:
+            q0 = q0.astype('int64')
+
+        proposals = self.propose(q0, self.n_proposals)
+        logp_proposals = self.rows_logp(proposals)
+        if np.isfinite(logp_proposals).any():
+            weights = np.exp(logp_proposals - np.max(logp_proposals))
+            selected = nr.choice(self.n_proposals, p=weights / weights.sum())
+            q = proposals[selected]
+
+            # Reference points around the selected proposal
+            references = np.concatenate(
+                [self.propose(q, self.n_proposals - 1), q0[None]])
+            logp_references = self.rows_logp(references)
+            accept = (np.logaddexp.reduce(logp_proposals)
+                      - np.logaddexp.reduce(logp_references))
+        else:
+            q = q0
+            accept = -np.inf
+
+        q_new, accepted = metrop_select(accept, q, q0)
+        self.accepted += accepted
+
+        self.steps_until_tune -= 1
+
+        stats = {
+            'tune': self.tune,
+            'accept': np.exp(accept),
+        }
+
+        return q_new, [stats]
+
+    @staticmethod
+    def competence(var, has_grad):
+        return Competence.COMPATIBLE
+
+
 def sample_except(limit, excluded):
     candidate = nr.choice(limit - 1)
     if candidate >= excluded:
@@ -620,6 +856,63 @@ def softmax(x):
     return e_x / np.sum(e_x, axis = 0)
 
 
+def metropolis_proportional_elemwise(log_probs, given_cat):
+    """Metropolized Gibbs update of independent categorical elements.
+
+    Parameters
+    ----------
+    log_probs : array of shape (k, n)
+        Conditional logp of each of the `k` categories of `n` elements.
+    given_cat : array of int
+        Current categories of the elements.
+
+    Returns
+    -------
+    The new categories of the elements.
+    """
+    n = len(given_cat)
+    elems = np.arange(n)
+    probs = np.exp(log_probs - np.max(log_probs, axis=0))
+    probs /= np.sum(probs, axis=0)
+    prob_curr = probs[given_cat, elems]
+    probs[given_cat, elems] = 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        probs /= (1.0 - prob_curr)
+        # Propose from the other categories by inverting their cdf
+        cdf = np.cumsum(probs, axis=0)
+        u = nr.uniform(size=n)
+        proposed_cat = np.minimum(np.sum(cdf < u, axis=0), len(probs) - 1)
+        accept_ratio = (1.0 - prob_curr) / (1.0 - probs[proposed_cat, elems])
+        accept = np.isfinite(accept_ratio) & (nr.uniform(size=n) < accept_ratio)
+    return np.where(accept, proposed_cat, given_cat)
+
+
+def elemwise_logp(model, var):
+    """Compile a function of a point that returns the logp of all terms
+    of the model that depend on `var`, element by element of `var`.
+
+    This is the conditional logp of the elements of `var` up to a
+    constant, if they are independent given the other variables.
+    """
+    terms = [(rv.name, rv.logpt, rv.logp_elemwiset * rv.scaling)
+             for rv in model.basic_RVs]
+    terms += [(pot.name, pot, pot)
+              for pot in model.potentials]
+    elemwise_terms = []
+    for name, logpt, term in terms:
+        if var in theano.gof.graph.inputs([logpt]):
+            test_value = getattr(term.tag, 'test_value', None)
+            if test_value is not None and np.shape(test_value) != tuple(var.dshape):
+                raise ValueError(
+                    'The logp of %s has shape %s, but the variable %s has '
+                    'shape %s. The elements of %s can only be updated '
+                    'together if all terms depending on it have its shape.'
+                    % (name, np.shape(test_value), var.name, var.dshape,
+                       var.name))
+            elemwise_terms.append(term)
+    return model.fastfn(tt.add(*elemwise_terms))
+
+
 def delta_logp(logp, vars, shared):
     [logp0], inarray0 = pm.join_nonshared_inputs([logp], vars, shared)
 
@@ -631,3 +924,62 @@ def delta_logp(logp, vars, shared):
     f = theano.function([inarray1, inarray0], logp1 - logp0)
     f.trust_input = True
     return f
+
+
+def rows_logp_function(logp, vars, shared, cores=1, mode=None):
+    """Compile a function that computes `logp` for each row of a
+    `(n, size)` array of values of `vars`.
+
+    The function loops over the rows in a theano scan, so the graph of
+    `logp` is still evaluated once per row, but in a single call. With
+    `cores > 1`, the rows are split between threads that each call their
+    own compiled function.
+    """
+    [logp0], inarray0 = pm.join_nonshared_inputs([logp], vars, shared)
+
+    if cores > 1:
+        fs = [theano.function([inarray0], logp0, mode=mode)
+              for _ in range(cores)]
+        return ThreadedRowsLogp(fs)
+
+    rows = tt.matrix('rows', dtype=inarray0.dtype)
+    rows.tag.test_value = inarray0.tag.test_value[None]
+
+    def row_logp(row):
+        return theano.clone(logp0, replace={inarray0: row})
+
+    logps, _ = theano.map(row_logp, sequences=[rows])
+    return theano.function([rows], logps, mode=mode)
+
+
+class ThreadedRowsLogp(object):
+    """Compute the logp of the rows of an array in several threads, each
+    with its own compiled function. The threads are started once and
+    reused by every call."""
+
+    def __init__(self, fs):
+        self.fs = fs
+        self._pool = ThreadPool(len(fs))
+
+    def __call__(self, rows):
+        chunks = np.array_split(rows, len(self.fs))
+        logps = self._pool.map(_rows_logp_star, zip(self.fs, chunks))
+        return np.concatenate(logps)
+
+    def __getstate__(self):
+        # Thread pools can not be pickled, a new pool is started instead
+        state = self.__dict__.copy()
+        del state['_pool']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pool = ThreadPool(len(self.fs))
+
+
+def _rows_logp_star(args):
+    return _rows_logp(*args)
+
+
+def _rows_logp(f, rows):
+    return np.array([f(row) for row in rows], dtype=float)
@@ -17,6 +17,7 @@ import pymc3 as pm
 from tqdm import tqdm
 
 import theano
+import theano.tensor as tt
 
 from ..model import modelcontext
 from ..vartypes import discrete_types
@@ -26,6 +27,9 @@ import numpy.random as nr
 from .metropolis import MultivariateNormalProposal
 from .arraystep import metrop_select
 from ..backends import smc_text as atext
+from ..backends.smc_memory import MemoryStage
+from ..backends.base import MultiTrace
+from ..backends.ndarray import NDArray
 
 __all__ = ['SMC', 'sample_smc']
 
@@ -166,6 +170,13 @@ class SMC(atext.ArrayStepSharedLLK):
         self.logp_forw = logp_forw(out_vars, vars, shared)
         self.check_bnd = logp_forw([model.varlogpt], vars, shared)
 
+        # Batched functions for `astep_population`, compiled when needed
+        self.out_vars = out_vars
+        self._varlogpt = model.varlogpt
+        self._shared_replacements = shared
+        self.logp_forw_batch = None
+        self.check_bnd_batch = None
+
         super(SMC, self).__init__(vars, out_vars, shared)
 
     def astep(self, q0):
@@ -247,6 +258,99 @@ class SMC(atext.ArrayStepSharedLLK):
 
         return q_new, l_new
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The batched functions are compiled again when needed
+        state['logp_forw_batch'] = None
+        state['check_bnd_batch'] = None
+        return state
+
+    def population_outputs(self, array_population):
+        """Evaluate the output variables for each row of `array_population`.
+
+        Returns
+        -------
+        :class:`numpy.ndarray` of shape (chains, size of the output variables), in the order of
+        `lordering`
+        """
+        self._compile_batched()
+        return self.logp_forw_batch(array_population)
+
+    def _compile_batched(self):
+        if self.logp_forw_batch is None:
+            self.logp_forw_batch = logp_forw_batch(self.out_vars, self.vars,
+                                                   self._shared_replacements)
+            self.check_bnd_batch = logp_forw_batch([self._varlogpt], self.vars,
+                                                   self._shared_replacements)
+
+    def astep_population(self, array_population, outputs):
+        """Perform one Metropolis step of all chains of the population.
+
+        The proposals of all chains are evaluated in one call of a scan over the chains.
+
+        Parameters
+        ----------
+        array_population : :class:`numpy.ndarray`
+            (chains x ndim) current points of the chains
+        outputs : :class:`numpy.ndarray`
+            Values of the output variables at the current points, as returned by
+            `population_outputs`
+
+        Returns
+        -------
+        array_population, outputs : the new points and their output variables
+        """
+        n_chains = len(array_population)
+        if not self.steps_until_tune and self.tune_interval:
+            # Tune scaling parameter
+            acc_rate = self.accepted / float(self.tune_interval * n_chains)
+            self.scaling = tune(acc_rate)
+            # compute n_steps
+            if self.accepted == 0:
+                acc_rate = 1 / float(self.tune_interval)
+            self.n_steps = 1 + (np.ceil(np.log(self.p_acc_rate) /
+                                        np.log(1 - acc_rate)).astype(int))
+            # Reset counter
+            self.steps_until_tune = self.tune_interval
+            self.accepted = 0
+
+        delta = np.atleast_2d(self.proposal_dist(n_chains)) * self.scaling
+
+        if self.any_discrete:
+            if self.all_discrete:
+                delta = np.round(delta, 0)
+                q = (array_population.astype(int) + delta).astype(int)
+            else:
+                delta[:, self.discrete] = np.round(delta[:, self.discrete], 0)
+                q = array_population + delta
+        else:
+            q = array_population + delta
+
+        # The forward model is only evaluated for proposals inside the bounds
+        self._compile_batched()
+        if self.check_bnd is not None:
+            inside = np.isfinite(self.check_bnd_batch(q)[:, 0])
+        else:
+            inside = np.ones(n_chains, dtype=bool)
+        proposed = np.flatnonzero(inside)
+
+        if len(proposed):
+            llk = self.lordering.vmap[self._llk_index].slc.start
+            outputs_prop = self.population_outputs(q[proposed])
+            mr = self.beta * (outputs_prop[:, llk] - outputs[proposed, llk])
+            with np.errstate(invalid='ignore'):
+                accept = np.isfinite(mr) & (np.log(nr.uniform(size=len(mr))) < mr)
+            accepted = proposed[accept]
+
+            array_population = array_population.copy()
+            outputs = outputs.copy()
+            array_population[accepted] = q[accepted]
+            outputs[accepted] = outputs_prop[accept]
+            self.accepted += len(accepted)
+
+        self.steps_until_tune -= 1
+        return array_population, outputs
+
     def calc_beta(self):
         """Calculate next tempering beta and importance weights based on current beta and sample
         likelihoods.
@@ -372,31 +476,16 @@ class SMC(atext.ArrayStepSharedLLK):
             Array of resampled trace indexes
         """
         parents = np.arange(chains)
-        N_childs = np.zeros(chains, dtype=int)
-
         cum_dist = np.cumsum(self.weights)
         u = (parents + np.random.rand()) / chains
-        j = 0
-        for i in parents:
-            while u[i] > cum_dist[j]:
-                j += 1
-
-            N_childs[j] += 1
-
-        indx = 0
-        outindx = np.zeros(chains, dtype=int)
-        for i in parents:
-            if N_childs[i] > 0:
-                for j in range(indx, (indx + N_childs[i])):
-                    outindx[j] = parents[i]
-
-            indx += N_childs[i]
-
-        return outindx
+        # Each point is the parent of the chains whose `u` falls in its share of the weights
+        outindx = np.searchsorted(cum_dist, u)
+        return np.minimum(outindx, len(cum_dist) - 1)
 
 
 def sample_smc(samples=1000, chains=100, step=None, start=None, homepath=None, stage=0, cores=1,
-               progressbar=False, model=None, random_seed=-1, rm_flag=True, **kwargs):
+               progressbar=False, model=None, random_seed=-1, rm_flag=True, vectorized=False,
+               checkpoint_interval=0, **kwargs):
     """Sequential Monte Carlo sampling
 
     Samples the parameter space using a `chains` number of parallel Metropolis chains.
@@ -439,6 +528,17 @@ def sample_smc(samples=1000, chains=100, step=None, start=None, homepath=None, s
         A list is accepted, more if `cores` is greater than one.
     rm_flag : bool
         If True existing stage result folders are being deleted prior to sampling.
+    vectorized : bool
+        If True, the population is kept as a (`chains` x ndim) array in memory, and all chains
+        are mutated together. The model is evaluated for all chains in one call of a function
+        that scans over the chains, see `logp_forw_batch`. `cores` is ignored, and
+        `rm_flag` removes the checkpoints of previous runs when starting at stage 0. The
+        result trace holds the end points of the final stage.
+    checkpoint_interval : int
+        Only used if `vectorized` is True. Write the population and the step to `homepath`
+        every `checkpoint_interval` completed stages, in a binary format and in a background
+        thread. Sampling can be continued from a checkpoint with `stage`. If 0, nothing is
+        written to `homepath`.
 
     References
     ----------
@@ -453,7 +553,7 @@ def sample_smc(samples=1000, chains=100, step=None, start=None, homepath=None, s
     if random_seed != -1:
         nr.seed(random_seed)
 
-    if homepath is None:
+    if homepath is None and not vectorized:
         raise TypeError('Argument `homepath` should be path to result_directory.')
 
     if cores > 1:
@@ -471,6 +571,12 @@ def sample_smc(samples=1000, chains=100, step=None, start=None, homepath=None, s
         raise TypeError('Model (deterministic) variables need to contain a variable {} as defined '
                         'in `step`.'.format(step.likelihood_name))
 
+    if vectorized:
+        store = MemoryStage(homepath, checkpoint_interval)
+        if stage == 0:
+            store.clean_directory(rm_flag)
+        return _sample_population_stages(samples, chains, step, progressbar, model, store, stage)
+
     stage_handler = atext.TextStage(homepath)
 
     if progressbar and cores > 1:
@@ -570,6 +676,84 @@ def sample_smc(samples=1000, chains=100, step=None, start=None, homepath=None, s
                                                  model=model)
 
 
+def _sample_population_stages(samples, chains, step, progressbar, model, store, stage=0):
+    """Run all stages of SMC with the population kept in `store`, see `sample_smc`."""
+    if stage != 0:
+        step, array_population, outputs = store.load(stage, model)
+    else:
+        step.stage = 0
+        population = _initial_population(samples, chains, model, step.vars)
+        array_population = np.array([step.bij.map(point) for point in population])
+    llk = step.lordering.vmap[step._llk_index].slc.start
+
+    with model:
+        if stage == 0:
+            pm._log.info('Sample initial stage: ...')
+            outputs = step.population_outputs(array_population)
+            store.update(step, array_population, outputs)
+
+        while True:
+            step.array_population = array_population
+            step.likelihoods = outputs[:, llk]
+            step.beta, step.old_beta, step.weights = step.calc_beta()
+            if step.beta > 1.:
+                pm._log.info('Beta > 1.: %f' % step.beta)
+                step.beta = 1.
+                break
+
+            step.covariance = step.calc_covariance()
+            step.proposal_dist = choose_proposal(step.proposal_name, scale=step.covariance)
+            step.resampling_indexes = step.resample(chains)
+            array_population = array_population[step.resampling_indexes]
+            outputs = outputs[step.resampling_indexes]
+            step.stage += 1
+
+            pm._log.info('Beta: %f Stage: %i' % (step.beta, step.stage))
+            array_population, outputs = _iter_population(
+                step.n_steps, step, array_population, outputs, progressbar)
+            store.update(step, array_population, outputs)
+
+        # Metropolis sampling final stage
+        pm._log.info('Sample final stage')
+        step.stage = -1
+        weights_un = np.exp((1 - step.old_beta) * (step.likelihoods - step.likelihoods.max()))
+        step.weights = weights_un / np.sum(weights_un)
+        step.covariance = step.calc_covariance()
+        step.proposal_dist = choose_proposal(step.proposal_name, scale=step.covariance)
+        step.resampling_indexes = step.resample(chains)
+
+        x_chains = step.resampling_indexes[nr.randint(0, chains, size=samples)]
+        array_population, outputs = _iter_population(
+            step.n_steps_final, step, array_population[x_chains], outputs[x_chains],
+            progressbar)
+        step.array_population = array_population
+        step.likelihoods = outputs[:, llk]
+        store.wait()
+
+        return _population_trace(step, outputs, model)
+
+
+def _iter_population(draws, step, array_population, outputs, progressbar=False):
+    """Mutate all chains of the population `draws` times."""
+    steps = range(int(draws))
+    if progressbar:
+        steps = tqdm(steps, total=int(draws))
+    for _ in steps:
+        array_population, outputs = step.astep_population(array_population, outputs)
+    return array_population, outputs
+
+
+def _population_trace(step, outputs, model):
+    """Trace with one draw per chain from the output variables of a population."""
+    samples = {}
+    for _, slc, shp, dtype, name in step.lordering.vmap:
+        values = outputs[:, slc].reshape((len(outputs),) + tuple(shp))
+        samples[name] = values.astype(dtype)
+    strace = NDArray(model=model, vars=step.out_vars)
+    strace.setup_from_arrays(0, samples)
+    return MultiTrace([strace])
+
+
 def _initial_population(samples, chains, model, variables):
     """
     Create an initial population from the prior
@@ -712,6 +896,30 @@ def tune(acc_rate):
     return (a + b * acc_rate) ** 2
 
 
+def logp_forw_batch(out_vars, vars, shared):
+    """Compile Theano function that evaluates the output variables for each row of a
+    (chains x ndim) array of input values.
+
+    Parameters are the same as for `logp_forw`. The values of the output variables of each row
+    are flattened and concatenated in the order of `out_vars`.
+
+    The rows are evaluated one after the other by a theano scan, inside a single call of the
+    compiled function. Theano can not compile the graph of an arbitrary model for a leading
+    chain dimension, so this saves the per-call overhead of Python, but not the cost of the
+    model evaluations.
+    """
+    out_list, inarray0 = join_nonshared_inputs(out_vars, vars, shared)
+    rows = tt.matrix('rows', dtype=inarray0.dtype)
+    rows.tag.test_value = np.atleast_2d(inarray0.tag.test_value)
+
+    def row_outputs(row):
+        outs = theano.clone(out_list, replace={inarray0: row})
+        return tt.concatenate([tt.cast(out, 'float64').reshape((-1,)) for out in outs])
+
+    outputs, _ = theano.map(row_outputs, sequences=[rows])
+    return theano.function([rows], outputs, allow_input_downcast=True)
+
+
 def logp_forw(out_vars, vars, shared):
     """Compile Theano function of the model and the input and output variables.
 
@@ -0,0 +1,125 @@
+import numpy as np
+import numpy.testing as npt
+import pymc3 as pm
+from pymc3.tests import backend_fixtures as bf
+from pymc3.backends import ndarray, columnar
+
+STATS1 = [{
+    'a': np.float64,
+    'b': np.bool
+}]
+
+STATS2 = [{
+    'a': np.float64
+}, {
+    'a': np.float64,
+    'b': np.int64,
+}]
+
+
+class TestColumnarSampling(object):
+    name = 'columnar-db'
+
+    def test_supports_sampler_stats(self):
+        with pm.Model():
+            pm.Normal("mu", mu=0, sd=1, shape=2)
+            db = columnar.Columnar(self.name, chunk_size=7)
+            trace = pm.sample(20, tune=10, init=None, trace=db, cores=2)
+            loaded = columnar.load(self.name, chains=[1])
+        assert loaded.chains == [1]
+        npt.assert_equal(loaded.get_values('mu', burn=10),
+                         trace.get_values('mu', chains=[1]))
+        npt.assert_equal(loaded.get_sampler_stats('depth', burn=10),
+                         trace.get_sampler_stats('depth', chains=[1]))
+        values = loaded.get_values('mu')
+        assert (loaded._straces[1].value_range('mu') ==
+                (values.min(), values.max()))
+
+    def test_load_before_close(self):
+        with pm.Model() as model:
+            pm.Normal("mu", mu=0, sd=1, shape=2)
+        db = columnar.Columnar(self.name, model=model, chunk_size=3)
+        db.setup(10, 0)
+        points = [{'mu': np.full(2, i, dtype=float)} for i in range(7)]
+        for point in points:
+            db.record(point)
+        # Two complete row groups are on disk, the last draw is buffered
+        with model:
+            loaded = columnar.load(self.name)
+        npt.assert_equal(loaded.get_values('mu'),
+                         [point['mu'] for point in points[:6]])
+        db.close()
+        with model:
+            loaded = columnar.load(self.name)
+        npt.assert_equal(loaded.get_values('mu'),
+                         [point['mu'] for point in points])
+
+    def teardown_method(self):
+        bf.remove_file_or_directory(self.name)
+
+
+class TestColumnar0dSampling(bf.SamplingTestCase):
+    backend = columnar.Columnar
+    name = 'columnar-db'
+    shape = ()
+
+
+class TestColumnar1dSamplingStats(bf.SamplingTestCase):
+    backend = columnar.Columnar
+    name = 'columnar-db'
+    shape = 2
+    sampler_vars = STATS1
+
+
+class TestColumnar2dSampling(bf.SamplingTestCase):
+    backend = columnar.Columnar
+    name = 'columnar-db'
+    shape = (2, 3)
+
+
+class TestColumnar0dSelectionStats(bf.SelectionTestCase):
+    backend = columnar.Columnar
+    name = 'columnar-db'
+    shape = ()
+    sampler_vars = STATS2
+
+
+class TestColumnar2dSelection(bf.SelectionTestCase):
+    backend = columnar.Columnar
+    name = 'columnar-db'
+    shape = (2, 3)
+
+
+class TestColumnarDumpLoad(bf.DumpLoadTestCase):
+    backend = columnar.Columnar
+    load_func = staticmethod(columnar.load)
+    name = 'columnar-db'
+    shape = (2, 3)
+
+
+class TestColumnarDumpFunction(bf.BackendEqualityTestCase):
+    backend0 = backend1 = ndarray.NDArray
+    name0 = None
+    name1 = 'columnar-db'
+    shape = (2, 3)
+    sampler_vars = STATS1
+
+    @classmethod
+    def setup_class(cls):
+        super(TestColumnarDumpFunction, cls).setup_class()
+        columnar.dump(cls.name1, cls.mtrace1, chunk_size=2)
+        with cls.model:
+            cls.mtrace1 = columnar.load(cls.name1)
+
+    def test_sampler_stats(self):
+        for key in ['a', 'b']:
+            npt.assert_equal(self.mtrace0.get_sampler_stats(key),
+                             self.mtrace1.get_sampler_stats(key))
+
+
+class TestNDArrayColumnarEquality(bf.BackendEqualityTestCase):
+    backend0 = ndarray.NDArray
+    name0 = None
+    backend1 = columnar.Columnar
+    name1 = 'columnar-db'
+    shape = (2, 3)
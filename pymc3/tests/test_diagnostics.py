@@ -7,6 +7,7 @@ from ..step_methods import Slice, Metropolis, NUTS
 from ..distributions import Normal
 from ..tuning import find_MAP
 from ..sampling import sample
+from .. import diagnostics
 from ..diagnostics import effective_n, geweke, gelman_rubin
 from .test_examples import build_disaster_model
 import pytest
@@ -213,3 +214,17 @@ class TestDiagnostics(SeededTest):
         """Check effective sample size shape is correct w/ scalar as shape=1"""
         self.test_effective_n_right_shape_python_float(shape=1,
                                                        test_shape=(1,))
+
+    def test_effective_n_elementwise(self, monkeypatch):
+        """Check that the vectorized effective sample size does not depend
+        on the other elements or on the size of the chunks"""
+        x = np.random.randn(3, 50, 4, 5).cumsum(axis=1)
+        n_effective = effective_n(x)
+        assert n_effective.shape == (4, 5)
+        for idx in np.ndindex(4, 5):
+            single = effective_n(x[(slice(None), slice(None)) + idx])
+            assert isinstance(single, float)
+            assert_allclose(n_effective[idx], single)
+        monkeypatch.setattr(diagnostics, '_FFT_BUFFER_SIZE', 1000)
+        assert_allclose(effective_n(x), n_effective)
+        assert_allclose(gelman_rubin(x)[0, 0], gelman_rubin(x[:, :, 0, 0]))
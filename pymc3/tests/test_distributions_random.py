@@ -95,6 +95,20 @@ class TestDrawValues(SeededTest):
         exp_x, x = pm.distributions.draw_values([exp_x, x])
         npt.assert_almost_equal(np.exp(x), exp_x)
 
+    def test_draw_order_chain(self):
+        with pm.Model():
+            x = pm.Normal('x', mu=0., sd=1.)
+            exp_x = pm.Deterministic('exp_x', pm.math.exp(x))
+            exp_x2 = pm.Deterministic('exp_x2', exp_x ** 2)
+
+        plans = len(pm.distributions.distribution._draw_values_plan.cache)
+        for _ in range(3):
+            exp_x2_, x_, exp_x_ = pm.distributions.draw_values([exp_x2, x, exp_x])
+            npt.assert_almost_equal(np.exp(x_), exp_x_)
+            npt.assert_almost_equal(exp_x_ ** 2, exp_x2_)
+        # the plan for the params is computed once and reused
+        assert len(pm.distributions.distribution._draw_values_plan.cache) == plans + 1
+
     def test_draw_point_replacement(self):
         with pm.Model():
             mu = pm.Normal('mu', mu=0., tau=1e-3)
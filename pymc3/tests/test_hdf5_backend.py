@@ -1,5 +1,7 @@
 import numpy as np
+import numpy.testing as npt
 from pymc3.tests import backend_fixtures as bf
+from pymc3.tests import models
 from pymc3.backends import ndarray, hdf5
 import os
 import tempfile
@@ -106,3 +108,42 @@ class TestNDArrayHDF5Equality(bf.BackendEqualityTestCase):
     backend1 = hdf5.HDF5
     name1 = DBNAME
     shape = (2, 3)
+
+
+class TestHDF5Buffer(object):
+    def setup_method(self):
+        self.test_point, self.model, _ = models.beta_bernoulli((2, 3))
+        with self.model:
+            self.strace = hdf5.HDF5(DBNAME, buffer_size=3,
+                                    compression='gzip')
+        self.strace.setup(10, 0, STATS1)
+
+    def teardown_method(self):
+        bf.remove_file_or_directory(DBNAME)
+
+    def record(self, idx):
+        point = {varname: np.tile(idx, value.shape)
+                 for varname, value in self.test_point.items()}
+        self.strace.record(point, [{'a': float(idx), 'b': idx % 2 == 0}])
+
+    def test_flush(self):
+        for idx in range(7):
+            self.record(idx)
+            assert len(self.strace) == idx + 1
+        # Reading while sampling writes the buffered draws
+        npt.assert_equal(self.strace.get_sampler_stats('a')[:7], np.arange(7.))
+        self.record(7)
+        self.strace.close()
+        assert not self.strace.hdf5_file.id
+        for varname in self.test_point:
+            values = self.strace.get_values(varname, burn=2, thin=2)
+            assert values.shape == (3,) + self.strace.var_shapes[varname]
+            npt.assert_equal(values.reshape(3, -1)[:, 0], [2, 4, 6])
+            npt.assert_equal(self.strace.point(-1)[varname],
+                             np.tile(7, self.strace.var_shapes[varname]))
+        npt.assert_equal(self.strace.get_sampler_stats('b'),
+                         np.arange(8) % 2 == 0)
+        with self.strace.activate_file:
+            for dataset in self.strace.samples.values():
+                assert dataset.chunks[0] == 3
+                assert dataset.compression == 'gzip'
@@ -29,6 +29,28 @@ def test_leapfrog_reversible():
             npt.assert_allclose(state.p, start.p, rtol=1e-5)
 
 
+def test_leapfrog_out():
+    np.random.seed(42)
+    start, model, _ = models.non_normal(3)
+    size = model.ndim
+    step = BaseHMC(vars=model.vars, model=model)
+    step.integrator._logp_dlogp_func.set_extra_values({})
+    q = floatX(np.random.randn(size))
+    p = floatX(step.potential.random())
+    state = step.integrator.compute_state(q, p)
+    pool = step.integrator.state_pool
+    pool.reset(1)
+    out = pool.get()
+    assert pool.get() is None
+    expected = step.integrator.step(0.1, state)
+    new = step.integrator.step(0.1, state, out=out)
+    assert new.q is out.q
+    for array, expected_array in zip(new, expected):
+        npt.assert_allclose(array, expected_array, rtol=1e-6)
+    pool.reset(1)
+    assert pool.get() is out
+
+
 def test_nuts_tuning():
     model = pymc3.Model()
     with model:
@@ -38,3 +60,54 @@ def test_nuts_tuning():
 
     assert not step.tune
     assert np.all(trace['step_size'][5:] == trace['step_size'][5])
+
+
+def test_batch_nuts_single_chain():
+    with pymc3.Model() as model:
+        pymc3.Normal('x', mu=np.arange(3.), sd=1, shape=3)
+        pymc3.HalfNormal('sd', sd=1)
+        nuts = pymc3.NUTS()
+        batch = pymc3.BatchNUTS()
+    start = model.test_point
+    # The trees of BatchNUTS consume random numbers like those of NUTS
+    np.random.seed(3)
+    point = start
+    expected = []
+    for _ in range(20):
+        point, stats = nuts.step(point)
+        expected.append((point, stats))
+    np.random.seed(3)
+    draws = [updates[0] for _, updates in batch.iter_chains([start], 20)]
+    for (point, stats), (expected_point, expected_stats) in zip(draws, expected):
+        for name in expected_point:
+            npt.assert_allclose(point[name], expected_point[name])
+        assert stats[0]['depth'] == expected_stats[0]['depth']
+
+
+def test_batch_nuts():
+    def sample(seed):
+        with pymc3.Model():
+            pymc3.Normal('x', mu=np.arange(3.), sd=1, shape=3)
+            pymc3.HalfNormal('sd', sd=1)
+            step = pymc3.BatchNUTS()
+            return pymc3.sample(500, step=step, tune=300, chains=3,
+                                progressbar=False, random_seed=seed)
+
+    trace = sample(1)
+    assert trace.nchains == 3
+    assert len(trace) == 500
+    npt.assert_allclose(trace['x'].mean(axis=0), np.arange(3.), atol=0.3)
+    step_sizes = trace.get_sampler_stats('step_size', combine=False)
+    assert len(set(sizes[-1] for sizes in step_sizes)) == 3
+    npt.assert_array_equal(trace['x'], sample(1)['x'])
+
+
+def test_batch_nuts_trace():
+    with pymc3.Model():
+        x = pymc3.Normal('x', mu=np.arange(3.), sd=1, shape=3)
+        pymc3.HalfNormal('sd', sd=1)
+        step = pymc3.BatchNUTS()
+        trace = pymc3.sample(20, step=step, tune=10, chains=2, trace=[x],
+                             progressbar=False)
+    assert trace.varnames == ['x']
+    assert trace.nchains == 2
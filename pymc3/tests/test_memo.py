@@ -1,4 +1,4 @@
-from pymc3.memoize import memoize
+from pymc3.memoize import memoize, cache_info, set_cache_maxsize
 
 
 def getmemo():
@@ -14,3 +14,35 @@ def test_memo():
     assert f('x', ['y', 'z']) == "x['y', 'z']"
     assert f('x', ['a', 'z']) == "x['a', 'z']"
     assert f('x', ['y', 'z']) == "x['y', 'z']"
+
+
+def test_memo_lru():
+    @memoize(maxsize=2)
+    def f(a):
+        return a * 2
+
+    f(1)
+    f(2)
+    f(1)
+    f(3)  # evicts 2, the least recently used
+    assert len(f.cache) == 2
+    f(2)
+    info = cache_info(f)
+    assert info.hits == 1
+    assert info.misses == 4
+    assert info.evictions == 2
+    assert info.maxsize == 2
+    assert info.currsize == 2
+
+
+def test_set_cache_maxsize():
+    f = getmemo()
+    try:
+        set_cache_maxsize(1)
+        f('x', 'y')
+        f('x', 'z')
+        assert len(f.cache) == 1
+        assert cache_info(f).evictions == 1
+        assert cache_info()[f.cache.name] == cache_info(f)
+    finally:
+        set_cache_maxsize(None)
@@ -1,3 +1,7 @@
+import os
+import shutil
+import tempfile
+
 import pytest
 from theano import theano, tensor as tt
 import numpy as np
@@ -260,6 +264,28 @@ class TestValueGradFunction(unittest.TestCase):
         assert len(point_) == 3
         assert point_['extra1'] == 5
 
+    def test_cache_dir(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            f_grad = ValueGradFunction(
+                self.cost, [self.val1, self.val2], [self.extra1],
+                mode='FAST_COMPILE', cache_dir=cache_dir)
+            assert len(os.listdir(cache_dir)) == 1
+            f_cached = ValueGradFunction(
+                self.cost, [self.val1, self.val2], [self.extra1],
+                mode='FAST_COMPILE', cache_dir=cache_dir)
+            assert len(os.listdir(cache_dir)) == 1
+
+            array = np.ones(f_grad.size, dtype=f_grad.dtype)
+            for extra in [5, 2]:
+                val, grad = f_grad(array, extra_vars={'extra1': extra})
+                val_, grad_ = f_cached(array, extra_vars={'extra1': extra})
+                assert val == val_
+                npt.assert_allclose(grad, grad_)
+                assert f_cached.get_extra_values()['extra1'] == extra
+        finally:
+            shutil.rmtree(cache_dir)
+
     def test_edge_case(self):
         # Edge case discovered in #2948
         ndim = 3
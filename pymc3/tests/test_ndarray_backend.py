@@ -96,6 +96,19 @@ class TestNDArray2dSelection(bf.SelectionTestCase):
     shape = (2, 3)
 
 
+class TestMemmapNDArray0dSampling(bf.SamplingTestCase):
+    backend = ndarray.MemmapNDArray
+    name = 'memmap-db'
+    shape = ()
+
+
+class TestMemmapNDArray1dSelectionStats(bf.SelectionTestCase):
+    backend = ndarray.MemmapNDArray
+    name = 'memmap-db'
+    shape = 2
+    sampler_vars = STATS2
+
+
 class TestMultiTrace(bf.ModelBackendSetupTestCase):
     name = None
     backend = ndarray.NDArray
@@ -229,3 +242,107 @@ class TestSaveLoad(object):
 
         for key, value in ppc.items():
             assert (value == ppc2[key]).all()
+
+    def test_save_and_load_mmap(self, tmpdir_factory):
+        directory = str(tmpdir_factory.mktemp('data'))
+        pm.save_trace(self.trace, directory, overwrite=True, compress=False)
+        trace2 = pm.load_trace(directory, model=TestSaveLoad.model(),
+                               mmap_mode='r')
+        assert isinstance(trace2._straces[0].samples['x'], np.memmap)
+        for var in ('x', 'z'):
+            assert (self.trace[var] == trace2[var]).all()
+        npt.assert_array_equal(self.trace.get_sampler_stats('depth'),
+                               trace2.get_sampler_stats('depth'))
+
+        pm.save_trace(self.trace, directory, overwrite=True)
+        with pytest.raises(ValueError):
+            pm.load_trace(directory, model=TestSaveLoad.model(),
+                          mmap_mode='r')
+
+    def test_sample_memmap(self, tmpdir_factory):
+        directory = str(tmpdir_factory.mktemp('data'))
+        with TestSaveLoad.model():
+            db = ndarray.MemmapNDArray(directory)
+            trace = pm.sample(100, tune=50, chains=1, cores=1, trace=db,
+                              discard_tuned_samples=False)
+            assert trace._straces[0] is db
+            # Continue sampling of the chain
+            trace = pm.sample(20, tune=0, chains=1, cores=1, trace=trace)
+            trace2 = pm.load_trace(directory, mmap_mode='r')
+        assert len(trace) == 170
+        assert isinstance(trace._straces[0].samples['x'], np.memmap)
+        for var in ('x', 'z'):
+            assert (trace[var] == trace2[var]).all()
+            sliced = trace[10:20]._straces[0].samples[var]
+            assert isinstance(sliced, np.memmap)
+
+
+class TestOnlineStats(object):
+    def test_sample(self):
+        with pm.Model():
+            pm.Normal('x', 0, 1, shape=2)
+            pm.HalfNormal('y', 1)
+            db = ndarray.NDArray()
+            db.track_online(skip=100)
+            trace = pm.sample(300, tune=100, trace=db, chains=1, cores=1,
+                              compute_convergence_checks=False,
+                              random_seed=1, progressbar=False)
+        strace = trace._straces[0]
+        online = strace.online
+        assert online is db.online
+        assert online.count == 300
+        for var in ['x', 'y', 'y_log__']:
+            npt.assert_allclose(online.mean(var), trace[var].mean(axis=0))
+            npt.assert_allclose(online.sd(var), trace[var].std(axis=0))
+        df = pm.backends.online.summary(trace, varnames=['x', 'y'])
+        assert list(df.index) == ['x__0', 'x__1', 'y']
+        assert list(df.columns) == ['mean', 'sd', 'mc_error', 'q2.5',
+                                    'q50', 'q97.5', 'n_eff']
+        npt.assert_allclose(df['mean'], pm.summary(trace)['mean'])
+        # Other slices contain draws that are not in the statistics
+        assert trace[50:]._straces[0].online is None
+
+    def test_batch_means(self):
+        stats = pm.backends.online.OnlineStats(
+            ['x'], {'x': (3,)}, max_batches=4, sketch_size=5, seed=1)
+        draws = np.random.randn(21, 3)
+        for draw in draws:
+            stats.update([draw])
+        assert stats.batch_size == 8
+        assert stats.n_batches == 2
+        means = draws[:16].reshape(2, 8, 3).mean(axis=1)
+        npt.assert_allclose(stats.mc_error('x'),
+                            np.std(means, axis=0, ddof=1) / np.sqrt(2))
+        assert stats.sketch('x').shape == (5, 3)
+        assert set(map(tuple, stats.sketch('x'))) <= set(map(tuple, draws))
+
+
+class TestNDArrayGrowth(object):
+    def test_continue_sampling(self):
+        with pm.Model():
+            pm.Normal('x', 0, 1, shape=2)
+            db = ndarray.NDArray()
+        draws = np.random.randn(40, 2)
+
+        def run(n_draws, n_recorded):
+            start = len(db)
+            db.setup(n_draws, 0, sampler_vars=[{'a': np.float64}])
+            for i in range(start, start + n_recorded):
+                db.record({'x': draws[i]}, [{'a': float(i)}])
+            db.close()
+
+        run(10, 10)
+        run(5, 5)
+        buffer = db._buffers['x']
+        assert len(buffer) == 20
+        # Interrupted runs leave unused rows in the buffer
+        run(4, 2)
+        run(3, 3)
+        assert db._buffers['x'] is buffer
+        assert len(db) == 20
+        run(10, 10)
+        assert db._buffers['x'] is not buffer
+        assert len(db._buffers['x']) == 40
+
+        npt.assert_array_equal(db.get_values('x'), draws[:30])
+        npt.assert_array_equal(db.get_sampler_stats('a'), np.arange(30.))
@@ -1,6 +1,9 @@
 import time
 import sys
 import pytest
+import numpy as np
+import numpy.testing as npt
+import theano
 
 import pymc3.parallel_sampling as ps
 import pymc3 as pm
@@ -70,3 +73,108 @@ def test_iterator():
     with sampler:
         for draw in sampler:
             pass
+
+
+@pytest.mark.skipif(sys.version_info < (3,3),
+                    reason="requires python3.3")
+def test_iterator_transfer_batch():
+    with pm.Model() as model:
+        a = pm.Normal('a', shape=1)
+        pm.HalfNormal('b')
+        step1 = pm.NUTS([a])
+        step2 = pm.Metropolis([model.b_log__])
+
+    step = pm.CompoundStep([step1, step2])
+
+    start = {'a': 1., 'b_log__': 2.}
+    sampler = ps.ParallelSampler(10, 10, 3, 2, [2, 3, 4], [start] * 3,
+                                 step, 0, False, transfer_batch=4)
+    draw_idxs = {0: [], 1: [], 2: []}
+    with sampler:
+        for draw in sampler:
+            draw_idxs[draw.chain].append(draw.draw_idx)
+            assert draw.point['a'].shape == (1,)
+            assert draw.is_last == (draw.draw_idx == 19)
+            assert draw.tuning == (draw.draw_idx < 10)
+    for idxs in draw_idxs.values():
+        assert idxs == list(range(20))
+
+
+@pytest.mark.skipif(sys.version_info < (3,3),
+                    reason="requires python3.3")
+def test_iterator_shared_trace():
+    with pm.Model() as model:
+        a = pm.Normal('a', shape=1)
+        pm.HalfNormal('b')
+        step1 = pm.NUTS([a])
+        step2 = pm.Metropolis([model.b_log__])
+
+    step = pm.CompoundStep([step1, step2])
+
+    start = {'a': 1., 'b_log__': 2.}
+    sampler = ps.ParallelSampler(10, 10, 3, 2, [2, 3, 4], [start] * 3,
+                                 step, 0, False, shared_trace=True)
+    with sampler:
+        draws = list(sampler)
+    assert len(draws) == 3
+    for draw in draws:
+        assert draw.is_last
+        assert draw.point['a'].shape == (20, 1)
+        assert draw.point['b_log__'].shape == (20,)
+        assert len(draw.stats) == 2
+        assert draw.stats[0]['depth'].shape == (20,)
+        assert not draw.stats[1]['tune'][-1]
+
+
+@pytest.mark.skipif(sys.version_info < (3,3),
+                    reason="requires python3.3")
+def test_sample_shared_trace():
+    with pm.Model():
+        a = pm.Normal('a', shape=2)
+        pm.Deterministic('a_sum', a.sum())
+        trace = pm.sample(draws=20, tune=10, chains=2, cores=2,
+                          shared_trace=True, random_seed=[1, 2])
+    assert trace.nchains == 2
+    assert trace['a'].shape == (40, 2)
+    assert len(trace.get_sampler_stats('depth', chains=0)) == 20
+    npt.assert_allclose(trace['a_sum'], trace['a'].sum(axis=1))
+
+
+@pytest.mark.skipif(sys.version_info < (3,3),
+                    reason="requires python3.3")
+def test_sampler_pool():
+    data = theano.shared(np.zeros(10), name='data')
+    with pm.Model():
+        mu = pm.Normal('mu', sd=10)
+        pm.Normal('x', mu=mu, sd=0.1, observed=data)
+        step = pm.Metropolis()
+        with pm.SamplerPool(step, cores=2) as pool:
+            pids = [worker._process.pid for worker in pool._workers]
+            means = []
+            for value in [-5., 5.]:
+                data.set_value(np.full(10, value))
+                trace = pm.sample(draws=200, tune=200, step=step, chains=3,
+                                  cores=2, random_seed=[1, 2, 3])
+                assert trace.nchains == 3
+                assert len(trace) == 200
+                means.append(trace['mu'].mean())
+            assert pids == [worker._process.pid for worker in pool._workers]
+    npt.assert_allclose(means, [-5., 5.], atol=0.5)
+
+
+@pytest.mark.skipif(sys.version_info < (3,3),
+                    reason="requires python3.3")
+def test_sampler_pool_respawn():
+    with pm.Model():
+        pm.Normal('mu')
+        step = pm.Metropolis()
+        with pm.SamplerPool(step, cores=1) as pool:
+            worker = pool.acquire()
+            worker.terminate()
+            worker.join()
+            pool.release(worker)
+            assert pool._workers[0] is not worker
+            assert pool._workers[0]._process.is_alive()
+            trace = pm.sample(draws=20, tune=20, step=step, chains=2,
+                              cores=2, random_seed=[1, 2])
+            assert trace.nchains == 2
@@ -1,4 +1,5 @@
 from itertools import combinations
+import warnings
 import numpy as np
 
 try:
@@ -293,6 +294,63 @@ class TestSamplePPC(SeededTest):
             _, pval = stats.kstest(ppc['b'], stats.norm(scale=scale).cdf)
             assert pval > 0.001
 
+    def test_batched(self):
+        x = np.linspace(-1, 1, 20)
+        with pm.Model() as model:
+            a = pm.Normal('a', sd=0.2)
+            b = pm.Normal('b', mu=a, shape=3)
+            obs = pm.Normal('obs', mu=2 * a * x, sd=0.1, observed=np.zeros(20))
+            trace = pm.sample(draws=100, tune=50, chains=2)
+
+        with model:
+            ppc0 = pm.sample_ppc([model.test_point], samples=10, batched=True)
+            assert ppc0['obs'].shape == (10, 20)
+            ppc = pm.sample_ppc(trace, samples=200, vars=[a, b, obs],
+                                batched=True)
+            assert ppc['a'].shape == (200,)
+            assert ppc['b'].shape == (200, 3)
+            assert ppc['obs'].shape == (200, 20)
+            # each draw of `obs` must use the slope of a single trace point
+            slopes = np.polyfit(x, ppc['obs'].T, 1)[0]
+            npt.assert_allclose(np.std(slopes), 2 * np.std(trace['a']), rtol=0.3)
+
+            ppc = pm.sample_ppc(trace, samples=10, vars=[b], size=4, batched=True)
+            assert ppc['b'].shape == (10, 4, 3)
+
+    def test_batched_expression(self):
+        x = shared(np.linspace(-1, 1, 5))
+        with pm.Model() as model:
+            a = pm.Normal('a')
+            b = pm.Normal('b')
+            obs = pm.Normal('obs', mu=a + b * x, sd=0.1, observed=np.zeros(5))
+            trace = pm.sample(draws=50, tune=50, chains=1)
+        shape = obs.distribution.shape.copy()
+
+        with model:
+            ppc = pm.sample_ppc(trace, samples=5, random_seed=1)
+            # The number of samples equals the length of the observations
+            with warnings.catch_warnings(record=True) as record:
+                warnings.simplefilter('always')
+                ppc_batched = pm.sample_ppc(trace, samples=5, random_seed=1,
+                                            batched=True)
+        assert not [w for w in record if 'batched' in str(w.message)]
+        # A single random call per variable draws the same values as the
+        # loop over the trace points
+        npt.assert_allclose(ppc_batched['obs'], ppc['obs'])
+        npt.assert_equal(obs.distribution.shape, shape)
+
+    def test_batched_fallback(self):
+        with pm.Model() as model:
+            a = pm.Normal('a')
+            p = pm.math.sigmoid(a)
+            pm.Categorical('c', p=tt.stack([p, 1 - p]), observed=np.zeros(4, dtype=int))
+            trace = pm.sample(draws=50, tune=50, chains=1)
+
+        with model:
+            with pytest.warns(UserWarning, match='batched'):
+                ppc = pm.sample_ppc(trace, samples=10, batched=True)
+        assert len(ppc['c']) == 10
+
 
 class TestSamplePPCW(SeededTest):
     def test_sample_ppc_w(self):
@@ -1,8 +1,10 @@
 import pymc3 as pm
 import numpy as np
 from pymc3.backends.smc_text import TextStage
+from pymc3.backends.smc_memory import MemoryStage
 import pytest
 from tempfile import mkdtemp
+import os
 import shutil
 import theano.tensor as tt
 import theano
@@ -79,5 +81,46 @@ class TestSMC(SeededTest):
 
         rtrace = stage_handler.load_result_trace(model=self.ATMIP_test)
 
+    def test_sample_vectorized(self):
+        with self.ATMIP_test:
+            mtrace = pm.sample(draws=self.samples,
+                               chains=self.chains,
+                               step=pm.SMC(),
+                               step_kwargs={'vectorized': True})
+
+        x = mtrace.get_values('X')
+        assert x.shape == (self.samples, 4)
+        mu1d = np.abs(x).mean(axis=0)
+        np.testing.assert_allclose(self.muref, mu1d, rtol=0., atol=0.03)
+
+    def test_checkpoint_vectorized(self):
+        homepath = mkdtemp(prefix='SMC_CHECKPOINT_TEST')
+        step_kwargs = {'homepath': homepath, 'vectorized': True, 'checkpoint_interval': 1}
+        # A stale checkpoint of a previous run and an incomplete checkpoint
+        os.makedirs(os.path.join(homepath, 'stage_99'))
+        os.makedirs(os.path.join(homepath, 'stage_100.tmp'))
+        try:
+            with self.ATMIP_test:
+                pm.sample(draws=100, chains=self.chains, step=pm.SMC(), step_kwargs=step_kwargs)
+                assert not os.path.exists(os.path.join(homepath, 'stage_99'))
+                store = MemoryStage(homepath)
+                os.makedirs(os.path.join(homepath, 'stage_100.tmp'))
+                last = store.highest_checkpoint()
+                assert 0 < last < 99
+                assert not os.path.exists(store.stage_path(last) + '.tmp')
+                step, array_population, outputs = store.load(-1, self.ATMIP_test)
+                assert step.stage == last
+                assert array_population.shape == (self.chains, 4)
+                assert len(outputs) == self.chains
+
+                # Continue after the last checkpoint
+                step_kwargs['stage'] = -1
+                mtrace = pm.sample(draws=self.samples, chains=self.chains, step=pm.SMC(),
+                                   step_kwargs=step_kwargs)
+            x = mtrace.get_values('X')
+            np.testing.assert_allclose(self.muref, np.abs(x).mean(axis=0), rtol=0., atol=0.03)
+        finally:
+            shutil.rmtree(homepath)
+
     def teardown_class(self):
         shutil.rmtree(self.test_folder)
@@ -3,16 +3,19 @@ import numpy as np
 import numpy.testing as npt
 import pandas as pd
 import pymc3 as pm
+import theano
 from .helpers import SeededTest
 from ..tests import backend_fixtures as bf
 from ..backends import ndarray
 from ..stats import (summary, autocorr, autocov, hpd, mc_error, quantiles,
                      make_indices, bfmi, r2_score)
+from ..memoize import cache_info
 from ..theanof import floatX_array
 import pymc3.stats as pmstats
 from numpy.random import random, normal
 from numpy.testing import assert_equal, assert_almost_equal, assert_array_almost_equal
 from scipy import stats as st
+from scipy.special import logsumexp
 import copy
 
 
@@ -49,6 +52,36 @@ def test_log_post_trace():
     npt.assert_allclose(logp, -0.5 * np.log(2 * np.pi), atol=1e-7)
 
 
+def test_log_lik_chunks(monkeypatch):
+    with pm.Model() as model:
+        a = pm.Normal('a')
+        pm.Normal('y', mu=a, observed=np.random.randn(5, 3))
+        trace = pm.sample(50, tune=10, chains=2)
+
+    log_py = pmstats._log_post_trace(trace, model)
+    chunks = list(pmstats._log_post_chunks(trace, model, chunk_size=7))
+    assert len(chunks) == 9
+    npt.assert_allclose(np.concatenate(chunks), log_py)
+
+    waic = pm.waic(trace, model, pointwise=True)
+    loo = pm.loo(trace, model, pointwise=True)
+    # Tiny chunks, column blocks and a memory-mapped matrix for loo
+    monkeypatch.setattr(pmstats, '_LOG_LIK_CHUNK_SIZE', 30)
+    monkeypatch.setattr(pmstats, '_LOG_LIK_MAX_MEMORY', 0)
+    waic_chunked = pm.waic(trace, model, pointwise=True)
+    loo_chunked = pm.loo(trace, model, pointwise=True)
+    for expected, actual in [(waic, waic_chunked), (loo, loo_chunked)]:
+        for expected_val, actual_val in zip(expected, actual):
+            npt.assert_allclose(actual_val, expected_val)
+
+    lppd_i = logsumexp(log_py, axis=0, b=1. / len(log_py))
+    waic_i = - 2 * (lppd_i - np.var(log_py, axis=0))
+    npt.assert_allclose(waic.WAIC_i, waic_i)
+
+    # The log likelihood function is compiled once per model
+    assert cache_info(model)['_log_lik_function'].misses == 1
+
+
 def test_compare():
     np.random.seed(42)
     x_obs = np.random.normal(0, 1, size=100)
@@ -103,6 +136,45 @@ def test_compare():
     assert_almost_equal(np.sum(w_st), 1.)
 
 
+def test_compare_cache(monkeypatch):
+    x_obs = np.random.normal(0, 1, size=20)
+    model_dict = {}
+    for sd in [1, 0.8]:
+        with pm.Model() as model:
+            mu = pm.Normal('mu', 0, 1)
+            pm.Normal('x', mu=mu, sd=sd, observed=x_obs)
+            model_dict[model] = pm.sample(100, tune=100, chains=2)
+
+    df = pm.compare(model_dict, ic='LOO', cores=2)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('The information criterion was not cached.')
+
+    monkeypatch.setattr(pm.stats, 'loo', fail)
+    df_cached = pm.compare(model_dict, ic='LOO')
+    pd.testing.assert_frame_equal(df, df_cached)
+    for model, trace in model_dict.items():
+        key = pm.stats._ic_key(trace, model, 'LOO')
+        assert pm.stats._cached_ic(trace, model, key) is not None
+        key = pm.stats._ic_key(trace, model, 'WAIC')
+        assert pm.stats._cached_ic(trace, model, key) is None
+
+
+def test_compare_cache_shared_data():
+    x_obs = theano.shared(np.random.normal(0, 1, size=20))
+    model_dict = {}
+    for sd in [1, 0.8]:
+        with pm.Model() as model:
+            mu = pm.Normal('mu', 0, 1)
+            pm.Normal('x', mu=mu, sd=sd, observed=x_obs)
+            model_dict[model] = pm.sample(100, tune=100, chains=2)
+
+    df = pm.compare(model_dict, ic='WAIC')
+    x_obs.set_value(x_obs.get_value() + 3)
+    df_changed = pm.compare(model_dict, ic='WAIC')
+    assert (df_changed['WAIC'].sort_index() > df['WAIC'].sort_index()).all()
+
+
 class TestStats(SeededTest):
     @classmethod
     def setup_class(cls):
@@ -150,6 +222,22 @@ class TestStats(SeededTest):
         interval = hpd(self.normal_sample)
         assert_array_almost_equal(interval, [-1.96, 1.96], 2)
 
+    def test_hpd_multivariate(self):
+        """Test that HPD of several elements matches the elementwise HPD,
+        also if the elements are processed in chunks"""
+        x = normal(size=(200, 3, 4))
+        intervals = hpd(x)
+        assert intervals.shape == (3, 4, 2)
+        for idx in np.ndindex(3, 4):
+            npt.assert_allclose(
+                intervals[idx], hpd(x[(slice(None),) + idx]))
+        chunk_size = pmstats._HPD_CHUNK_SIZE
+        try:
+            pmstats._HPD_CHUNK_SIZE = 500
+            npt.assert_allclose(hpd(x), intervals)
+        finally:
+            pmstats._HPD_CHUNK_SIZE = chunk_size
+
     def test_make_indices(self):
         """Test make_indices function"""
         ind = [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2)]
@@ -343,3 +431,18 @@ class TestDfSummary(bf.ModelBackendSampledTestCase):
         lw = np.random.randn(20000, 10)
         _, ks = pm.stats._psislw(lw, 1.)
         npt.assert_array_less(ks, .5)
+
+    def test_psis_columns(self, monkeypatch):
+        lw = np.random.standard_t(3, size=(1000, 7)) * np.arange(1, 8)
+        # Columns with a short tail, which are not smoothed, and ties
+        lw[:, 0] = np.random.randn(1000) * 0.1
+        lw[:, 1] = lw[:, 1].round()
+        monkeypatch.setattr(pm.stats, '_GPDFIT_BUFFER_SIZE', 1)
+        lw_out, ks = pm.stats._psislw(lw, 0.8)
+        for i in range(lw.shape[1]):
+            lw_col, k = pm.stats._psislw(lw[:, i:i + 1], 0.8)
+            npt.assert_allclose(lw_out[:, i], lw_col[:, 0])
+            npt.assert_allclose(ks[i], k[0])
+        lw_par, ks_par = pm.stats._psislw(lw, 0.8, cores=2)
+        npt.assert_allclose(lw_par, lw_out)
+        npt.assert_allclose(ks_par, ks)
@@ -1,15 +1,18 @@
 import shutil
 import tempfile
+import pickle
 
 from .checks import close_to
 from .models import (simple_categorical, mv_simple, mv_simple_discrete,
                      mv_prior_simple, simple_2model_continuous)
 from pymc3.sampling import assign_step_methods, sample
-from pymc3.model import Model
+from pymc3.model import Model, Potential
 from pymc3.step_methods import (NUTS, BinaryGibbsMetropolis, CategoricalGibbsMetropolis,
                                 Metropolis, Slice, CompoundStep, NormalProposal,
                                 MultivariateNormalProposal, HamiltonianMC,
+                                MultipleTryMetropolis,
                                 EllipticalSlice, smc, DEMetropolis)
+from pymc3.step_methods.metropolis import ThreadedRowsLogp
 from pymc3.theanof import floatX
 from pymc3.distributions import (
     Binomial, Normal, Bernoulli, Categorical, Beta, HalfNormal)
@@ -234,6 +237,9 @@ class TestStepMethods(object):  # yield test doesn't work subclassing object
                 HamiltonianMC(scaling=C, is_cov=True, blocked=False),
                 NUTS(scaling=C, is_cov=True, blocked=False),
                 Metropolis(S=C, proposal_dist=MultivariateNormalProposal, blocked=True),
+                MultipleTryMetropolis(S=C, proposal_dist=MultivariateNormalProposal),
+                MultipleTryMetropolis(S=C, proposal_dist=MultivariateNormalProposal,
+                                      n_proposals=3, cores=2),
                 Slice(blocked=True),
                 HamiltonianMC(scaling=C, is_cov=True),
                 NUTS(scaling=C, is_cov=True),
@@ -272,11 +278,50 @@ class TestStepMethods(object):  # yield test doesn't work subclassing object
             steps = (
                 CategoricalGibbsMetropolis(model.x, proposal='uniform'),
                 CategoricalGibbsMetropolis(model.x, proposal='proportional'),
+                CategoricalGibbsMetropolis(model.x, proposal='uniform',
+                                           elemwise=True),
+                CategoricalGibbsMetropolis(model.x, proposal='proportional',
+                                           elemwise=True),
             )
         for step in steps:
             trace = sample(8000, tune=0, step=step, start=start, model=model, random_seed=1)
             self.check_stat(check, trace, step.__class__.__name__)
 
+    def test_step_binary_elemwise(self):
+        p = np.array([0.2, 0.7, 0.5])
+        with Model() as model:
+            b = Bernoulli('b', p, shape=3)
+            Normal('y', b, 1, observed=np.array([0.5, -1., 2.]), shape=3)
+            step = BinaryGibbsMetropolis([b], elemwise=True)
+            trace = sample(8000, tune=0, step=step, chains=1, random_seed=1)
+        y = np.array([0.5, -1., 2.])
+        # Posterior of each element, independent given the observations
+        like = np.exp(-0.5 * (y - 1) ** 2) * p
+        post = like / (like + np.exp(-0.5 * y ** 2) * (1 - p))
+        npt.assert_allclose(trace['b'].mean(axis=0), post, atol=0.05)
+
+        with model:
+            Normal('z', b.sum(), 1, observed=1.)
+            with pytest.raises(ValueError):
+                BinaryGibbsMetropolis([b], elemwise=True)
+
+    def test_step_binary_elemwise_potential(self):
+        p = np.array([0.2, 0.7, 0.5])
+        w = np.array([1., -1., 0.5])
+        with Model() as model:
+            b = Bernoulli('b', p, shape=3)
+            Potential('pot', w * b)
+            step = BinaryGibbsMetropolis([b], elemwise=True)
+            trace = sample(8000, tune=0, step=step, chains=1, random_seed=1)
+        like = np.exp(w) * p
+        post = like / (like + (1 - p))
+        npt.assert_allclose(trace['b'].mean(axis=0), post, atol=0.05)
+
+        with model:
+            Potential('pot_sum', b.sum())
+            with pytest.raises(ValueError):
+                BinaryGibbsMetropolis([b], elemwise=True)
+
     def test_step_elliptical_slice(self):
         start, model, (K, L, mu, std, noise) = mv_prior_simple()
         unc = noise ** 0.5
@@ -316,6 +361,61 @@ class TestMetropolisProposal(object):
         npt.assert_allclose(np.cov(samples.T), cov, rtol=0.2)
 
 
+class TestMultipleTryMetropolis(object):
+    @staticmethod
+    def logp(rows):
+        return -0.5 * np.sum(rows ** 2, axis=-1)
+
+    def test_acceptance(self):
+        with Model():
+            Normal('x', 0, 1, shape=2)
+            step = MultipleTryMetropolis(n_proposals=3, tune=False)
+        proposals = np.array([[0., 0.], [1., 0.], [0., 2.]])
+        references = np.array([[0.5, 0.5], [1., 1.]])
+        step.propose = lambda q, n: proposals if n == 3 else references
+        q0 = np.array([0.2, -0.1])
+        _, [stats] = step.astep(q0)
+        # The normalizing constants of the logp cancel
+        expected = (np.logaddexp.reduce(self.logp(proposals)) -
+                    np.logaddexp.reduce(self.logp(np.vstack([references, q0]))))
+        npt.assert_allclose(stats['accept'], np.exp(expected))
+
+    def test_single_proposal(self):
+        with Model():
+            Normal('x', 0, 1, shape=2)
+            step = MultipleTryMetropolis(n_proposals=1, tune=False)
+        q0 = np.array([0.2, -0.1])
+        assert step.propose(q0, 0).shape == (0, 2)
+        # Reduces to Metropolis
+        proposal = np.array([[1., 0.5]])
+        propose = step.propose
+        step.propose = lambda q, n: proposal if n == 1 else propose(q, n)
+        _, [stats] = step.astep(q0)
+        expected = self.logp(proposal[0]) - self.logp(q0)
+        npt.assert_allclose(stats['accept'], np.exp(expected))
+
+        with pytest.raises(ValueError):
+            with Model():
+                Normal('x', 0, 1, shape=2)
+                MultipleTryMetropolis(n_proposals=0)
+
+    def test_threaded_logp(self):
+        with Model():
+            Normal('x', 0, 1, shape=2)
+            step = MultipleTryMetropolis()
+            threaded = MultipleTryMetropolis(cores=2)
+        assert isinstance(threaded.rows_logp, ThreadedRowsLogp)
+        rows = floatX(np.random.RandomState(1).randn(5, 2))
+        npt.assert_allclose(threaded.rows_logp(rows), step.rows_logp(rows))
+        npt.assert_allclose(threaded.rows_logp(rows[:1]),
+                            step.rows_logp(rows[:1]))
+        pool = threaded.rows_logp._pool
+        threaded.rows_logp(rows)
+        assert threaded.rows_logp._pool is pool
+        unpickled = pickle.loads(pickle.dumps(threaded.rows_logp))
+        npt.assert_allclose(unpickled(rows), step.rows_logp(rows))
+
+
 class TestCompoundStep(object):
     samplers = (Metropolis, Slice, HamiltonianMC, NUTS, DEMetropolis)
 
@@ -338,6 +438,35 @@ class TestCompoundStep(object):
                 assert not isinstance(sampler_instance, CompoundStep)
                 assert isinstance(sampler_instance, sampler)
 
+    def test_array_state(self):
+        with Model() as model:
+            x = Normal('x', 0, 1, shape=2)
+            Bernoulli('b', 0.3 + 0.4 * (x[0] > 0), shape=3)
+            Categorical('c', np.ones(3) / 3)
+            HalfNormal('y', 1)
+        traces = []
+        for array_state in [False, True]:
+            with model:
+                methods = [Metropolis([model.x]),
+                           BinaryGibbsMetropolis([model.b]),
+                           CategoricalGibbsMetropolis([model.c]),
+                           Slice([model.y_log__]),
+                           NUTS([model.x, model.y_log__])]
+            step = CompoundStep(methods, array_state=array_state)
+            np.random.seed(42)
+            point = model.test_point
+            draws = []
+            for _ in range(20):
+                point, _ = step.step(point)
+                draws.append(point)
+            traces.append(draws)
+
+        for draw, draw_array in zip(*traces):
+            assert set(draw) == set(draw_array)
+            for name in draw:
+                assert draw[name].dtype == draw_array[name].dtype
+                npt.assert_array_equal(draw[name], draw_array[name])
+
 
 class TestAssignStepMethods(object):
     def test_bernoulli(self):
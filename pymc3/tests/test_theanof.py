@@ -1,9 +1,9 @@
 import collections
 
 import pytest
-from theano import theano
+from theano import theano, tensor as tt
 
-from pymc3.theanof import set_theano_conf
+from pymc3.theanof import set_theano_conf, graph_hash
 
 
 class TestSetTheanoConfig(object):
@@ -26,3 +26,23 @@ class TestSetTheanoConfig(object):
             assert conf == {'compute_test_value': 'off'}
             conf = set_theano_conf(conf)
             assert conf == {'compute_test_value': 'raise'}
+
+
+class TestGraphHash(object):
+    def build(self, scale=2.):
+        a = tt.vector('a')
+        b = tt.scalar('b')
+        return [(scale * a).sum() + tt.exp(b)]
+
+    def test_same_structure(self):
+        assert graph_hash(self.build()) == graph_hash(self.build())
+
+    def test_different_structure(self):
+        assert graph_hash(self.build()) != graph_hash(self.build(scale=3.))
+        assert graph_hash(self.build()) != graph_hash(self.build(), 'extra')
+
+    def test_flags(self):
+        outputs = self.build()
+        with theano.configparser.change_flags(optimizer='fast_compile'):
+            other = graph_hash(outputs)
+        assert graph_hash(outputs) != other
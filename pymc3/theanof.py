@@ -1,9 +1,11 @@
+import hashlib
+
 import numpy as np
 import theano
 from theano import theano, scalar, tensor as tt
 from theano.configparser import change_flags
 from theano.gof import Op
-from theano.gof.graph import inputs
+from theano.gof.graph import inputs, io_toposort
 from theano.sandbox.rng_mrg import MRG_RandomStreams
 
 from .blocking import ArrayOrdering
@@ -23,7 +25,8 @@ __all__ = ['gradient',
            'make_shared_replacements',
            'generator',
            'set_tt_rng',
-           'tt_rng']
+           'tt_rng',
+           'graph_hash']
 
 
 def inputvars(a):
@@ -460,3 +463,56 @@ def largest_common_dtype(tensors):
                  else smartfloatX(np.asarray(t)).dtype
                  for t in tensors)
     return np.stack([np.ones((), dtype=dtype) for dtype in dtypes]).dtype
+
+
+def graph_hash(outputs, *extra):
+    """Compute a structural hash of the graph of `outputs`.
+
+    Two graphs get the same hash if they have the same ops applied to
+    inputs with the same names, types and constant values, regardless of
+    the identity of the theano objects. The theano version and the
+    config flags that influence compilation are part of the hash.
+
+    Parameters
+    ----------
+    outputs : list of theano variables
+    extra : objects whose `str` is added to the hash
+
+    Returns
+    -------
+    str : hex digest of the hash
+    """
+    digest = hashlib.sha1()
+
+    def update(*items):
+        for item in items:
+            digest.update(str(item).encode('utf-8'))
+            digest.update(b'\0')
+
+    ids = {}
+
+    def var_id(var):
+        if var not in ids:
+            ids[var] = len(ids)
+            update('var', type(var).__name__, var.name, var.type)
+            if isinstance(var, theano.gof.Constant):
+                data = np.ascontiguousarray(var.data)
+                update(data.dtype, data.shape)
+                digest.update(data.tobytes())
+        return ids[var]
+
+    for node in io_toposort(inputs(outputs), outputs):
+        op = node.op
+        props = [str(getattr(op, prop)) for prop in getattr(op, '__props__', ())]
+        update('op', type(op).__module__, type(op).__name__, op, props,
+               [var_id(var) for var in node.inputs])
+        for var in node.outputs:
+            var_id(var)
+    update('outputs', [var_id(var) for var in outputs])
+
+    config = theano.config
+    update(theano.__version__, config.floatX, config.mode, config.optimizer,
+           config.optimizer_including, config.optimizer_excluding,
+           config.device, config.cxx)
+    update(*extra)
+    return digest.hexdigest()